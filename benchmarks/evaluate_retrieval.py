@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Retrieval Quality Evaluation
+
+Indexes a labelled corpus under a grid of chunker settings and measures
+how well each setting retrieves the right documents, next to what it
+costs: recall@k and MRR against a labelled query set, points stored,
+ingest time, query latency and the tokens a k-result context would send
+to the model.
+
+The default query set comes from the corpus's metadata manifest
+(Nutrition_data/nutrition_topics.json): every topic is a query, and the
+documents listing that topic are its relevant documents. A hit counts for
+every document its chunk belongs to, including the documents of
+near-duplicate chunks folded into it with DEDUP=skip.
+
+Both tools run in-process with their normal configuration: every setting
+is indexed with DocumentEmbedder.process_and_upload_documents into a
+throwaway collection and searched with search_vectors. Embeddings come
+from the Gemini stand-in, which derives vectors from the words of a
+text, so runs are offline and repeatable. With --live the real Gemini
+API is used instead, with embedding and query caches in --cache-dir so a
+repeated run does not embed anything twice.
+
+Usage:
+    python evaluate_retrieval.py --chunk-sizes 250 500 1000 --overlaps 0 0.2 --limits 1 3 5 10
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from stand_ins import add_fault_arguments, start_stand_ins
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+EMBEDDING_TOOL = REPO_ROOT / "gemini_embedding_tool"
+SEARCH_TOOL = REPO_ROOT / "gemini_qdrant_vector_search_tool"
+DEFAULT_DOCS = REPO_ROOT / "Nutrition_data"
+DEFAULT_TOPICS = DEFAULT_DOCS / "nutrition_topics.json"
+
+
+def topic_queries(metadata: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One query per topic, labelled with every document that lists the topic"""
+    relevant: Dict[str, List[str]] = {}
+    for filename, fields in sorted(metadata.items()):
+        for topic in fields.get("topics") or []:
+            relevant.setdefault(topic.strip().lower(), []).append(filename)
+    return [{"query": topic, "relevant": filenames} for topic, filenames in sorted(relevant.items())]
+
+
+def read_queries(path: Path) -> List[Dict[str, Any]]:
+    """Read a JSON Lines query set of {"query": ..., "relevant": [file names]} objects"""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not entry.get("query") or not entry.get("relevant"):
+                raise ValueError(f"{path}:{number}: every query needs \"query\" and \"relevant\"")
+            queries.append({"query": entry["query"], "relevant": list(entry["relevant"])})
+    return queries
+
+
+def hit_documents(hit: Dict[str, Any]) -> List[str]:
+    """File names a search hit stands for"""
+    payload = hit.get("payload") or {}
+    documents = [payload.get("filename")]
+    documents += [duplicate.get("filename") for duplicate in payload.get("duplicates") or []]
+    return [document for document in documents if document]
+
+
+def score_query(hits: List[Dict[str, Any]], relevant: List[str], limits: List[int],
+                estimate_tokens) -> Dict[str, Any]:
+    """Recall at each k, reciprocal rank of the first relevant hit and context tokens at each k"""
+    wanted = set(relevant)
+    found = set()
+    recall = {}
+    tokens = {}
+    reciprocal_rank = 0.0
+    context = 0
+    for rank, hit in enumerate(hits, 1):
+        documents = set(hit_documents(hit))
+        if not reciprocal_rank and documents & wanted:
+            reciprocal_rank = 1 / rank
+        found |= documents & wanted
+        context += estimate_tokens((hit.get("payload") or {}).get("text", ""))
+        if rank in limits:
+            recall[rank] = len(found) / len(wanted)
+            tokens[rank] = context
+    # Fewer hits than k: the missing ranks add nothing
+    for k in limits:
+        recall.setdefault(k, len(found) / len(wanted))
+        tokens.setdefault(k, context)
+    return {"recall": recall, "reciprocal_rank": reciprocal_rank, "tokens": tokens}
+
+
+def embed_queries(texts: List[str], config: Dict[str, Any], cache, search_tool) -> List[Optional[Any]]:
+    """Embed every query once, batched, taking what the query cache already has"""
+    embeddings = [cache.get_embedding(text) if cache else None for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        fresh = search_tool.get_embeddings([texts[i] for i in missing], config["gemini_api_key"],
+                                           **search_tool.embedding_options(config))
+        for i, embedding in zip(missing, fresh):
+            embeddings[i] = embedding
+            if embedding is not None and cache:
+                cache.put_embedding(texts[i], embedding)
+    return embeddings
+
+
+def chunk_statistics(embedder, estimate_tokens) -> Tuple[int, float]:
+    """Number of chunks and mean estimated tokens per chunk under the embedder's chunker"""
+    from preprocess import discover_documents
+
+    counts = []
+    documents = discover_documents(Path(embedder.config["docs_path"]), embedder.config["docs_include"],
+                                   embedder.config["docs_exclude"])
+    for filename, path in documents:
+        for chunk in embedder.chunk_text(path.read_text(encoding="utf-8"), filename):
+            counts.append(estimate_tokens(chunk["text"]))
+    return len(counts), sum(counts) / len(counts) if counts else 0.0
+
+
+def evaluate_setting(args: argparse.Namespace, chunk_size: int, overlap: float, queries: List[Dict[str, Any]],
+                     embeddings: List[Any], tools) -> Dict[str, Any]:
+    """Index the corpus with one chunker setting, run every query and score the results"""
+    embedder_tool, search_tool, estimate_tokens, percentile = tools
+    collection = f"{args.collection_prefix}_{chunk_size}_{round(overlap * 100)}"
+    os.environ.update({"CHUNK_SIZE": str(chunk_size), "CHUNK_OVERLAP": str(overlap), "COLLECTION_NAME": collection})
+    print(f"Chunk size {chunk_size}, overlap {overlap:g}: indexing into '{collection}'...")
+
+    embedder = embedder_tool.DocumentEmbedder(backend=args.backend)
+    try:
+        chunks, chunk_tokens = chunk_statistics(embedder, estimate_tokens)
+        start = time.perf_counter()
+        points = embedder.process_and_upload_documents(reset_collection=True)
+        ingest_seconds = time.perf_counter() - start
+        if points is None:
+            raise RuntimeError(f"Indexing into '{collection}' failed; rerun with --verbose for details")
+
+        config = search_tool.load_config(collection=collection, backend=args.backend)
+        config["payload_fields"] = ["filename", "text", "duplicates"]
+        limit = max(args.limits)
+        latencies = []
+        scores = []
+        # The first search opens the connection or memory-maps the local index
+        search_tool.search_vectors(embeddings[0], config, limit, query=queries[0]["query"])
+        for entry, embedding in zip(queries, embeddings):
+            start = time.perf_counter()
+            hits = search_tool.search_vectors(embedding, config, limit, query=entry["query"])
+            latencies.append((time.perf_counter() - start) * 1000)
+            scores.append(score_query(hits, entry["relevant"], args.limits, estimate_tokens))
+    finally:
+        if not args.keep_collections:
+            embedder.store.delete_collection()
+        embedder.store.close()
+        if embedder.cache:
+            embedder.cache.close()
+
+    return {
+        "chunk_size": chunk_size,
+        "chunk_overlap": overlap,
+        "collection": collection,
+        "chunks": chunks,
+        "mean_chunk_tokens": chunk_tokens,
+        "points": points,
+        "vector_mb": points * embedder.config["vector_size"] * 4 / (1024 * 1024),
+        "ingest_seconds": ingest_seconds,
+        "recall": {k: sum(score["recall"][k] for score in scores) / len(scores) for k in args.limits},
+        "mrr": sum(score["reciprocal_rank"] for score in scores) / len(scores),
+        "context_tokens": {k: sum(score["tokens"][k] for score in scores) / len(scores) for k in args.limits},
+        "latency_mean_ms": sum(latencies) / len(latencies),
+        "latency_p50_ms": percentile(latencies, 50),
+        "latency_p95_ms": percentile(latencies, 95),
+    }
+
+
+def print_results(results: List[Dict[str, Any]], limits: List[int]) -> None:
+    recall_columns = "".join(f" {f'R@{k}':>6}" for k in limits)
+    header = (f"{'Size':>6} {'Overlap':>7} {'Points':>7} {'Tokens':>7} {'Ingest s':>9} "
+              f"{'p50 ms':>7} {'p95 ms':>7} {'MRR':>6}{recall_columns}")
+    print(f"\n{header}")
+    print("-" * len(header))
+    for result in results:
+        recall = "".join(f" {result['recall'][k]:>6.3f}" for k in limits)
+        print(f"{result['chunk_size']:>6} {result['chunk_overlap']:>7g} {result['points']:>7} "
+              f"{result['mean_chunk_tokens']:>7.0f} {result['ingest_seconds']:>9.2f} "
+              f"{result['latency_p50_ms']:>7.2f} {result['latency_p95_ms']:>7.2f} {result['mrr']:>6.3f}{recall}")
+
+    token_columns = "".join(f" {f'k={k}':>8}" for k in limits)
+    print(f"\nMean context tokens for k results:\n{'Size':>6} {'Overlap':>7}{token_columns}")
+    for result in results:
+        tokens = "".join(f" {result['context_tokens'][k]:>8.0f}" for k in limits)
+        print(f"{result['chunk_size']:>6} {result['chunk_overlap']:>7g}{tokens}")
+
+
+def main():
+    """Run the evaluation grid and report the results"""
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency under a grid of chunker settings")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[250, 500, 1000],
+                        help="Chunk sizes in tokens (default: 250 500 1000)")
+    parser.add_argument("--overlaps", type=float, nargs="+", default=[0.0, 0.2],
+                        help="Chunk overlaps as fractions of the chunk size (default: 0 0.2)")
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 3, 5, 10],
+                        help="Result counts k for recall@k and context tokens (default: 1 3 5 10)")
+    parser.add_argument("--docs", default=str(DEFAULT_DOCS), help="Corpus directory (default: Nutrition_data)")
+    parser.add_argument("--topics", default=str(DEFAULT_TOPICS),
+                        help="Metadata manifest the query set is built from (default: nutrition_topics.json)")
+    parser.add_argument("--queries", help="JSON Lines query set to use instead of the manifest's topics")
+    parser.add_argument("--write-queries", metavar="PATH", help="Save the query set as JSON Lines and continue")
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="local",
+                        help="Vector store: Qdrant or a local index (default: local)")
+    parser.add_argument("--qdrant-url", help="Qdrant server to index into, with QDRANT_API_KEY from the "
+                                             "environment (default: the Qdrant stand-in)")
+    parser.add_argument("--collection-prefix", default="eval",
+                        help="Prefix of the throwaway collections (default: eval)")
+    parser.add_argument("--keep-collections", action="store_true",
+                        help="Don't delete the collections after scoring them")
+    parser.add_argument("--hybrid", action="store_true", help="Store sparse vectors and run hybrid searches")
+    parser.add_argument("--live", action="store_true",
+                        help="Embed with the Gemini API (GEMINI_API_KEY) instead of the stand-in")
+    parser.add_argument("--cache-dir", default=".eval_cache",
+                        help="Embedding and query caches for --live runs (default: .eval_cache)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra settings for both tools, e.g. --env DEDUP=skip (repeatable)")
+    parser.add_argument("--output", help="Also save the results as JSON")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the local indexes and logs")
+    parser.add_argument("--verbose", action="store_true", help="Show the tools' log output")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    args.limits = sorted(set(args.limits))
+    if min(args.limits) < 1:
+        parser.error("--limits must be positive")
+
+    if args.queries:
+        queries = read_queries(Path(args.queries))
+    else:
+        sys.path.insert(0, str(EMBEDDING_TOOL))
+        from document_metadata import load_document_metadata
+        queries = topic_queries(load_document_metadata(args.topics))
+    if not queries:
+        parser.error("The query set is empty")
+    if args.write_queries:
+        with open(args.write_queries, "w", encoding="utf-8") as f:
+            for entry in queries:
+                f.write(json.dumps(entry) + "\n")
+        print(f"Wrote {len(queries)} queries to {args.write_queries}")
+
+    docs_path = Path(args.docs).resolve()
+    cache_dir = Path(args.cache_dir).resolve()
+    output = Path(args.output).resolve() if args.output else None
+    workdir = Path(tempfile.mkdtemp(prefix="gemini-eval-"))
+    overrides = dict(item.split("=", 1) for item in args.env)
+
+    # Without --live the Gemini stand-in embeds, without --qdrant-url the Qdrant stand-in stores
+    gemini, qdrant = start_stand_ins(args)
+    print(f"Embeddings: {'Gemini API' if args.live else f'stand-in at {gemini.api_base}'}; "
+          f"{len(queries)} queries; work directory {workdir}")
+
+    os.environ.update({
+        "DOCS_PATH": str(docs_path),
+        "VECTOR_BACKEND": args.backend,
+        "LOCAL_INDEX_PATH": str(workdir / "local_index"),
+        "SYNC_MANIFEST_PATH": str(workdir / "sync_manifest.json"),
+        "INGEST_JOURNAL_PATH": str(workdir / "ingest_journal.jsonl"),
+        "METRICS_PATH": "",
+        "TRACING": "off",
+        "SPARSE_VECTORS": "true" if args.hybrid else "false",
+        "HYBRID_SEARCH": "true" if args.hybrid else "false",
+    })
+    if args.live:
+        # Stand-in vectors never go into these caches, so they only ever hold real embeddings
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        os.environ["EMBED_CACHE_PATH"] = str(cache_dir / "embedding_cache.sqlite")
+        os.environ["QUERY_CACHE_PATH"] = str(cache_dir / "query_cache.sqlite")
+    else:
+        os.environ.update({
+            "GEMINI_API_KEY": "evaluation",
+            "GEMINI_API_BASE": gemini.api_base,
+            "VECTOR_SIZE": str(args.dimension),
+            "EMBED_CACHE_PATH": "",
+            "QUERY_CACHE_PATH": "",
+        })
+    if args.qdrant_url:
+        os.environ["QDRANT_URL"] = args.qdrant_url
+    elif args.backend == "qdrant":
+        os.environ.update({"QDRANT_URL": qdrant.url, "QDRANT_API_KEY": "evaluation"})
+    os.environ.update(overrides)
+
+    # The tools are imported from the work directory, where the embedder writes its log
+    original_cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.path[:0] = [str(EMBEDDING_TOOL), str(SEARCH_TOOL)]
+    import embedder as embedder_tool
+    import gemini_vector_search as search_tool
+    from context_packer import estimate_tokens
+    from quantization_report import percentile
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    try:
+        config = search_tool.load_config(collection=f"{args.collection_prefix}_queries", backend=args.backend)
+        cache = search_tool.open_query_cache(config)
+        embeddings = embed_queries([entry["query"] for entry in queries], config, cache, search_tool)
+        if cache:
+            cache.close()
+        # Queries that could not be embedded are left out of every setting alike
+        labelled = [(entry, embedding) for entry, embedding in zip(queries, embeddings) if embedding is not None]
+        if len(labelled) < len(queries):
+            print(f"Could not embed {len(queries) - len(labelled)} queries; scoring the other {len(labelled)}")
+        if not labelled:
+            return 1
+        queries, embeddings = [entry for entry, _ in labelled], [embedding for _, embedding in labelled]
+
+        tools = (embedder_tool, search_tool, estimate_tokens, percentile)
+        for chunk_size in args.chunk_sizes:
+            for overlap in args.overlaps:
+                results.append(evaluate_setting(args, chunk_size, overlap, queries, embeddings, tools))
+    finally:
+        os.chdir(original_cwd)
+        gemini.stop()
+        qdrant.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results, args.limits)
+
+    if output:
+        report = {
+            "corpus": str(docs_path),
+            "queries": len(queries),
+            "embeddings": "gemini" if args.live else "stand-in",
+            "backend": args.backend,
+            "limits": args.limits,
+            "results": results,
+        }
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Results saved to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Offline Throughput and Latency Benchmarks
+
+Runs the embedder and the search service against the local Gemini and
+Qdrant stand-ins (stand_ins.py), so performance can be measured without
+network access or API keys:
+
+- ingest: embedder.py --reset over a generated corpus, reporting documents
+  and chunks per second
+- search and answer: POST /search and /answer against search_service.py from
+  concurrent clients, reporting p50/p95/p99 latency and throughput
+- peak resident memory and CPU time of the embedder and of the service, and
+  the bytes exchanged with Qdrant
+
+Both tools run as subprocesses with their normal configuration; settings the
+suite doesn't fix come from the environment or the tools' .env files and
+can be overridden with --env. Results are written as JSON, and --compare
+flags metrics that regressed against an earlier results file.
+
+Usage:
+    python run_benchmarks.py --docs 200 --queries 200 --concurrency 8
+    python run_benchmarks.py --compare results/baseline.json --tolerance 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from stand_ins import add_fault_arguments, start_stand_ins
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+EMBEDDER = REPO_ROOT / "gemini_embedding_tool" / "embedder.py"
+SEARCH_SERVICE = REPO_ROOT / "gemini_qdrant_vector_search_tool" / "search_service.py"
+
+TOPICS = (
+    "protein fiber vitamin mineral calcium iron magnesium potassium zinc selenium omega "
+    "cholesterol glucose insulin sodium folate antioxidant probiotic hydration caffeine collagen"
+).split()
+FILLER = (
+    "the of and to in is for with on as by that are be this from or an it at which daily "
+    "intake recommended absorption metabolism digestion adults children studies suggest "
+    "levels sources foods diet health risk benefits deficiency supplements evidence"
+).split()
+
+# Metrics compared by --compare, and whether higher values are better
+COMPARED_METRICS = {
+    "ingest.docs_per_s": True,
+    "ingest.chunks_per_s": True,
+    "ingest.peak_rss_mb": False,
+    "ingest.cpu_s": False,
+    "ingest.qdrant_upload_mb": False,
+    "search.p50_ms": False,
+    "search.p95_ms": False,
+    "search.p99_ms": False,
+    "search.requests_per_s": True,
+    "search.qdrant_kb_per_query": False,
+    "answer.p50_ms": False,
+    "answer.p95_ms": False,
+    "answer.p99_ms": False,
+    "answer.ttft_p50_ms": False,
+    "answer.requests_per_s": True,
+    "service.peak_rss_mb": False,
+    "service.cpu_s": False,
+}
+
+
+def generate_corpus(docs_path: Path, count: int, size_kb: float, seed: int) -> None:
+    """Write ``count`` synthetic documents of about ``size_kb`` KB each"""
+    rng = random.Random(seed)
+    docs_path.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        # Each document leans on a few topics, so searches have clear winners
+        focus = rng.sample(TOPICS, 3)
+        paragraphs = []
+        length = 0
+        while length < size_kb * 1024:
+            sentences = []
+            for _ in range(rng.randint(3, 8)):
+                words = [rng.choice(focus) if rng.random() < 0.2 else rng.choice(FILLER)
+                         for _ in range(rng.randint(8, 20))]
+                sentences.append(" ".join(words).capitalize() + ".")
+            paragraph = " ".join(sentences)
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 2
+        (docs_path / f"document_{i:05d}.txt").write_text("\n\n".join(paragraphs), encoding="utf-8")
+
+
+def generate_queries(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed + 1)
+    templates = ("What are the benefits of {} and {}?", "How much {} should adults get daily?",
+                 "Does {} affect {} absorption?", "Which foods are good sources of {}?")
+    queries = []
+    for _ in range(count):
+        template = rng.choice(templates)
+        queries.append(template.format(*rng.sample(TOPICS, template.count("{}"))))
+    return queries
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated percentile (q in 0-100) of ``values``"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "requests_per_s": (len(latencies) + errors) / elapsed if elapsed else None,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies) if latencies else None,
+    }
+
+
+def wait_with_usage(process: subprocess.Popen) -> Tuple[int, Optional[float], Optional[float]]:
+    """Wait for a subprocess and return (exit code, peak RSS in MB, CPU seconds)
+
+    The peak RSS is that of the largest process in the tree (e.g. the
+    embedder or one of its chunking workers), and the CPU time, user plus
+    system, that of the whole tree, where the platform reports them.
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None, None
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return process.returncode, usage.ru_maxrss * scale / (1024 * 1024), usage.ru_utime + usage.ru_stime
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_ingest(args: argparse.Namespace, env: Dict[str, str], workdir: Path, gemini, qdrant) -> Dict[str, Any]:
+    """Embed the generated corpus from scratch and measure throughput"""
+    log_path = workdir / "embedder.log"
+    embedded_before = gemini.snapshot().get("batchEmbedContents", {}).get("items", 0)
+    uploaded_before = qdrant.traffic()["received_bytes"]
+    command = [sys.executable, str(EMBEDDER), "--reset", "--backend", args.backend]
+    print(f"Ingesting {args.docs} documents ({args.doc_kb:g} KB each)...")
+
+    start = time.perf_counter()
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    exit_code, peak_rss, cpu = wait_with_usage(process)
+    elapsed = time.perf_counter() - start
+
+    # Every chunk is embedded exactly once with the embedding cache disabled
+    chunks = gemini.snapshot().get("batchEmbedContents", {}).get("items", 0) - embedded_before
+    return {
+        "exit_code": exit_code,
+        "seconds": elapsed,
+        "docs": args.docs,
+        "chunks": chunks,
+        "docs_per_s": args.docs / elapsed,
+        "chunks_per_s": chunks / elapsed,
+        "peak_rss_mb": peak_rss,
+        "cpu_s": cpu,
+        "qdrant_upload_mb": (qdrant.traffic()["received_bytes"] - uploaded_before) / (1024 * 1024),
+        "log": str(log_path),
+    }
+
+
+def run_load(url: str, queries: List[str], concurrency: int, stream: bool = False) -> Dict[str, Any]:
+    """Send every query from ``concurrency`` clients and summarize latencies"""
+    sessions: Dict[int, requests.Session] = {}
+
+    def send(query: str) -> Tuple[Optional[float], Optional[float]]:
+        session = sessions.setdefault(threading.get_ident(), requests.Session())
+        body = {"query": query, "limit": 5}
+        if stream:
+            body["stream"] = True
+        start = time.perf_counter()
+        ttft = None
+        try:
+            response = session.post(url, json=body, timeout=120, stream=stream)
+            if response.status_code != 200:
+                response.close()
+                return None, None
+            if stream:
+                for line in response.iter_lines():
+                    event = json.loads(line) if line else {}
+                    if event.get("type") == "text" and ttft is None:
+                        ttft = (time.perf_counter() - start) * 1000
+                    if event.get("type") == "error":
+                        return None, None
+            else:
+                response.json()
+        except (requests.RequestException, ValueError):
+            return None, None
+        return (time.perf_counter() - start) * 1000, ttft
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, queries))
+    elapsed = time.perf_counter() - start
+    for session in sessions.values():
+        session.close()
+
+    latencies = [latency for latency, _ in results if latency is not None]
+    summary = latency_summary(latencies, len(results) - len(latencies), elapsed)
+    ttfts = [ttft for _, ttft in results if ttft is not None]
+    if stream:
+        summary["ttft_p50_ms"] = percentile(ttfts, 50)
+        summary["ttft_p95_ms"] = percentile(ttfts, 95)
+    return summary
+
+
+def run_queries(args: argparse.Namespace, env: Dict[str, str], workdir: Path, qdrant) -> Dict[str, Any]:
+    """Start the search service and measure /search and /answer latency"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, str(SEARCH_SERVICE), "--port", str(port), "--backend", args.backend,
+               "--no-cache"]
+    if args.hybrid:
+        command.append("--hybrid")
+
+    log_path = workdir / "search_service.log"
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    results: Dict[str, Any] = {}
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Search service did not start, see {log_path}")
+            time.sleep(0.1)
+
+        queries = generate_queries(args.queries, args.seed)
+        # A short warm-up opens the service's pooled connections
+        run_load(f"{base_url}/search", queries[:args.concurrency], args.concurrency)
+
+        print(f"Searching {len(queries)} queries with {args.concurrency} clients...")
+        downloaded_before = qdrant.traffic()["sent_bytes"]
+        results["search"] = run_load(f"{base_url}/search", queries, args.concurrency)
+        results["search"]["qdrant_kb_per_query"] = \
+            (qdrant.traffic()["sent_bytes"] - downloaded_before) / 1024 / len(queries)
+        if not args.skip_answer:
+            print(f"Answering {len(queries)} queries with {args.concurrency} clients...")
+            results["answer"] = run_load(f"{base_url}/answer", queries, args.concurrency, stream=args.stream)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            exit_code, peak_rss, cpu = wait_with_usage(process)
+        except KeyboardInterrupt:
+            process.kill()
+            raise
+    results["service"] = {"exit_code": exit_code, "peak_rss_mb": peak_rss, "cpu_s": cpu, "log": str(log_path)}
+    return results
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print a comparison table and return the metrics that regressed beyond ``tolerance``"""
+    def lookup(data: Dict[str, Any], metric: str) -> Optional[float]:
+        section, key = metric.split(".")
+        return data.get(section, {}).get(key)
+
+    regressions = []
+    print(f"\nCompared with {baseline.get('version', 'unknown')} ({baseline.get('timestamp', '')}):")
+    print(f"{'Metric':<24} {'Baseline':>12} {'Current':>12} {'Change':>9}")
+    print("-" * 60)
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        old, new = lookup(baseline, metric), lookup(results, metric)
+        if old is None or new is None or old == 0:
+            continue
+        change = (new - old) / old
+        regressed = (-change if higher_is_better else change) > tolerance
+        if regressed:
+            regressions.append(metric)
+        print(f"{metric:<24} {old:>12.2f} {new:>12.2f} {change:>+8.1%}{'  REGRESSED' if regressed else ''}")
+    return regressions
+
+
+def main():
+    """Run the benchmarks and save the results"""
+    parser = argparse.ArgumentParser(description="Offline throughput and latency benchmarks")
+    parser.add_argument("--docs", type=int, default=100, help="Documents to ingest (default: 100)")
+    parser.add_argument("--doc-kb", type=float, default=16, help="Size of each document in KB (default: 16)")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per endpoint (default: 100)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent query clients (default: 4)")
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="qdrant",
+                        help="Vector store: the Qdrant stand-in or a local index (default: qdrant)")
+    parser.add_argument("--hybrid", action="store_true", help="Store sparse vectors and run hybrid searches")
+    parser.add_argument("--stream", action="store_true", help="Stream answers and report time to first token")
+    parser.add_argument("--skip-answer", action="store_true", help="Don't benchmark /answer")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for both tools, e.g. --env EMBED_CONCURRENCY=8 (repeatable)")
+    parser.add_argument("--output", help="Results file (default: results/<version>-<timestamp>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative change counted as a regression (default: 0.10)")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the corpus, index and logs")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    overrides = dict(item.split("=", 1) for item in args.env)
+    workdir = Path(tempfile.mkdtemp(prefix="gemini-bench-"))
+    gemini, qdrant = start_stand_ins(args)
+    print(f"Stand-ins: Gemini {gemini.api_base}, Qdrant {qdrant.url}; work directory {workdir}")
+
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": "benchmark",
+        "GEMINI_API_BASE": gemini.api_base,
+        "QDRANT_URL": qdrant.url,
+        "QDRANT_API_KEY": "benchmark",
+        "COLLECTION_NAME": "benchmark",
+        "VECTOR_SIZE": str(args.dimension),
+        "VECTOR_BACKEND": args.backend,
+        "LOCAL_INDEX_PATH": str(workdir / "local_index"),
+        "DOCS_PATH": str(workdir / "docs"),
+        "SYNC_MANIFEST_PATH": str(workdir / "sync_manifest.json"),
+        "EMBED_CACHE_PATH": "",
+        "QUERY_CACHE_PATH": "",
+        "SPARSE_VECTORS": "true" if args.hybrid else "false",
+        "HYBRID_SEARCH": "true" if args.hybrid else "false",
+        "PYTHONUNBUFFERED": "1",
+    })
+    env.update(overrides)
+
+    results: Dict[str, Any] = {
+        "version": git_version(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items()
+                     if key not in ("output", "compare", "keep_workdir")},
+    }
+    try:
+        generate_corpus(workdir / "docs", args.docs, args.doc_kb, args.seed)
+        results["ingest"] = run_ingest(args, env, workdir, gemini, qdrant)
+        if results["ingest"]["exit_code"] != 0:
+            print(f"Embedder failed, see {results['ingest']['log']}")
+        if args.backend == "qdrant":
+            results["ingest"]["points"] = qdrant.points_count("benchmark")
+        results.update(run_queries(args, env, workdir, qdrant))
+    finally:
+        results["stand_ins"] = {"gemini": gemini.snapshot(), "qdrant": qdrant.snapshot()}
+        gemini.stop()
+        qdrant.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps({key: results[key] for key in ("ingest", "search", "answer", "service") if key in results},
+                     indent=2))
+
+    output = Path(args.output) if args.output else (
+        Path(__file__).resolve().parent / "results"
+        / f"{results['version']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
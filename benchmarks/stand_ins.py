@@ -0,0 +1,667 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Gemini and Qdrant REST APIs
+
+Lets the benchmark suite (or a manual experiment) run the embedder and the
+search tool without network access or API keys. Each stand-in is a
+ThreadingHTTPServer implementing only the endpoints the tools call, with
+configurable latency, server errors and HTTP 429 throttling.
+
+Gemini (set GEMINI_API_BASE to http://host:port/v1):
+    POST /v1/models/{model}:embedContent
+    POST /v1/models/{model}:batchEmbedContents
+    POST /v1/models/{model}:generateContent
+    POST /v1/models/{model}:streamGenerateContent?alt=sse
+
+Qdrant (set QDRANT_URL to http://host:port):
+    GET | PUT | DELETE /collections/{name}
+    PUT  /collections/{name}/points
+    POST /collections/{name}/points/delete
+    POST /collections/{name}/points/scroll
+    POST /collections/{name}/points/search
+    POST /collections/{name}/points/search/batch
+
+Embeddings are feature-hashed bags of words, so texts that share words get
+similar vectors and searches return relevant points. Generated answers are
+canned text.
+
+Usage:
+    python stand_ins.py --gemini-port 8701 --qdrant-port 8702 --embed-latency-ms 40
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+ANSWER_TEXT = (
+    "Based on the provided sources, the documents describe the topic in some detail. "
+    "The key points are summarized below, citing the sources they come from. "
+    "Where the sources disagree or are silent, this answer says so rather than guessing."
+)
+
+
+def hashed_embedding(text: str, dimension: int) -> List[float]:
+    """Unit-length bag-of-words vector with each word hashed to a signed bucket"""
+    vector = [0.0] * dimension
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        h = zlib.crc32(token.encode("utf-8"))
+        vector[h % dimension] += 1.0 if h & 0x80000000 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class FaultProfile:
+    """Latency and failure behaviour applied to a group of endpoints"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, per_item_ms: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, rate_limit: float = 0.0,
+                 retry_after: float = 1.0, seed: Optional[int] = None):
+        """
+        Args:
+            latency_ms: Base service time of every request
+            jitter_ms: Uniform random latency added on top of the base
+            per_item_ms: Extra latency per item in batch requests
+            error_rate: Fraction of requests failing with HTTP 503
+            throttle_rate: Fraction of requests rejected with HTTP 429
+            rate_limit: Requests per second above which requests are rejected
+                with HTTP 429 (0 disables the limit)
+            retry_after: Seconds sent in the Retry-After header of 429 responses
+            seed: Seed for the random failures and jitter
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_item_ms = per_item_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Token bucket holding at most one second of requests
+        self._tokens = rate_limit
+        self._refilled = time.monotonic()
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def apply(self, items: int = 1) -> Optional[int]:
+        """Delay the calling request and decide whether it fails
+
+        Returns:
+            The HTTP status to fail with (429 or 503), or None to succeed
+        """
+        with self._lock:
+            if self.rate_limit > 0 and not self._take_token():
+                return 429
+            roll = self._random.random()
+            jitter = self._random.uniform(0, self.jitter_ms)
+
+        # Throttled requests are rejected without doing any work
+        if roll < self.throttle_rate:
+            return 429
+
+        time.sleep((self.latency_ms + jitter + self.per_item_ms * items) / 1000)
+        if roll < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+
+
+class StandInServer(ThreadingHTTPServer):
+    """HTTP server running in a background thread, with per-endpoint counters"""
+
+    daemon_threads = True
+
+    def __init__(self, handler_class, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), handler_class)
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.received_bytes = 0
+        self.sent_bytes = 0
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint: str, status: int, items: int = 0) -> None:
+        with self._stats_lock:
+            counters = self.stats[endpoint]
+            counters["requests"] += 1
+            counters[str(status)] += 1
+            if status == 200:
+                counters["items"] += items
+
+    def count_bytes(self, received: int = 0, sent: int = 0) -> None:
+        with self._stats_lock:
+            self.received_bytes += received
+            self.sent_bytes += sent
+
+    def traffic(self) -> Dict[str, int]:
+        """Request and response body bytes as they crossed the wire (compressed, if they were)"""
+        with self._stats_lock:
+            return {"received_bytes": self.received_bytes, "sent_bytes": self.sent_bytes}
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Copy of the counters: requests, responses by status and items served per endpoint"""
+        with self._stats_lock:
+            return {endpoint: dict(counters) for endpoint, counters in self.stats.items()}
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY every
+    # response would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count_bytes(sent=len(data))
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length) if length else b""
+        self.server.count_bytes(received=len(data))
+        # Qdrant accepts gzip-compressed request bodies
+        if data and self.headers.get("Content-Encoding", "").lower() == "gzip":
+            data = gzip.decompress(data)
+        return json.loads(data) if data else {}
+
+    def _send_fault(self, status: int, profile: FaultProfile) -> None:
+        if status == 429:
+            self._send_json(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}},
+                            {"Retry-After": f"{profile.retry_after:g}"})
+        else:
+            self._send_json(status, {"error": {"code": status, "status": "UNAVAILABLE"}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GeminiHandler(_JsonHandler):
+    METHODS = ("embedContent", "batchEmbedContents", "generateContent", "streamGenerateContent")
+
+    def do_POST(self):
+        server: GeminiStandIn = self.server
+        path = urlsplit(self.path).path
+        method = path.rpartition(":")[2]
+        if method not in self.METHODS:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown method {path}"}})
+            return
+
+        try:
+            body = self._read_json()
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON"}})
+            server.count(method, 400)
+            return
+
+        requests = body.get("requests", []) if method == "batchEmbedContents" else [body]
+        if len(requests) > 100:
+            self._send_json(400, {"error": {"code": 400, "message": "At most 100 requests can be in one batch"}})
+            server.count(method, 400)
+            return
+
+        profile = server.embed_faults if method.endswith("mbedContent") else server.generate_faults
+        status = profile.apply(len(requests))
+        if status is not None:
+            self._send_fault(status, profile)
+        elif method == "embedContent":
+            self._send_json(200, {"embedding": {"values": server.embed(body["content"]["parts"][0]["text"],
+                                                                      body.get("outputDimensionality"))}})
+        elif method == "batchEmbedContents":
+            embeddings = [{"values": server.embed(request["content"]["parts"][0]["text"],
+                                                  request.get("outputDimensionality"))}
+                          for request in requests]
+            self._send_json(200, {"embeddings": embeddings})
+        elif method == "generateContent":
+            # Same total time as streaming the answer
+            time.sleep(server.piece_interval_ms * (len(server.answer_pieces) - 1) / 1000)
+            self._send_json(200, {"candidates": [{"content": {"parts": [{"text": server.answer}],
+                                                              "role": "model"}}]})
+        else:
+            self._stream_answer()
+        server.count(method, status or 200, len(requests))
+
+    def _stream_answer(self) -> None:
+        """Send the answer as server-sent events, one piece per interval"""
+        server: GeminiStandIn = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, piece in enumerate(server.answer_pieces):
+            if i:
+                time.sleep(server.piece_interval_ms / 1000)
+            event = {"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}}]}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class GeminiStandIn(StandInServer):
+    """Serves embeddings and canned answers in the shape of the Gemini API"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, dimension: int = 768,
+                 embed_faults: Optional[FaultProfile] = None,
+                 generate_faults: Optional[FaultProfile] = None,
+                 answer_pieces: int = 8, piece_interval_ms: float = 20.0):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            dimension: Length of the returned embedding vectors
+            embed_faults: Behaviour of the embedding endpoints
+            generate_faults: Behaviour of the generation endpoints; the
+                latency is the time to the first streamed piece
+            answer_pieces: Pieces the canned answer is streamed in
+            piece_interval_ms: Delay between streamed pieces
+        """
+        super().__init__(GeminiHandler, host, port)
+        self.dimension = dimension
+        self.embed_faults = embed_faults or FaultProfile()
+        self.generate_faults = generate_faults or FaultProfile()
+        self.piece_interval_ms = piece_interval_ms
+
+        self.answer = ANSWER_TEXT
+        words = ANSWER_TEXT.split(" ")
+        step = math.ceil(len(words) / max(1, answer_pieces))
+        self.answer_pieces = [" ".join(words[i:i + step]) + (" " if i + step < len(words) else "")
+                              for i in range(0, len(words), step)]
+
+    @property
+    def api_base(self) -> str:
+        """Value for GEMINI_API_BASE"""
+        return f"{self.url}/v1"
+
+    def embed(self, text: str, output_dimensionality: Optional[int] = None) -> List[float]:
+        """Embed like a Matryoshka model: a reduced size keeps the leading components"""
+        vector = hashed_embedding(text, self.dimension)
+        if output_dimensionality and output_dimensionality < self.dimension:
+            vector = vector[:output_dimensionality]
+        return vector
+
+
+class _Collection:
+    """Points of one collection, with the search matrix rebuilt lazily after writes"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.sparse_names = set(config.get("sparse_vectors", {}))
+        self.points: Dict[Any, Tuple[Optional[np.ndarray], Dict[str, Any], Dict[str, Dict[int, float]]]] = {}
+        self.lock = threading.Lock()
+        self._matrix: Optional[Tuple[List[Any], np.ndarray]] = None
+        self._document_frequency: Dict[str, Dict[int, int]] = {}
+        self.payload_schema: Dict[str, Any] = {}
+
+    def upsert(self, points: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            for point in points:
+                vector = point.get("vector")
+                sparse = {}
+                if isinstance(vector, dict):
+                    for name, value in vector.items():
+                        if name in self.sparse_names:
+                            sparse[name] = dict(zip(value["indices"], value["values"]))
+                    vector = vector.get("")
+                dense = None
+                if vector is not None:
+                    dense = np.asarray(vector, dtype=np.float32)
+                    norm = np.linalg.norm(dense)
+                    if norm:
+                        dense /= norm
+                self.points[point["id"]] = (dense, point.get("payload") or {}, sparse)
+            self._matrix = None
+            self._document_frequency = {}
+
+    def delete(self, point_filter: Dict[str, Any]) -> None:
+        with self.lock:
+            self.points = {point_id: point for point_id, point in self.points.items()
+                           if not _matches_filter(point[1], point_filter)}
+            self._matrix = None
+            self._document_frequency = {}
+
+    def _dense_matrix(self) -> Tuple[List[Any], np.ndarray]:
+        if self._matrix is None:
+            ids = [point_id for point_id, point in self.points.items() if point[0] is not None]
+            vectors = [self.points[point_id][0] for point_id in ids]
+            matrix = np.stack(vectors) if vectors else np.zeros((0, 1), dtype=np.float32)
+            self._matrix = (ids, matrix)
+        return self._matrix
+
+    def _sparse_scores(self, name: str, query: Dict[str, Any]) -> Dict[Any, float]:
+        frequency = self._document_frequency.get(name)
+        if frequency is None:
+            frequency = defaultdict(int)
+            for _, _, sparse in self.points.values():
+                for index in sparse.get(name, {}):
+                    frequency[index] += 1
+            self._document_frequency[name] = frequency
+
+        modifier = self.config.get("sparse_vectors", {}).get(name, {}).get("modifier")
+        total = len(self.points)
+        weights = {}
+        for index, value in zip(query["indices"], query["values"]):
+            if modifier == "idf":
+                n = frequency.get(index, 0)
+                value *= math.log(1 + (total - n + 0.5) / (n + 0.5))
+            weights[index] = value
+
+        scores = {}
+        for point_id, (_, _, sparse) in self.points.items():
+            vector = sparse.get(name, {})
+            score = sum(weight * vector[index] for index, weight in weights.items() if index in vector)
+            if score > 0:
+                scores[point_id] = score
+        return scores
+
+    def search(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        vector = request["vector"]
+        name = ""
+        if isinstance(vector, dict):
+            name, vector = vector.get("name", ""), vector["vector"]
+        limit = int(request.get("limit", 10))
+        point_filter = request.get("filter")
+
+        with self.lock:
+            if name in self.sparse_names:
+                ranked = sorted(self._sparse_scores(name, vector).items(), key=lambda item: -item[1])
+            else:
+                ids, matrix = self._dense_matrix()
+                if not ids:
+                    return []
+                query = np.asarray(vector, dtype=np.float32)
+                query /= np.linalg.norm(query) or 1.0
+                scores = matrix @ query
+                # Over-fetch when filtering so enough candidates survive
+                top = min(len(ids), limit if not point_filter else len(ids))
+                order = np.argpartition(-scores, top - 1)[:top]
+                order = order[np.argsort(-scores[order])]
+                ranked = [(ids[i], float(scores[i])) for i in order]
+
+            hits = []
+            for point_id, score in ranked:
+                payload = self.points[point_id][1]
+                if point_filter and not _matches_filter(payload, point_filter):
+                    continue
+                hit = {"id": point_id, "version": 0, "score": score}
+                selector = request.get("with_payload")
+                if isinstance(selector, list):
+                    hit["payload"] = {key: payload[key] for key in selector if key in payload}
+                elif selector:
+                    hit["payload"] = payload
+                hits.append(hit)
+                if len(hits) >= limit:
+                    break
+            return hits
+
+    def scroll(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Page through points in ID order, Qdrant's scroll without filters"""
+        limit = int(request.get("limit", 10))
+        offset = request.get("offset")
+        with self.lock:
+            ids = sorted(self.points, key=str)
+            start = 0 if offset is None else bisect.bisect_left([str(point_id) for point_id in ids], str(offset))
+            page = ids[start:start + limit]
+            records = [self._record(point_id, request) for point_id in page]
+            next_offset = ids[start + limit] if start + limit < len(ids) else None
+        return {"points": records, "next_page_offset": next_offset}
+
+    def retrieve(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Points by ID, Qdrant's POST /points; unknown IDs are left out"""
+        with self.lock:
+            return [self._record(point_id, request) for point_id in request.get("ids", [])
+                    if point_id in self.points]
+
+    def _record(self, point_id: Any, request: Dict[str, Any]) -> Dict[str, Any]:
+        dense, payload, sparse = self.points[point_id]
+        record = {"id": point_id, "payload": payload if request.get("with_payload") else None}
+        if request.get("with_vector"):
+            vector = dense.tolist() if dense is not None else None
+            if self.sparse_names:
+                vector = {"": vector, **{name: {"indices": list(values), "values": list(values.values())}
+                                         for name, values in sparse.items()}}
+            record["vector"] = vector
+        return record
+
+    def info(self) -> Dict[str, Any]:
+        with self.lock:
+            count = len(self.points)
+        return {"status": "green", "optimizer_status": "ok", "points_count": count,
+                "indexed_vectors_count": count, "config": {"params": self.config},
+                "payload_schema": dict(self.payload_schema)}
+
+
+def _matches_condition(payload: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+    value = payload.get(condition.get("key"))
+    match = condition.get("match", {})
+    if "value" in match:
+        return value == match["value"] or (isinstance(value, list) and match["value"] in value)
+    if "any" in match:
+        values = value if isinstance(value, list) else [value]
+        return any(v in match["any"] for v in values)
+    return False
+
+
+def _matches_filter(payload: Dict[str, Any], point_filter: Dict[str, Any]) -> bool:
+    """Evaluate the must / should / must_not subset of Qdrant filters"""
+    if not all(_matches_condition(payload, c) for c in point_filter.get("must", [])):
+        return False
+    if any(_matches_condition(payload, c) for c in point_filter.get("must_not", [])):
+        return False
+    should = point_filter.get("should", [])
+    return not should or any(_matches_condition(payload, c) for c in should)
+
+
+class QdrantHandler(_JsonHandler):
+    def _route(self) -> Tuple[Optional[str], str]:
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) < 2 or parts[0] != "collections":
+            return None, ""
+        return parts[1], "/".join(parts[2:])
+
+    def _respond(self, method: str) -> None:
+        server: QdrantStandIn = self.server
+        name, action = self._route()
+        endpoint = f"{method} {action or 'collection'}"
+        if name is None:
+            self._send_json(404, {"status": {"error": "Not found"}})
+            return
+
+        start = time.perf_counter()
+        try:
+            body = self._read_json() if method in ("PUT", "POST") else {}
+        except json.JSONDecodeError:
+            self._send_json(400, {"status": {"error": "Invalid JSON"}})
+            server.count(endpoint, 400)
+            return
+
+        items = len(body.get("points", body.get("searches", []))) if isinstance(body, dict) else 0
+        status = server.faults.apply(max(1, items))
+        if status is not None:
+            self._send_fault(status, server.faults)
+            server.count(endpoint, status)
+            return
+
+        collection = server.collections.get(name)
+        if action == "" and method == "PUT":
+            server.collections[name] = _Collection(body)
+            result: Any = True
+        elif action == "" and method == "DELETE":
+            result = server.collections.pop(name, None) is not None
+        elif collection is None:
+            self._send_json(404, {"status": {"error": f"Collection `{name}` doesn't exist!"}})
+            server.count(endpoint, 404)
+            return
+        elif action == "" and method == "GET":
+            result = collection.info()
+        elif action == "points" and method == "PUT":
+            collection.upsert(body.get("points", []))
+            result = {"operation_id": 0, "status": "completed"}
+        elif action == "points/delete" and method == "POST":
+            collection.delete(body.get("filter", {}))
+            result = {"operation_id": 0, "status": "completed"}
+        elif action == "index" and method == "PUT":
+            # Indexes only change speed, so filters are evaluated the same way without them
+            collection.payload_schema[body.get("field_name")] = {"data_type": body.get("field_schema")}
+            result = {"operation_id": 0, "status": "completed"}
+        elif action == "points" and method == "POST":
+            result = collection.retrieve(body)
+        elif action == "points/scroll" and method == "POST":
+            result = collection.scroll(body)
+        elif action == "points/search" and method == "POST":
+            result = collection.search(body)
+        elif action == "points/search/batch" and method == "POST":
+            result = [collection.search(search) for search in body.get("searches", [])]
+        else:
+            self._send_json(404, {"status": {"error": f"Unsupported {method} {self.path}"}})
+            server.count(endpoint, 404)
+            return
+
+        self._send_json(200, {"result": result, "status": "ok", "time": time.perf_counter() - start})
+        server.count(endpoint, 200, items)
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_PUT(self):
+        self._respond("PUT")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def do_DELETE(self):
+        self._respond("DELETE")
+
+
+class QdrantStandIn(StandInServer):
+    """In-memory, brute-force subset of the Qdrant REST API"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: Optional[FaultProfile] = None):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            faults: Behaviour of every endpoint
+        """
+        super().__init__(QdrantHandler, host, port)
+        self.faults = faults or FaultProfile()
+        self.collections: Dict[str, _Collection] = {}
+
+    def points_count(self, collection_name: str) -> int:
+        collection = self.collections.get(collection_name)
+        return collection.info()["points_count"] if collection else 0
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the stand-in latency and failure options to an argument parser"""
+    group = parser.add_argument_group("stand-in behaviour")
+    group.add_argument("--embed-latency-ms", type=float, default=30.0,
+                       help="Latency of every Gemini embedding request (default: 30)")
+    group.add_argument("--embed-item-ms", type=float, default=0.5,
+                       help="Extra latency per text in a batch embedding request (default: 0.5)")
+    group.add_argument("--generate-latency-ms", type=float, default=300.0,
+                       help="Time to the first piece of a generated answer (default: 300)")
+    group.add_argument("--piece-interval-ms", type=float, default=20.0,
+                       help="Delay between streamed answer pieces (default: 20)")
+    group.add_argument("--qdrant-latency-ms", type=float, default=2.0,
+                       help="Latency of every Qdrant request (default: 2)")
+    group.add_argument("--jitter-ms", type=float, default=0.0,
+                       help="Uniform random latency added to every request (default: 0)")
+    group.add_argument("--error-rate", type=float, default=0.0,
+                       help="Fraction of Gemini and Qdrant requests failing with 503 (default: 0)")
+    group.add_argument("--throttle-rate", type=float, default=0.0,
+                       help="Fraction of Gemini requests rejected with 429 (default: 0)")
+    group.add_argument("--rate-limit", type=float, default=0.0,
+                       help="Gemini requests per second before 429s are returned (default: unlimited)")
+    group.add_argument("--retry-after", type=float, default=1.0,
+                       help="Retry-After seconds sent with 429 responses (default: 1)")
+    group.add_argument("--dimension", type=int, default=768,
+                       help="Embedding dimensionality (default: 768)")
+    group.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+
+def start_stand_ins(args: argparse.Namespace, host: str = "127.0.0.1", gemini_port: int = 0,
+                    qdrant_port: int = 0) -> Tuple[GeminiStandIn, QdrantStandIn]:
+    """Start both stand-ins configured from add_fault_arguments options"""
+    gemini = GeminiStandIn(
+        host, gemini_port, dimension=args.dimension,
+        embed_faults=FaultProfile(args.embed_latency_ms, args.jitter_ms, args.embed_item_ms,
+                                  args.error_rate, args.throttle_rate, args.rate_limit,
+                                  args.retry_after, seed=args.seed),
+        generate_faults=FaultProfile(args.generate_latency_ms, args.jitter_ms, 0.0,
+                                     args.error_rate, args.throttle_rate, args.rate_limit,
+                                     args.retry_after, seed=args.seed + 1),
+        piece_interval_ms=args.piece_interval_ms,
+    )
+    qdrant = QdrantStandIn(host, qdrant_port,
+                           faults=FaultProfile(args.qdrant_latency_ms, args.jitter_ms,
+                                               error_rate=args.error_rate, seed=args.seed + 2))
+    return gemini.start(), qdrant.start()
+
+
+def main():
+    """Run both stand-ins until interrupted"""
+    parser = argparse.ArgumentParser(description="Local Gemini and Qdrant stand-in servers")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--gemini-port", type=int, default=8701, help="Gemini stand-in port (default: 8701)")
+    parser.add_argument("--qdrant-port", type=int, default=8702, help="Qdrant stand-in port (default: 8702)")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    gemini, qdrant = start_stand_ins(args, args.host, args.gemini_port, args.qdrant_port)
+    print(f"GEMINI_API_BASE={gemini.api_base}")
+    print(f"QDRANT_URL={qdrant.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        gemini.stop()
+        qdrant.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
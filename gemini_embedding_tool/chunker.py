@@ -0,0 +1,203 @@
+"""
+Streaming, token-aware text chunker
+
+Splits documents into overlapping chunks in a single pass:
+- paragraphs are read incrementally, so a file never has to fit in memory
+- each paragraph's token count is estimated once, with a local
+  approximation of the Gemini tokenizer
+- paragraphs larger than a chunk are split at sentence boundaries, and
+  sentences that are still too large at word boundaries
+- overlap is kept in a deque that only ever drops pieces from the front,
+  so every piece is added and removed once and the total work is linear
+
+No chunk is longer than MAX_CHUNK_CHARS, the point at which the embedding
+request would otherwise be truncated.
+"""
+
+import re
+import string
+from collections import deque
+from typing import Deque, Iterable, Iterator, List, TextIO, Tuple
+
+# Characters the Gemini embedding request accepts before the text is truncated
+MAX_CHUNK_CHARS = 25000
+
+# Characters read per block when streaming a file
+READ_BLOCK_SIZE = 1 << 20
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Digits and ASCII punctuation are usually tokens of their own
+_SYMBOL_BYTES = (string.digits + string.punctuation).encode("ascii")
+# Average characters per token for English text
+CHARS_PER_TOKEN = 4
+
+
+def _word_symbol_count(text: str) -> int:
+    encoded = text.encode("utf-8")
+    symbols = len(encoded) - len(encoded.translate(None, _SYMBOL_BYTES))
+    return len(text.split()) + symbols
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of model tokens in ``text``
+
+    Subword tokenizers encode common words as a single token, long or rare
+    words as several, and digits and punctuation mostly one character per
+    token. The estimate is the larger of a word-plus-symbol count and a
+    characters-per-token count, so it errs high and chunks stay under the
+    real limit. Both counts run in C (str.split and bytes.translate).
+    """
+    return max(_word_symbol_count(text), len(text) // CHARS_PER_TOKEN)
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split an in-memory document at blank lines"""
+    return PARAGRAPH_BREAK.split(text)
+
+
+def iter_paragraphs(stream: TextIO, block_size: int = READ_BLOCK_SIZE,
+                    max_paragraph_chars: int = MAX_CHUNK_CHARS) -> Iterator[str]:
+    """Yield the paragraphs of a text stream, reading it block by block
+
+    A paragraph that grows past ``max_paragraph_chars`` without a blank line
+    is yielded in pieces cut at a line break or space, so memory use stays
+    bounded by the block size even for files without paragraph breaks.
+    """
+    buffer = ""
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        buffer += block
+
+        parts = PARAGRAPH_BREAK.split(buffer)
+        # The last part may continue in the next block
+        buffer = parts.pop()
+        yield from parts
+
+        while len(buffer) > max_paragraph_chars:
+            cut = max(buffer.rfind("\n", 0, max_paragraph_chars), buffer.rfind(" ", 0, max_paragraph_chars))
+            if cut <= 0:
+                cut = max_paragraph_chars
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+
+    if buffer:
+        yield buffer
+
+
+class Chunker:
+    """Packs paragraphs into overlapping chunks of at most ``chunk_size`` tokens"""
+
+    def __init__(self, chunk_size: int, overlap_size: int, max_chars: int = MAX_CHUNK_CHARS):
+        """
+        Args:
+            chunk_size: Maximum estimated tokens per chunk
+            overlap_size: Tokens of trailing context repeated at the start of
+                the next chunk
+            max_chars: Maximum characters per chunk
+        """
+        self.chunk_size = max(1, chunk_size)
+        self.overlap_size = max(0, overlap_size)
+        self.max_chars = max(1, max_chars)
+
+    def _fits(self, word_symbols: int, chars: int) -> bool:
+        return max(word_symbols, chars // CHARS_PER_TOKEN) <= self.chunk_size and chars <= self.max_chars
+
+    def _split_oversize(self, paragraph: str) -> Iterator[Tuple[str, int]]:
+        """Split a paragraph that doesn't fit in one chunk into sentences, then words"""
+        for sentence in SENTENCE_END.split(paragraph):
+            count = _word_symbol_count(sentence)
+            if self._fits(count, len(sentence)):
+                yield sentence, count
+                continue
+
+            window: List[str] = []
+            window_count = 0
+            window_chars = -1
+            # Words longer than a whole chunk (e.g. encoded data) are cut into slices
+            slice_size = min(self.max_chars, self.chunk_size * CHARS_PER_TOKEN)
+            for word in sentence.split():
+                for start in range(0, len(word), slice_size):
+                    piece = word[start:start + slice_size]
+                    piece_count = _word_symbol_count(piece)
+                    if window and not self._fits(window_count + piece_count, window_chars + len(piece) + 1):
+                        yield " ".join(window), window_count
+                        window, window_count, window_chars = [], 0, -1
+                    window.append(piece)
+                    window_count += piece_count
+                    window_chars += len(piece) + 1
+            if window:
+                yield " ".join(window), window_count
+
+    def _pieces(self, paragraphs: Iterable[str]) -> Iterator[Tuple[str, int, str]]:
+        """Yield (text, word-symbol count, separator before it) for every unit that fits a chunk"""
+        chunk_size = self.chunk_size
+        # Paragraphs longer than this can't fit, so skip counting them as a whole
+        fast_limit = min(self.max_chars, (chunk_size + 1) * CHARS_PER_TOKEN - 1)
+
+        for paragraph in paragraphs:
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+
+            if len(paragraph) <= fast_limit:
+                # _word_symbol_count inlined: this runs once per paragraph
+                encoded = paragraph.encode("utf-8")
+                count = len(paragraph.split()) + len(encoded) - len(encoded.translate(None, _SYMBOL_BYTES))
+                if count <= chunk_size:
+                    yield paragraph, count, "\n\n"
+                    continue
+
+            separator = "\n\n"
+            for piece, piece_count in self._split_oversize(paragraph):
+                yield piece, piece_count, separator
+                separator = " "
+
+    @staticmethod
+    def _join(pieces: Deque[Tuple[str, int, str]]) -> str:
+        # Every piece is preceded by its separator except the first
+        return "".join([separator + text for text, _, separator in pieces])[len(pieces[0][2]):]
+
+    def chunks(self, paragraphs: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """Yield (chunk text, estimated tokens) for a stream of paragraphs
+
+        Word-symbol counts and character counts are both additive over the
+        pieces of a chunk (separators are whitespace), so the running totals
+        give exactly estimate_tokens() of the joined text without re-reading it.
+        """
+        chunk_size = self.chunk_size
+        max_chars = self.max_chars
+        pieces: Deque[Tuple[str, int, str]] = deque()
+        count = 0
+        # Characters of every piece plus its separator, and the length of the
+        # first piece's separator, which is not emitted
+        chars = 0
+        first = 0
+
+        for text, piece_count, separator in self._pieces(paragraphs):
+            piece_chars = len(text) + len(separator)
+            if pieces:
+                joined = chars + piece_chars - first
+                if (count + piece_count > chunk_size or joined > max_chars
+                        or joined // CHARS_PER_TOKEN > chunk_size):
+                    yield self._join(pieces), max(count, (chars - first) // CHARS_PER_TOKEN)
+
+                    # Keep the tail as overlap, dropping more if the next piece still wouldn't fit
+                    while pieces and (max(count, (chars - first) // CHARS_PER_TOKEN) > self.overlap_size
+                                      or not self._fits(count + piece_count, chars + piece_chars - first)):
+                        old_text, old_count, old_separator = pieces.popleft()
+                        count -= old_count
+                        chars -= len(old_text) + len(old_separator)
+                        first = len(pieces[0][2]) if pieces else 0
+
+            if not pieces:
+                first = len(separator)
+            pieces.append((text, piece_count, separator))
+            count += piece_count
+            chars += piece_chars
+
+        if pieces:
+            yield self._join(pieces), max(count, (chars - first) // CHARS_PER_TOKEN)
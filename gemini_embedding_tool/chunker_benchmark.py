@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Chunker Micro-benchmark
+
+Compares the streaming Chunker with the paragraph-by-word chunker it
+replaced, on synthetic documents of increasing size. For each size it
+reports wall time, throughput, the number of chunks and how many chunks
+exceed the token budget or the embedding request's character limit.
+
+The old chunker is reproduced below for comparison only. It never
+terminates when the overlap plus the next paragraph exceeds the chunk
+size, so the generated paragraphs are kept short enough to avoid that.
+
+Usage:
+    python chunker_benchmark.py --sizes 1 4 16 --chunk-size 1000
+"""
+
+import argparse
+import io
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from chunker import MAX_CHUNK_CHARS, Chunker, estimate_tokens, iter_paragraphs
+
+VOCABULARY = (
+    "protein fiber vitamin mineral calcium iron magnesium potassium omega fatty acids "
+    "carbohydrates glucose insulin metabolism digestion absorption intake daily recommended "
+    "the of and to in is for with on as by that are be this from or an it at which "
+    "micronutrient phytochemical antioxidant inflammation cardiovascular gastrointestinal"
+).split()
+
+
+def legacy_chunk_text(text: str, chunk_size: int, overlap_size: int) -> List[Tuple[str, int]]:
+    """The previous DocumentEmbedder.chunk_text algorithm, returning (text, words)"""
+    paragraphs = text.split('\n\n')
+    chunks = []
+    current_chunk = []
+    current_size = 0
+
+    i = 0
+    while i < len(paragraphs):
+        para = paragraphs[i]
+        if not para.strip():
+            i += 1
+            continue
+
+        para_size = len(para.split())
+
+        if current_size + para_size > chunk_size and current_chunk:
+            chunks.append(('\n\n'.join(current_chunk), current_size))
+
+            overlap_paras = []
+            overlap_tokens = 0
+            for para in reversed(current_chunk):
+                para_tokens = len(para.split())
+                if overlap_tokens + para_tokens <= overlap_size:
+                    overlap_paras.insert(0, para)
+                    overlap_tokens += para_tokens
+                else:
+                    break
+
+            current_chunk = overlap_paras.copy()
+            current_size = overlap_tokens
+        else:
+            current_chunk.append(para)
+            current_size += para_size
+            i += 1
+
+    if current_chunk:
+        chunks.append(('\n\n'.join(current_chunk), current_size))
+    return chunks
+
+
+def make_document(size_mb: float, min_paragraph_words: int, max_paragraph_words: int,
+                  seed: int = 0) -> str:
+    """Generate a synthetic document of roughly ``size_mb`` megabytes"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    paragraphs = []
+    length = 0
+    while length < target:
+        sentences = []
+        words = rng.randint(min_paragraph_words, max_paragraph_words)
+        while words > 0:
+            n = min(words, rng.randint(8, 25))
+            sentences.append(" ".join(rng.choice(VOCABULARY) for _ in range(n)).capitalize() + ".")
+            words -= n
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def measure(name: str, run: Callable[[], List[Tuple[str, int]]], chunk_size: int,
+            size_mb: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    chunks = run()
+    elapsed = time.perf_counter() - start
+    return {
+        "chunker": name,
+        "seconds": elapsed,
+        "mb_per_s": size_mb / elapsed if elapsed else 0.0,
+        "chunks": len(chunks),
+        # Re-estimated the same way for both chunkers, so the counts are comparable
+        "over_token_budget": sum(1 for text, _ in chunks if estimate_tokens(text) > chunk_size),
+        "over_char_limit": sum(1 for text, _ in chunks if len(text) > MAX_CHUNK_CHARS),
+    }
+
+
+def main():
+    """Run the benchmark and print a comparison table"""
+    parser = argparse.ArgumentParser(description="Compare the streaming chunker with the previous chunker")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16],
+                        help="Document sizes in MB (default: 1 4 16)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Chunk size in tokens (default: 1000)")
+    parser.add_argument("--overlap", type=float, default=0.2, help="Overlap fraction (default: 0.2)")
+    parser.add_argument("--min-paragraph-words", type=int, default=20,
+                        help="Shortest generated paragraph in words (default: 20)")
+    parser.add_argument("--max-paragraph-words", type=int, default=200,
+                        help="Longest generated paragraph in words (default: 200)")
+    args = parser.parse_args()
+
+    overlap_size = int(args.chunk_size * args.overlap)
+    # Longer paragraphs would send the old chunker into an endless loop
+    max_paragraph_words = max(1, min(args.max_paragraph_words, args.chunk_size - overlap_size - 1))
+    min_paragraph_words = max(1, min(args.min_paragraph_words, max_paragraph_words))
+    chunker = Chunker(args.chunk_size, overlap_size)
+
+    print(f"{'Size MB':>8} {'Chunker':<10} {'Seconds':>9} {'MB/s':>8} {'Chunks':>8} "
+          f"{'>tokens':>8} {'>chars':>7}")
+    print("-" * 64)
+    for size_mb in args.sizes:
+        text = make_document(size_mb, min_paragraph_words, max_paragraph_words)
+        runs = [
+            ("previous", lambda: legacy_chunk_text(text, args.chunk_size, overlap_size)),
+            ("streaming", lambda: list(chunker.chunks(iter_paragraphs(io.StringIO(text))))),
+        ]
+        for name, run in runs:
+            result = measure(name, run, args.chunk_size, size_mb)
+            print(f"{size_mb:>8g} {name:<10} {result['seconds']:>9.3f} {result['mb_per_s']:>8.1f} "
+                  f"{result['chunks']:>8} {result['over_token_budget']:>8} {result['over_char_limit']:>7}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
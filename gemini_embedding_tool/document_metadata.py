@@ -0,0 +1,69 @@
+"""
+Per-document metadata from a manifest file
+
+A manifest describes documents by file name, e.g. Nutrition_data/nutrition_topics.json:
+
+    {"articles": [{"filename": "Proteins_Building_Blocks_of_Life.txt",
+                   "title": "Proteins: Building Blocks of Life",
+                   "topics": ["amino acids", "protein synthesis"]}]}
+
+Every field of an entry except ``filename`` is copied into the payload of
+each of that document's points, so it can be shown with search results and
+used in search filters. A top-level list of entries, or an object mapping
+file names to entries, is accepted too. Entries are matched to documents by
+their path relative to DOCS_PATH first and by file name second.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict
+
+# Payload fields written by the embedder itself, never taken from the manifest
+RESERVED_FIELDS = ("text", "filename", "chunk_index", "document")
+
+
+def load_document_metadata(path: str) -> Dict[str, Dict[str, Any]]:
+    """Read a metadata manifest
+
+    Args:
+        path: JSON manifest file
+
+    Returns:
+        Dict: Mapping of file name to the payload fields for that document
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If the file holds no recognizable list of entries
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if isinstance(manifest, dict) and isinstance(manifest.get("articles"), list):
+        entries = manifest["articles"]
+    elif isinstance(manifest, list):
+        entries = manifest
+    elif isinstance(manifest, dict) and all(isinstance(entry, dict) for entry in manifest.values()):
+        entries = [dict(entry, filename=filename) for filename, entry in manifest.items()]
+    else:
+        raise ValueError(f"{path} is not a document metadata manifest "
+                         "(expected an \"articles\" list, a list of entries or an object keyed by file name)")
+
+    metadata = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("filename"):
+            raise ValueError(f"Every entry in {path} needs a \"filename\"")
+        metadata[entry["filename"]] = {key: value for key, value in entry.items()
+                                       if key not in RESERVED_FIELDS}
+    return metadata
+
+
+def metadata_for(metadata: Dict[str, Dict[str, Any]], filename: str) -> Dict[str, Any]:
+    """Return the manifest fields of a document, matching the relative path before the file name"""
+    if filename in metadata:
+        return metadata[filename]
+    return metadata.get(filename.rsplit("/", 1)[-1], {})
+
+
+def metadata_digest(fields: Dict[str, Any]) -> str:
+    """Short hash of a document's manifest fields, so --sync notices when they change"""
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()[:16]
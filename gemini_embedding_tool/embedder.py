@@ -9,28 +9,64 @@ for efficient semantic search.
 
 import os
 import json
+import hashlib
+import uuid
 import requests
 import argparse
-import time
+import math
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
+import numpy as np
 from dotenv import load_dotenv
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("embedding_process.log"),
-        logging.StreamHandler()
-    ]
-)
+from chunker import Chunker, split_paragraphs
+from document_metadata import load_document_metadata, metadata_digest, metadata_for
+from embedding_cache import EmbeddingCache
+from http_client import HttpClient, decode_json
+from journal import IngestJournal, JournalState, chunk_map, read_journal
+from near_duplicates import DEDUP_MODES, NearDuplicateIndex
+from preprocess import discover_documents, document_chunks, iter_documents, parse_patterns, stream_document
+from projection import PROJECTION_FILENAME, Projection
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from snapshot import iter_snapshot, read_snapshot_meta, write_snapshot
+from telemetry import TRACING_MODES, configure_tracing, metrics, queued_handler, span
+from uploader import PointUploader
+from vector_store import QUANTIZATION_MODES, VECTOR_BACKENDS, create_vector_store
+
+# Set up logging; records are written by a background thread, off the pipeline's path
+_log_format = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_log_handlers = [logging.FileHandler("embedding_process.log"), logging.StreamHandler()]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_format)
+logging.basicConfig(level=logging.INFO, handlers=[queued_handler(*_log_handlers)])
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "models/embedding-001"
+# Namespace for deterministic point IDs derived from filename and chunk index
+POINT_ID_NAMESPACE = uuid.UUID("5b1f3c2e-8d4a-4e8f-9a61-2f0c7d9e4b13")
+
+def point_id_for(filename: str, chunk_index: int) -> str:
+    """Return the stable Qdrant point ID for a chunk of a document"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{filename}#{chunk_index}"))
+
 class DocumentEmbedder:
-    def __init__(self):
-        """Initialize with configuration from environment variables"""
+    def __init__(self, backend: Optional[str] = None, quantization: Optional[str] = None,
+                 sparse: Optional[bool] = None, dedup: Optional[str] = None):
+        """Initialize with configuration from environment variables
+        
+        Args:
+            backend: Vector store to write to, "qdrant" or "local" (overrides VECTOR_BACKEND)
+            quantization: "none", "scalar" or "binary" for newly created Qdrant
+                collections (overrides QUANTIZATION)
+            sparse: Also store BM25 sparse vectors for hybrid search (overrides SPARSE_VECTORS)
+            dedup: What to do with near-duplicate chunks, "off", "reuse" or "skip"
+                (overrides DEDUP)
+        """
         # Load environment variables
         load_dotenv()
         
@@ -39,126 +75,288 @@ class DocumentEmbedder:
             "qdrant_url": os.environ.get("QDRANT_URL", ""),
             "qdrant_api_key": os.environ.get("QDRANT_API_KEY", ""),
             "gemini_api_key": os.environ.get("GEMINI_API_KEY", ""),
+            "gemini_api_base": os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1").rstrip("/"),
             "collection_name": os.environ.get("COLLECTION_NAME", "document_collection"),
             "vector_size": int(os.environ.get("VECTOR_SIZE", "768")),
+            "embedding_model": os.environ.get("EMBEDDING_MODEL", EMBEDDING_MODEL),
+            "output_dimensionality": int(os.environ.get("OUTPUT_DIMENSIONALITY", "0")),
+            "projection_path": os.environ.get("PROJECTION_PATH", ""),
             "docs_path": os.environ.get("DOCS_PATH", "./docs"),
+            "docs_include": parse_patterns(os.environ.get("DOCS_INCLUDE", "*.txt")),
+            "docs_exclude": parse_patterns(os.environ.get("DOCS_EXCLUDE", "")),
+            "docs_metadata_path": os.environ.get("DOCS_METADATA_PATH", ""),
             "chunk_size": int(os.environ.get("CHUNK_SIZE", "1000")),
-            "chunk_overlap": float(os.environ.get("CHUNK_OVERLAP", "0.2"))
+            "chunk_overlap": float(os.environ.get("CHUNK_OVERLAP", "0.2")),
+            "chunk_workers": int(os.environ.get("CHUNK_WORKERS", str(os.cpu_count() or 1))),
+            "embed_batch_size": int(os.environ.get("EMBED_BATCH_SIZE", "100")),
+            "embed_concurrency": int(os.environ.get("EMBED_CONCURRENCY", "4")),
+            "embed_rate_limit": float(os.environ.get("EMBED_RATE_LIMIT", "5")),
+            "embed_max_retries": int(os.environ.get("EMBED_MAX_RETRIES", "5")),
+            "embed_cache_path": os.environ.get("EMBED_CACHE_PATH", ".embedding_cache.sqlite"),
+            "embed_cache_max_entries": int(os.environ.get("EMBED_CACHE_MAX_ENTRIES", "200000")),
+            "sync_manifest_path": os.environ.get("SYNC_MANIFEST_PATH", ".sync_manifest.json"),
+            "ingest_journal_path": os.environ.get("INGEST_JOURNAL_PATH", ".ingest_journal.jsonl"),
+            "pipeline_queue_size": int(os.environ.get("PIPELINE_QUEUE_SIZE", "8")),
+            "upsert_batch_size": int(os.environ.get("UPSERT_BATCH_SIZE", "256")),
+            "upsert_batch_bytes": int(os.environ.get("UPSERT_BATCH_BYTES", str(4 << 20))),
+            "upsert_concurrency": int(os.environ.get("UPSERT_CONCURRENCY", "4")),
+            "upsert_max_retries": int(os.environ.get("UPSERT_MAX_RETRIES", "5")),
+            "ready_timeout": float(os.environ.get("READY_TIMEOUT", "300")),
+            "snapshot_page_size": int(os.environ.get("SNAPSHOT_PAGE_SIZE", "1000")),
+            "vector_backend": backend or os.environ.get("VECTOR_BACKEND", "qdrant"),
+            "local_index_path": os.environ.get("LOCAL_INDEX_PATH", "./local_index"),
+            "quantization": quantization or os.environ.get("QUANTIZATION", "none"),
+            "quantization_quantile": float(os.environ.get("QUANTIZATION_QUANTILE", "0.99")),
+            "qdrant_compression": os.environ.get("QDRANT_COMPRESSION", "none").lower(),
+            "payload_indexes": parse_patterns(os.environ.get("PAYLOAD_INDEXES", "filename,topics")),
+            "sparse_vectors": sparse if sparse is not None
+                              else os.environ.get("SPARSE_VECTORS", "false").lower() in ("1", "true", "yes"),
+            "dedup": dedup or os.environ.get("DEDUP", "off").lower(),
+            "dedup_threshold": float(os.environ.get("DEDUP_THRESHOLD", "0.9")),
+            "dedup_permutations": int(os.environ.get("DEDUP_PERMUTATIONS", "128")),
+            "dedup_report_path": os.environ.get("DEDUP_REPORT_PATH", ""),
+            "metrics_path": os.environ.get("METRICS_PATH", ""),
+            "tracing": os.environ.get("TRACING", "off").lower(),
+            "trace_path": os.environ.get("TRACE_PATH", "embedding_trace.jsonl")
         }
         
+        if self.config["vector_backend"] not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown VECTOR_BACKEND '{self.config['vector_backend']}', "
+                             f"expected one of: {', '.join(VECTOR_BACKENDS)}")
+        
         # Validate configuration
-        required_keys = ["qdrant_url", "qdrant_api_key", "gemini_api_key"]
+        required_keys = ["gemini_api_key"]
+        if self.config["vector_backend"] == "qdrant":
+            required_keys += ["qdrant_url", "qdrant_api_key"]
         missing_keys = [key for key in required_keys if not self.config.get(key)]
         
         if missing_keys:
             logger.error(f"Missing required configuration: {', '.join(missing_keys)}")
             raise ValueError(f"Missing required configuration: {', '.join(missing_keys)}")
         
+        if self.config["dedup"] not in DEDUP_MODES:
+            raise ValueError(f"Unknown DEDUP '{self.config['dedup']}', "
+                             f"expected one of: {', '.join(DEDUP_MODES)}")
+        
+        if self.config["tracing"] not in TRACING_MODES:
+            raise ValueError(f"Unknown TRACING '{self.config['tracing']}', "
+                             f"expected one of: {', '.join(TRACING_MODES)}")
+        configure_tracing(self.config["tracing"], self.config["trace_path"])
+        
+        # batchEmbedContents accepts at most 100 requests per call
+        self.config["embed_batch_size"] = max(1, min(self.config["embed_batch_size"], 100))
+        
+        # Vectors come from the API at embedding_size and are optionally
+        # projected down to the collection's VECTOR_SIZE
+        self.projection = None
+        self.embedding_size = self.config["vector_size"]
+        if self.config["projection_path"]:
+            self.projection = Projection.load(self.config["projection_path"])
+            if self.projection.output_size != self.config["vector_size"]:
+                raise ValueError(f"PROJECTION_PATH projects to {self.projection.output_size} dimensions, "
+                                 f"but VECTOR_SIZE is {self.config['vector_size']}")
+            self.embedding_size = self.projection.input_size
+        if self.config["output_dimensionality"] and self.config["output_dimensionality"] != self.embedding_size:
+            raise ValueError(f"OUTPUT_DIMENSIONALITY is {self.config['output_dimensionality']}, but vectors of size "
+                             f"{self.embedding_size} are expected (VECTOR_SIZE, or the input size of PROJECTION_PATH)")
+        
+        # One pooled keep-alive session for every Gemini and Qdrant call,
+        # sized so each embedding worker and upsert thread can hold a connection
+        self.http = HttpClient.from_env(
+            min_pool_size=max(self.config["embed_concurrency"], self.config["upsert_concurrency"]) + 1
+        )
+        
+        # Where points are written: a Qdrant server or a local memory-mapped index
+        self.store = create_vector_store(self.config["vector_backend"], self.config, self.http)
+        
+        # Shared by all embedding worker threads; adapts to 429 responses
+        self.rate_limiter = AdaptiveRateLimiter(self.config["embed_rate_limit"])
+        
+        # Content-addressed embedding cache (disabled when EMBED_CACHE_PATH is empty)
+        self.cache = None
+        if self.config["embed_cache_path"]:
+            self.cache = EmbeddingCache(
+                self.config["embed_cache_path"],
+                self.config["embedding_model"],
+                self.embedding_size,
+                self.config["embed_cache_max_entries"]
+            )
+            logger.info(f"Using embedding cache at {self.config['embed_cache_path']}")
+        
+        # Titles, topics and other fields attached to every point of a document
+        self.document_metadata = {}
+        if self.config["docs_metadata_path"]:
+            self.document_metadata = load_document_metadata(self.config["docs_metadata_path"])
+            logger.info(f"Loaded metadata for {len(self.document_metadata)} documents "
+                        f"from {self.config['docs_metadata_path']}")
+        
         # Convert chunk overlap to number of tokens
         self.overlap_size = int(self.config["chunk_size"] * self.config["chunk_overlap"])
+        self.chunker = Chunker(self.config["chunk_size"], self.overlap_size)
         
         # Create docs directory if it doesn't exist
         os.makedirs(self.config["docs_path"], exist_ok=True)
         
-        logger.info(f"Initialized with collection: {self.config['collection_name']}")
+        logger.info(f"Initialized with collection: {self.config['collection_name']} "
+                    f"({self.config['vector_backend']} backend)")
         logger.info(f"Chunk size: {self.config['chunk_size']} tokens with {self.overlap_size} token overlap")
+        logger.info(f"Embedding model: {self.config['embedding_model']}, {self.embedding_size} dimensions"
+                    + (f" projected to {self.config['vector_size']} ({self.config['projection_path']})"
+                       if self.projection is not None else ""))
+        if self.config["sparse_vectors"]:
+            logger.info("Storing BM25 sparse vectors alongside dense embeddings")
+        if self.config["dedup"] != "off":
+            # Validates the threshold and permutations before any work is done
+            lsh = NearDuplicateIndex(self.config["dedup_threshold"], self.config["dedup_permutations"])
+            logger.info(f"Near-duplicate chunks (similarity >= {lsh.threshold}, {lsh.num_perm} permutations "
+                        f"in {lsh.bands} bands) are "
+                        + ("given the vector of the first copy" if self.config["dedup"] == "reuse"
+                           else "not stored; the first copy references them"))
+        logger.info(f"Embedding batch size: {self.config['embed_batch_size']}, "
+                    f"concurrency: {self.config['embed_concurrency']}, "
+                    f"initial rate: {self.config['embed_rate_limit']} req/s")
 
     def create_collection(self) -> bool:
-        """Create Qdrant collection if it doesn't exist
+        """Create the collection in the configured vector store if it doesn't exist
         
         Returns:
             bool: True if collection was created or already exists, False on error
         """
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.config["qdrant_api_key"]
-        }
+        if not self.store.create_collection():
+            return False
         
-        # Check if collection exists
-        try:
-            response = requests.get(
-                f"{self.config['qdrant_url']}/collections/{self.config['collection_name']}",
-                headers=headers
-            )
+        # A local collection carries its projection, so the search tool finds it without PROJECTION_PATH
+        if self.projection is not None and self.config["vector_backend"] == "local":
+            self.projection.save(str(Path(self.config["local_index_path"]) / self.config["collection_name"]
+                                     / PROJECTION_FILENAME))
+        return True
+
+    def _post_gemini(self, url: str, payload: Dict[str, Any]) -> Optional[requests.Response]:
+        """POST to the Gemini API through the shared rate limiter
+        
+        HTTP 429 responses slow the limiter down (honouring Retry-After) and
+        the request is retried up to ``embed_max_retries`` times.
+        
+        Args:
+            url: Gemini endpoint URL including the API key
+            payload: JSON request body
             
-            if response.status_code == 200:
-                logger.info(f"Collection {self.config['collection_name']} already exists.")
-                return True
-                
-            # Only proceed to create if it doesn't exist
-            if response.status_code != 404:
-                logger.error(f"Error checking collection: {response.text}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error connecting to Qdrant: {e}")
-            return False
+        Returns:
+            Response: The final response, or None if the request could not be sent
+        """
+        response = None
+        for attempt in range(self.config["embed_max_retries"] + 1):
+            with span("rate_limit_wait"):
+                self.rate_limiter.acquire()
+            try:
+                # Embedding requests have no side effects, so transient errors are retried
+                response = self.http.post(url, json=payload, idempotent=True)
+            except Exception as e:
+                logger.error(f"Error calling Gemini API: {e}")
+                return None
+            
+            if response.status_code != 429:
+                if response.status_code == 200:
+                    self.rate_limiter.on_success()
+                return response
+            
+            metrics.inc("gemini_throttled_total")
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            self.rate_limiter.on_throttle(retry_after)
+            logger.warning(f"Rate limited by Gemini API (attempt {attempt + 1}), "
+                           f"slowing to {self.rate_limiter.rate:.2f} req/s")
         
-        # Create collection with cosine distance
-        payload = {
-            "vectors": {
-                "size": self.config["vector_size"],
-                "distance": "Cosine"
-            },
-            "optimizers_config": {
-                "indexing_threshold": 0  # Index immediately
+        return response
+
+    def _embed_request(self, text: str) -> Dict[str, Any]:
+        """Build the request body for embedding one text"""
+        request = {
+            "model": self.config["embedding_model"],
+            "content": {
+                "parts": [
+                    {"text": text}
+                ]
             }
         }
+        # Models trained for it return a shorter vector instead of the full width
+        if self.config["output_dimensionality"]:
+            request["outputDimensionality"] = self.config["output_dimensionality"]
+        return request
+
+    def project(self, embeddings: List[Optional[np.ndarray]]) -> List[Optional[np.ndarray]]:
+        """Apply the PCA projection from PROJECTION_PATH, if one is configured
         
-        try:
-            response = requests.put(
-                f"{self.config['qdrant_url']}/collections/{self.config['collection_name']}",
-                headers=headers,
-                json=payload
-            )
+        Args:
+            embeddings: Embeddings at the API's width (None entries are kept)
             
-            if response.status_code == 200:
-                logger.info(f"Collection {self.config['collection_name']} created successfully.")
-                return True
-            else:
-                logger.error(f"Failed to create collection: {response.text}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error creating collection: {e}")
-            return False
+        Returns:
+            List: Embeddings at VECTOR_SIZE, in order
+        """
+        done = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        if self.projection is None or not done:
+            return embeddings
+        
+        projected = list(embeddings)
+        with span("project", vectors=len(done)):
+            matrix = self.projection.apply(np.stack([embeddings[i] for i in done]))
+        for row, i in enumerate(done):
+            projected[i] = matrix[row]
+        return projected
 
-    def get_embedding(self, text: str) -> Optional[List[float]]:
+    def get_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Get embedding vector, from the cache if possible, otherwise from Gemini API
+        
+        Args:
+            text: The text to embed
+            
+        Returns:
+            np.ndarray: float32 embedding vector, or None on error
+        """
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                return cached
+        
+        embedding = self._request_embedding(text)
+        
+        if embedding is not None and self.cache is not None:
+            self.cache.put(text, embedding)
+        
+        return embedding
+
+    def _request_embedding(self, text: str) -> Optional[np.ndarray]:
         """Get embedding vector from Gemini API
         
         Args:
             text: The text to embed
             
         Returns:
-            List[float]: Embedding vector, or None on error
+            np.ndarray: float32 embedding vector, or None on error
         """
-        url = f"https://generativelanguage.googleapis.com/v1/models/embedding-001:embedContent?key={self.config['gemini_api_key']}"
+        url = f"{self.config['gemini_api_base']}/{self.config['embedding_model']}:embedContent?key={self.config['gemini_api_key']}"
         
         # Trim text if too long (API has limits)
         if len(text) > 25000:
             text = text[:25000]
             logger.warning(f"Text truncated to 25000 characters")
         
-        payload = {
-            "model": "models/embedding-001",
-            "content": {
-                "parts": [
-                    {"text": text}
-                ]
-            }
-        }
+        payload = self._embed_request(text)
         
         try:
-            response = requests.post(url, json=payload)
+            with span("embed", texts=1):
+                response = self._post_gemini(url, payload)
+            
+            if response is None:
+                return None
             
             if response.status_code != 200:
                 logger.error(f"Error getting embedding: {response.text}")
                 return None
             
-            result = response.json()
+            result = decode_json(response.content)
             
             if "embedding" in result and "values" in result["embedding"]:
-                return result["embedding"]["values"]
+                return np.asarray(result["embedding"]["values"], dtype=np.float32)
             else:
                 logger.error(f"Unexpected response format: {result}")
                 return None
@@ -167,6 +365,120 @@ class DocumentEmbedder:
             logger.error(f"Error getting embedding: {e}")
             return None
 
+    def get_embeddings(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Get embedding vectors for several texts
+        
+        Texts already in the embedding cache are served from it; only the
+        rest are sent to Gemini, and their new vectors are cached.
+        
+        Args:
+            texts: The texts to embed
+            
+        Returns:
+            List: One embedding per input text, in order (None where embedding failed)
+        """
+        if self.cache is None:
+            return self._embed_uncached(texts)
+        
+        with span("cache_lookup", texts=len(texts)):
+            embeddings = self.cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+            fresh = self._embed_uncached([texts[i] for i in missing])
+            
+            done = [(i, embedding) for i, embedding in zip(missing, fresh) if embedding is not None]
+            self.cache.put_many([texts[i] for i, _ in done], [embedding for _, embedding in done])
+            
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+        
+        return embeddings
+
+    def _embed_uncached(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Get embedding vectors for several texts using batchEmbedContents
+        
+        Texts are sent in groups of ``embed_batch_size``, with up to
+        ``embed_concurrency`` batches in flight at once. If a whole batch is
+        rejected, or the response leaves some items without values, those
+        items are retried one at a time.
+        
+        Args:
+            texts: The texts to embed
+            
+        Returns:
+            List: One embedding per input text, in order (None where embedding failed)
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        batch_size = self.config["embed_batch_size"]
+        starts = list(range(0, len(texts), batch_size))
+        
+        def embed_from(start: int) -> None:
+            batch = texts[start:start + batch_size]
+            batch_embeddings = self._embed_batch(batch)
+            
+            for offset, embedding in enumerate(batch_embeddings):
+                if embedding is None:
+                    logger.warning(f"Batch item {start + offset} failed, retrying individually")
+                    embedding = self._request_embedding(batch[offset])
+                embeddings[start + offset] = embedding
+        
+        workers = max(1, min(self.config["embed_concurrency"], len(starts)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Consume the iterator so worker exceptions are raised here
+            list(executor.map(embed_from, starts))
+        
+        return embeddings
+
+    def _embed_batch(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Send one batchEmbedContents request
+        
+        Args:
+            texts: Up to ``embed_batch_size`` texts to embed
+            
+        Returns:
+            List: One embedding per input text (None for items missing from the response)
+        """
+        url = f"{self.config['gemini_api_base']}/{self.config['embedding_model']}:batchEmbedContents?key={self.config['gemini_api_key']}"
+        
+        requests_payload = []
+        for text in texts:
+            # Trim text if too long (API has limits)
+            if len(text) > 25000:
+                text = text[:25000]
+                logger.warning(f"Text truncated to 25000 characters")
+            
+            requests_payload.append(self._embed_request(text))
+        
+        try:
+            with span("embed", texts=len(texts)):
+                response = self._post_gemini(url, {"requests": requests_payload})
+            
+            if response is None:
+                return [None] * len(texts)
+            
+            if response.status_code != 200:
+                logger.error(f"Error getting batch embeddings: {response.text}")
+                return [None] * len(texts)
+            
+            result = decode_json(response.content)
+            
+        except Exception as e:
+            logger.error(f"Error getting batch embeddings: {e}")
+            return [None] * len(texts)
+        
+        items = result.get("embeddings", [])
+        if len(items) != len(texts):
+            logger.warning(f"Batch returned {len(items)} embeddings for {len(texts)} texts")
+        
+        embeddings: List[Optional[np.ndarray]] = []
+        for i in range(len(texts)):
+            values = items[i].get("values") if i < len(items) and items[i] else None
+            embeddings.append(np.asarray(values, dtype=np.float32) if values else None)
+        
+        return embeddings
+
     def chunk_text(self, text: str, filename: str) -> List[Dict[str, Any]]:
         """Split text into chunks with overlap
         
@@ -175,216 +487,923 @@ class DocumentEmbedder:
             filename: The source filename for metadata
             
         Returns:
-            List[Dict]: List of chunk objects with text and metadata
+            List[Dict]: List of chunk objects with text and metadata, plus a
+            "sparse_vector" when sparse vectors are enabled
         """
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        chunk_index = 0
-        
-        # Get document title from filename
-        title = Path(filename).stem.replace('_', ' ').title()
-        
-        # Process paragraphs
-        i = 0
-        while i < len(paragraphs):
-            para = paragraphs[i]
-            # Skip empty paragraphs
-            if not para.strip():
-                i += 1
-                continue
-                
-            # Rough estimation of tokens (words)
-            para_size = len(para.split())
-            
-            # If adding this paragraph would exceed chunk size and we already have content
-            if current_size + para_size > self.config["chunk_size"] and current_chunk:
-                # Save the current chunk
-                chunk_text = '\n\n'.join(current_chunk)
-                chunks.append({
-                    "text": chunk_text,
-                    "chunk_index": chunk_index,
-                    "filename": os.path.basename(filename),
-                    "title": title,
-                    "chunk_size": current_size
-                })
-                
-                # Start the next chunk with overlap
-                overlap_paras = []
-                # Add enough paragraphs from the current chunk to meet the overlap size
-                overlap_tokens = 0
-                for para in reversed(current_chunk):
-                    para_tokens = len(para.split())
-                    if overlap_tokens + para_tokens <= self.overlap_size:
-                        overlap_paras.insert(0, para)
-                        overlap_tokens += para_tokens
-                    else:
-                        break
-                
-                # Reset for next chunk with overlap
-                current_chunk = overlap_paras.copy()
-                current_size = overlap_tokens
-                chunk_index += 1
-                # Don't increment i, process the current paragraph again
-            else:
-                # Add to current chunk
-                current_chunk.append(para)
-                current_size += para_size
-                i += 1  # Move to next paragraph
-        
-        # Add the last chunk if it has content
-        if current_chunk:
-            chunk_text = '\n\n'.join(current_chunk)
-            chunks.append({
-                "text": chunk_text,
-                "chunk_index": chunk_index,
-                "filename": os.path.basename(filename),
-                "title": title,
-                "chunk_size": current_size
-            })
-        
-        logger.info(f"Split '{title}' into {len(chunks)} chunks")
+        chunks = list(document_chunks(split_paragraphs(text), os.path.basename(filename),
+                                      self.chunker, self.config["sparse_vectors"]))
+        logger.info(f"Split '{filename}' into {len(chunks)} chunks")
         return chunks
 
-    def process_and_upload_documents(self, reset_collection=False):
+    def chunk_file(self, file_path: Path, filename: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream the chunks of a file without reading it into memory
+        
+        Args:
+            file_path: UTF-8 text file to chunk
+            filename: Document identifier for the payload (defaults to the file name)
+            
+        Yields:
+            Dict: Chunk objects, as returned by chunk_text
+        """
+        yield from stream_document(file_path, filename or file_path.name, self.chunker,
+                                   self.config["sparse_vectors"])
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """Load the per-file content hashes recorded by the last run
+        
+        Returns:
+            Dict: Mapping of filename to {"sha256", "chunks"}; empty if there is
+            no manifest or it belongs to a different collection
+        """
+        path = self.config["sync_manifest_path"]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+            return {}
+        
+        if manifest.get("collection") != self.config["collection_name"]:
+            logger.info(f"Manifest {path} belongs to another collection, ignoring it")
+            return {}
+        
+        return manifest.get("files", {})
+
+    def _save_manifest(self, files: Dict[str, Dict[str, Any]]) -> None:
+        """Atomically write the per-file content hashes for this collection"""
+        path = self.config["sync_manifest_path"]
+        tmp_path = f"{path}.tmp"
+        
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"collection": self.config["collection_name"], "files": files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _delete_document_points(self, filename: str) -> bool:
+        """Delete every point of a document (delete-by-filter on Qdrant)
+        
+        Args:
+            filename: Value of the ``filename`` payload field to match
+            
+        Returns:
+            bool: True if the delete succeeded
+        """
+        with span("delete", filename=filename):
+            deleted = self.store.delete_by_filename(filename)
+        if deleted:
+            logger.info(f"  Deleted stale points for {filename}")
+            return True
+        return False
+
+    def _uploader(self, journal: Optional[IngestJournal] = None) -> PointUploader:
+        """Create an upload engine with the configured batch limits and concurrency
+        
+        Args:
+            journal: Journal every confirmed batch is recorded in
+        """
+        on_stored = None
+        if journal is not None:
+            def on_stored(batch: List[Dict[str, Any]]) -> None:
+                journal.log("upserted", sync=True, chunks=chunk_map(batch))
+        
+        return PointUploader(
+            self.store,
+            max_points=self.config["upsert_batch_size"],
+            max_bytes=self.config["upsert_batch_bytes"],
+            concurrency=self.config["upsert_concurrency"],
+            max_retries=self.config["upsert_max_retries"],
+            on_stored=on_stored
+        )
+
+    def _wait_until_ready(self) -> Optional[int]:
+        """Wait once for every upsert to be indexed and log the collection's point count
+        
+        Returns:
+            int: Points in the collection, or None if it did not become ready
+        """
+        with span("barrier"):
+            count = self.store.wait_until_ready(self.config["ready_timeout"])
+        if count is None:
+            logger.warning(f"Collection {self.config['collection_name']} did not report ready "
+                           f"within {self.config['ready_timeout']:.0f}s")
+        else:
+            metrics.set("collection_points", count)
+            logger.info(f"Collection {self.config['collection_name']} is ready with {count} points")
+        return count
+
+    def _plan_run(self, docs_path: Path, reset_collection: bool,
+                  sync: bool) -> Optional[Tuple[Dict[str, Dict[str, Any]], Dict[str, str], List[str], List[str]]]:
+        """Find the documents to embed, deleting stale points first when syncing
+        
+        Returns:
+            Tuple: The sync manifest, content hash per document, the documents
+            to embed and the removed documents whose points were deleted; or
+            None if there are no documents
+        """
+        # A reset collection starts from an empty manifest
+        manifest = {} if reset_collection else self._load_manifest()
+        
+        # Find documents anywhere below the docs directory, keyed by relative path
+        text_files = discover_documents(docs_path, self.config["docs_include"], self.config["docs_exclude"])
+        
+        if not text_files and not (sync and manifest):
+            logger.warning(f"No files matching {', '.join(self.config['docs_include'])} found in {self.config['docs_path']}")
+            return None
+            
+        logger.info(f"Found {len(text_files)} text files to process")
+        
+        # Hash each document without keeping its content in memory
+        documents = {}
+        for filename, file_path in text_files:
+            try:
+                documents[filename] = self._hash_file(file_path)
+            except Exception as e:
+                logger.error(f"Error reading file {filename}: {e}")
+        
+        removed = []
+        if sync:
+            # Documents whose manifest fields changed are re-uploaded like edited ones
+            metadata_digests = self._metadata_digests(documents)
+            changed = [name for name, digest in documents.items()
+                       if manifest.get(name, {}).get("sha256") != digest
+                       or manifest.get(name, {}).get("metadata") != metadata_digests.get(name)]
+            removed = [name for name in manifest if name not in documents]
+            
+            # A document sharing near-duplicate chunks with a changed one may hold
+            # their only point, or reference chunks that are gone; re-process it too
+            linked = self._linked_documents(manifest, changed + removed)
+            linked = [name for name in documents if name in linked]
+            unchanged = len(documents) - len(changed)
+            changed += linked
+            
+            logger.info(f"Sync: {len(changed) - len(linked)} new or changed, {len(removed)} removed, "
+                        f"{unchanged} unchanged")
+            if linked:
+                logger.info(f"Sync: re-processing {len(linked)} unchanged documents that share "
+                            f"near-duplicate chunks with new, changed or removed ones")
+            
+            # Drop stale points before re-uploading, so shrunken files leave nothing behind
+            for filename in removed:
+                if self._delete_document_points(filename):
+                    del manifest[filename]
+            for filename in changed:
+                if filename in manifest and self._delete_document_points(filename):
+                    del manifest[filename]
+            removed = [filename for filename in removed if filename not in manifest]
+        else:
+            changed = list(documents)
+        
+        return manifest, documents, changed, removed
+
+    @staticmethod
+    def _linked_documents(manifest: Dict[str, Dict[str, Any]], filenames: Iterable[str]) -> Set[str]:
+        """Documents reachable from ``filenames`` through the manifest's near-duplicate links, excluding them"""
+        start = set(filenames)
+        linked = set(start)
+        pending = list(start)
+        while pending:
+            for other in manifest.get(pending.pop(), {}).get("near_duplicates", []):
+                if other not in linked:
+                    linked.add(other)
+                    pending.append(other)
+        return linked - start
+
+    def _metadata_digests(self, filenames: Iterable[str]) -> Dict[str, str]:
+        """Hash of each document's DOCS_METADATA_PATH entry, for documents that have one"""
+        digests = {}
+        for filename in filenames:
+            fields = metadata_for(self.document_metadata, filename)
+            if fields:
+                digests[filename] = metadata_digest(fields)
+        return digests
+
+    def _journal_settings(self) -> Dict[str, Any]:
+        """Settings that decide chunk boundaries and vectors; a run can only be resumed with the same ones"""
+        return {
+            "collection": self.config["collection_name"],
+            "backend": self.config["vector_backend"],
+            "model": self.config["embedding_model"],
+            "vector_size": self.config["vector_size"],
+            "output_dimensionality": self.config["output_dimensionality"],
+            "projection": self.projection.fingerprint if self.projection is not None else None,
+            "sparse": self.config["sparse_vectors"],
+            "chunk_size": self.config["chunk_size"],
+            "chunk_overlap": self.overlap_size,
+            "dedup": self.config["dedup"],
+            "dedup_threshold": self.config["dedup_threshold"] if self.config["dedup"] != "off" else None,
+        }
+
+    def _read_journal(self) -> Optional[JournalState]:
+        """Load the interrupted run to resume, or None if the journal records none
+        
+        Raises:
+            ValueError: If the run was made with different settings
+        """
+        state = read_journal(self.config["ingest_journal_path"])
+        if state is None:
+            logger.info(f"No interrupted run recorded in {self.config['ingest_journal_path'] or 'INGEST_JOURNAL_PATH'}; "
+                        f"starting a new run")
+            return None
+        
+        settings = self._journal_settings()
+        recorded = state.header.get("settings", {})
+        different = [key for key in settings if recorded.get(key) != settings[key]]
+        if different:
+            raise ValueError(f"The interrupted run used different settings ({', '.join(different)}); "
+                             f"restore them or start a new run without --resume")
+        
+        stored = sum(len(indexes) for indexes in state.upserted.values())
+        embedded = sum(len(indexes) for indexes in state.embedded.values())
+        complete = sum(1 for filename in state.header["documents"] if state.is_complete(filename))
+        logger.info(f"Resuming interrupted run: {complete} of {len(state.header['documents'])} documents and "
+                    f"{stored} chunks stored, {embedded} chunks embedded, {len(state.failed)} failed points to retry")
+        if embedded > stored and self.cache is None:
+            logger.warning("EMBED_CACHE_PATH is empty, so chunks embedded but not stored are embedded again")
+        return state
+
+    def _plan_resume(self, state: JournalState,
+                     docs_path: Path) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str], List[str]]:
+        """Rebuild an interrupted run's plan from its journal
+        
+        Documents that changed or disappeared since the interrupted run lose
+        their points and journaled progress; changed ones are embedded again.
+        
+        Returns:
+            Tuple: The sync manifest, content hash per document and the documents of the run
+        """
+        header = state.header
+        manifest = {} if header["reset"] else self._load_manifest()
+        for filename in header["removed"]:
+            manifest.pop(filename, None)
+        
+        documents = {}
+        for filename, digest in header["documents"].items():
+            try:
+                current = self._hash_file(docs_path / filename)
+            except Exception as e:
+                current = None
+                logger.warning(f"{filename} can no longer be read, leaving it out: {e}")
+            
+            if current != digest:
+                if current is not None:
+                    logger.info(f"{filename} changed since the interrupted run; embedding it again")
+                self._delete_document_points(filename)
+                manifest.pop(filename, None)
+                state.chunk_counts.pop(filename, None)
+                state.upserted.pop(filename, None)
+                for key in [key for key in state.failed if key[0] == filename]:
+                    del state.failed[key]
+            if current is not None:
+                documents[filename] = current
+        
+        return manifest, documents, list(documents)
+
+    def process_and_upload_documents(self, reset_collection=False, sync=False, resume=False):
         """Process documents and upload to Qdrant
         
+        Point IDs are derived from filename and chunk index, so re-running
+        overwrites the same points. After each run the content hash of every
+        uploaded file is recorded in the sync manifest. While the run goes,
+        chunking, embedding and every confirmed upsert are recorded in the
+        ingest journal (see journal.py).
+        
         Args:
             reset_collection: If True, delete and recreate the collection
+            sync: If True, only re-embed files whose content changed since the
+                last run, and delete points of changed or removed files
+            resume: If True, continue the run recorded in the ingest journal:
+                stored chunks are skipped, points whose upsert failed are sent
+                again from their journaled vectors, and reset_collection and
+                sync are taken from that run
         """
+        state = self._read_journal() if resume else None
+        
         # Delete collection if reset requested
-        if reset_collection:
+        if reset_collection and state is None:
             logger.info(f"Deleting collection {self.config['collection_name']}...")
-            headers = {
-                "Content-Type": "application/json",
-                "api-key": self.config["qdrant_api_key"]
-            }
-            
-            try:
-                response = requests.delete(
-                    f"{self.config['qdrant_url']}/collections/{self.config['collection_name']}",
-                    headers=headers
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Collection {self.config['collection_name']} deleted successfully.")
-                else:
-                    logger.warning(f"Failed to delete collection: {response.text}")
-            except Exception as e:
-                logger.error(f"Error deleting collection: {e}")
+            self.store.delete_collection()
         
         # Create collection
         if not self.create_collection():
             logger.error("Failed to create collection. Exiting.")
             return
         
-        # Get all text files in the docs directory
         docs_path = Path(self.config["docs_path"])
-        text_files = list(docs_path.glob("*.txt"))
+        if state is not None:
+            manifest, documents, changed = self._plan_resume(state, docs_path)
+        else:
+            plan = self._plan_run(docs_path, reset_collection, sync)
+            if plan is None:
+                return
+            manifest, documents, changed, removed = plan
         
-        if not text_files:
-            logger.warning(f"No .txt files found in {self.config['docs_path']}")
-            return
-            
-        logger.info(f"Found {len(text_files)} text files to process")
+        metadata_digests = self._metadata_digests(documents)
         
-        points = []
-        point_id = 1
-        total_chunks = 0
+        journal = None
+        if self.config["ingest_journal_path"]:
+            if state is None and os.path.exists(self.config["ingest_journal_path"]):
+                logger.warning(f"Discarding the unfinished run recorded in {self.config['ingest_journal_path']} "
+                               f"(use --resume to continue it instead)")
+            journal = IngestJournal(self.config["ingest_journal_path"], resume=state is not None)
+            if state is not None:
+                journal.log("resume", sync=True)
+            else:
+                journal.log("start", sync=True, settings=self._journal_settings(), reset=bool(reset_collection),
+                            sync_run=bool(sync), removed=removed,
+                            documents={filename: documents[filename] for filename in changed})
+        
+        # Documents the interrupted run stored completely are not read again, unless
+        # their chunks are needed to recognize near-duplicates (none are re-embedded)
+        pending = [filename for filename in changed
+                   if state is None or self.config["dedup"] != "off" or not state.is_complete(filename)]
         
-        # Process each document
-        for file_path in text_files:
-            filename = file_path.name
+        logger.info(f"Embedding chunks from {len(pending)} documents in batches of {self.config['embed_batch_size']} "
+                    f"with {self.config['embed_concurrency']} concurrent requests...")
+        
+        start = time.perf_counter()
+        try:
+            with span("ingest", documents=len(pending)):
+                result = self._run_pipeline([(filename, docs_path / filename) for filename in pending],
+                                            journal, state)
+            self._wait_until_ready()
+            if result["duplicates"]:
+                with span("dedup_resolve", duplicates=len(result["duplicates"])):
+                    resolved = self._resolve_duplicates(result["duplicates"], journal)
+                result["uploaded"] += resolved["uploaded"]
+                result["rewritten"] = resolved["rewritten"]
+                result["incomplete"].update(resolved["incomplete"])
+                self._wait_until_ready()
+        except BaseException:
+            if journal is not None:
+                journal.close()
+            raise
+        finally:
+            self.store.close()
+        elapsed = time.perf_counter() - start
+        metrics.set("ingest_seconds", elapsed)
+        metrics.set("ingest_chunks_per_second", result["chunks"] / elapsed if elapsed else 0.0)
+        metrics.set("ingest_documents_per_second", len(pending) / elapsed if elapsed else 0.0)
+        
+        if state is not None:
+            for filename in changed:
+                if filename not in pending:
+                    result["chunk_counts"][filename] = state.chunk_counts[filename]
+        if result["incomplete"] and journal is not None:
+            logger.warning(f"{len(result['incomplete'])} documents are incomplete; run with --resume "
+                           f"to retry them from {self.config['ingest_journal_path']}")
+        
+        if self.cache is not None:
+            stats = self.cache.stats()
+            logger.info(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                        f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries, "
+                        f"{stats['evictions']} evicted")
+        
+        if self.rate_limiter.throttle_count:
+            logger.info(f"Gemini API throttled {self.rate_limiter.throttle_count} times; "
+                        f"final rate {self.rate_limiter.rate:.2f} req/s")
+        
+        logger.info(f"Processed {result['chunks']} chunks from {len(changed)} documents")
+        if self.config["dedup"] != "off":
+            self._report_duplicates(result["duplicates"], result["chunks"])
+        
+        # Documents sharing near-duplicates are re-processed together by --sync
+        linked: Dict[str, Set[str]] = {}
+        for chunk, canonical, _ in result["duplicates"]:
+            if chunk["filename"] != canonical[0]:
+                linked.setdefault(chunk["filename"], set()).add(canonical[0])
+                linked.setdefault(canonical[0], set()).add(chunk["filename"])
+        
+        # Record what is now in the collection
+        for filename in changed:
+            if filename not in result["incomplete"]:
+                manifest[filename] = {"sha256": documents[filename], "chunks": result["chunk_counts"].get(filename, 0)}
+                if filename in metadata_digests:
+                    manifest[filename]["metadata"] = metadata_digests[filename]
+                if filename in linked:
+                    manifest[filename]["near_duplicates"] = sorted(linked[filename])
+        self._save_manifest(manifest)
+        if journal is not None:
+            # Kept while points are missing, so --resume can still retry them
+            journal.close(remove=not result["incomplete"])
+        
+        for endpoint, stats in self.http.stats().items():
+            logger.info(f"HTTP {endpoint}: {stats['requests']} requests over {stats['connections']} connections "
+                        f"({stats['reuse_rate']:.0%} reused), {stats['retries']} retries")
+        
+        logger.info(f"Throughput: {result['chunks'] / elapsed if elapsed else 0.0:.1f} chunks/s, "
+                    f"{len(changed) / elapsed if elapsed else 0.0:.2f} documents/s over {elapsed:.1f}s")
+        for line in metrics.stage_summary():
+            logger.info(f"Stage {line}")
+        if self.config["metrics_path"]:
+            metrics.write(self.config["metrics_path"])
+            logger.info(f"Metrics written to {self.config['metrics_path']}")
+        
+        logger.info(f"Successfully processed and uploaded {result['uploaded']} chunks "
+                    f"to the {self.config['vector_backend']} vector store")
+        if result.get("rewritten"):
+            logger.info(f"Updated {result['rewritten']} stored points with references to their skipped near-duplicates")
+        return result["uploaded"]
+
+    def export_snapshot(self, path: str) -> int:
+        """Write every point of the collection to a snapshot directory
+        
+        The collection is scrolled page by page into a float32 ``.npy``
+        matrix with a JSON lines payload sidecar (see snapshot.py), together
+        with the sync manifest, so import_snapshot() can rebuild the
+        collection without calling Gemini.
+        
+        Args:
+            path: Snapshot directory
             
-            logger.info(f"Processing {filename}...")
+        Returns:
+            int: Number of points exported
+        """
+        logger.info(f"Exporting collection {self.config['collection_name']} to {path}...")
+        start = time.perf_counter()
+        try:
+            with span("snapshot_export"):
+                count = write_snapshot(
+                    path,
+                    self.store.scroll(self.config["snapshot_page_size"]),
+                    self.config["vector_size"],
+                    {"collection": self.config["collection_name"], "model": self.config["embedding_model"],
+                     "projection": self.projection.fingerprint if self.projection is not None else None,
+                     "files": self._load_manifest()}
+                )
+        finally:
+            self.store.close()
+        
+        elapsed = time.perf_counter() - start
+        logger.info(f"Exported {count} points in {elapsed:.1f}s "
+                    f"({count / elapsed if elapsed else 0.0:.0f} points/s)")
+        return count
+
+    def import_snapshot(self, path: str, reset_collection: bool = False) -> int:
+        """Bulk-load a snapshot written by export_snapshot() into the collection
+        
+        Points keep their IDs, so importing into a collection that already
+        holds them overwrites instead of duplicating. The snapshot's sync
+        manifest becomes this collection's manifest. A full-width snapshot
+        can be loaded into a smaller collection through PROJECTION_PATH.
+        
+        Args:
+            path: Snapshot directory
+            reset_collection: If True, delete and recreate the collection first
             
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-            except Exception as e:
-                logger.error(f"Error reading file {filename}: {e}")
-                continue
+        Returns:
+            int: Number of points uploaded
+        """
+        meta = read_snapshot_meta(path)
+        projection = None
+        if meta["size"] != self.config["vector_size"]:
+            if self.projection is None or meta["size"] != self.projection.input_size:
+                raise ValueError(f"Snapshot vectors have size {meta['size']}, "
+                                 f"but VECTOR_SIZE is {self.config['vector_size']}")
+            logger.info(f"Projecting snapshot vectors from {meta['size']} to {self.config['vector_size']} dimensions")
+            projection = self.projection
+        elif self.projection is not None and meta.get("projection") != self.projection.fingerprint:
+            logger.warning("Snapshot was not built with the projection in PROJECTION_PATH; "
+                           "queries will be projected differently from its vectors")
+        if meta.get("model") != self.config["embedding_model"]:
+            logger.warning(f"Snapshot was embedded with {meta.get('model')}, not {self.config['embedding_model']}")
+        
+        # A snapshot with sparse vectors needs a collection that can hold them
+        if meta.get("sparse") and not self.config["sparse_vectors"]:
+            logger.info("Snapshot contains BM25 sparse vectors; enabling them for this collection")
+            self.config["sparse_vectors"] = True
+            self.store = create_vector_store(self.config["vector_backend"], self.config, self.http)
+        
+        if reset_collection:
+            logger.info(f"Deleting collection {self.config['collection_name']}...")
+            self.store.delete_collection()
+        if not self.create_collection():
+            raise RuntimeError("Failed to create collection")
+        
+        logger.info(f"Importing {meta['count']} points from {path} into {self.config['collection_name']}...")
+        start = time.perf_counter()
+        uploader = self._uploader()
+        try:
+            with span("snapshot_import", points=meta["count"]):
+                batch = []
+                for point in iter_snapshot(path):
+                    batch.append(point)
+                    if len(batch) >= self.config["embed_batch_size"] or projection is None:
+                        self._add_imported(uploader, batch, projection)
+                        batch = []
+                self._add_imported(uploader, batch, projection)
+                uploaded, failed = uploader.finish()
+            self._wait_until_ready()
+        finally:
+            self.store.close()
+        
+        elapsed = time.perf_counter() - start
+        if failed:
+            logger.error(f"Failed to import {len(failed)} points")
+        
+        # Documents with a point that failed to import are re-embedded by the next --sync
+        failed_files = {point["payload"].get("filename") for point in failed}
+        self._save_manifest({filename: entry for filename, entry in meta.get("files", {}).items()
+                             if filename not in failed_files})
+        
+        logger.info(f"Imported {uploaded} points in {elapsed:.1f}s "
+                    f"({uploaded / elapsed if elapsed else 0.0:.0f} points/s)")
+        return uploaded
+
+    @staticmethod
+    def _add_imported(uploader: PointUploader, points: List[Dict[str, Any]],
+                      projection: Optional[Projection]) -> None:
+        """Queue imported points, projecting their vectors as one matrix"""
+        if projection is not None and points:
+            vectors = projection.apply(np.stack([point["vector"] for point in points]))
+            for point, vector in zip(points, vectors):
+                point["vector"] = vector
+        for point in points:
+            uploader.add(point)
+
+    @staticmethod
+    def _hash_file(file_path: Path) -> str:
+        """Return the SHA-256 of a file, read in fixed-size blocks"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _chunk_point(self, chunk: Dict[str, Any], vector: np.ndarray) -> Dict[str, Any]:
+        """Build the point stored for a chunk
+        
+        Args:
+            chunk: Chunk object from the chunker
+            vector: Embedding of the chunk
+        """
+        point = {
+            "id": point_id_for(chunk["filename"], chunk["chunk_index"]),
+            "vector": vector,
+            "payload": {
+                "text": chunk["text"],
+                "title": chunk["title"],
+                "filename": chunk["filename"],
+                "chunk_index": chunk["chunk_index"],
+                "document": chunk["filename"],
+                # Manifest fields such as title and topics
+                **metadata_for(self.document_metadata, chunk["filename"])
+            }
+        }
+        if "sparse_vector" in chunk:
+            point["sparse_vector"] = chunk["sparse_vector"]
+        return point
+
+    def _run_pipeline(self, documents: List[Tuple[str, Path]], journal: Optional[IngestJournal] = None,
+                      state: Optional[JournalState] = None) -> Dict[str, Any]:
+        """Stream documents through read -> chunk -> embed -> upsert
+        
+        The stages run concurrently and are connected by bounded queues, so
+        upserts start as soon as the first batch is embedded and the number
+        of chunks and points held in memory stays constant regardless of
+        corpus size. Documents are read and chunked on a pool of
+        ``chunk_workers`` processes and handed to the calling thread in
+        order, a pool of ``embed_concurrency`` threads embeds batches, and a
+        single thread hands points to the upload engine, which keeps
+        ``upsert_concurrency`` upserts in flight without waiting for indexing.
+        
+        With DEDUP enabled, every chunk is looked up in a MinHash LSH index of
+        the run's earlier chunks before it is queued. Near-duplicates are not
+        embedded; they are returned for _resolve_duplicates(), which stores
+        them once the chunks they duplicate are stored.
+        
+        Args:
+            documents: (filename, path) pairs of the documents to process
+            journal: Journal the run's progress is appended to
+            state: Interrupted run being resumed; its stored chunks are not
+                embedded again and its failed points are upserted first
             
-            # Split into chunks
-            document_chunks = self.chunk_text(content, filename)
-            total_chunks += len(document_chunks)
+        Returns:
+            Dict: Totals with keys "chunks", "uploaded", "chunk_counts" (chunks
+            per filename), "incomplete" (filenames with a failed chunk or upsert)
+            and "duplicates" ((chunk, canonical (filename, chunk index),
+            similarity) for every near-duplicate chunk)
+        """
+        queue_size = max(1, self.config["pipeline_queue_size"])
+        chunk_batches: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=queue_size)
+        point_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(
+            maxsize=queue_size * self.config["embed_batch_size"]
+        )
+        
+        lock = threading.Lock()
+        retry_points = list(state.failed.values()) if state is not None else []
+        chunk_counts: Dict[str, int] = {}
+        incomplete = set()
+        uploaded = [0]
+        near_duplicates = None
+        if self.config["dedup"] != "off":
+            near_duplicates = NearDuplicateIndex(self.config["dedup_threshold"], self.config["dedup_permutations"])
+        duplicates = []
+        
+        def embed_worker() -> None:
+            while True:
+                batch = chunk_batches.get()
+                if batch is None:
+                    return
+                
+                try:
+                    embeddings = self.project(self.get_embeddings([chunk["text"] for chunk in batch]))
+                except Exception as e:
+                    logger.error(f"  Error embedding batch: {e}")
+                    embeddings = [None] * len(batch)
+                
+                embedded = []
+                for chunk, embedding in zip(batch, embeddings):
+                    if embedding is not None:
+                        point = self._chunk_point(chunk, embedding)
+                        point_queue.put(point)
+                        embedded.append(point)
+                    else:
+                        logger.error(f"  Failed to embed chunk {chunk['chunk_index'] + 1} of {chunk['filename']}")
+                        with lock:
+                            incomplete.add(chunk["filename"])
+                if journal is not None and embedded:
+                    journal.log("embedded", chunks=chunk_map(embedded))
+        
+        def upload_worker() -> None:
+            uploader = self._uploader(journal)
+            # Points that failed in the interrupted run go first, without re-embedding
+            for point in retry_points:
+                uploader.add(point)
+            while True:
+                point = point_queue.get()
+                if point is None:
+                    break
+                uploader.add(point)
             
-            for i, chunk in enumerate(document_chunks):
-                logger.info(f"  Embedding chunk {i+1}/{len(document_chunks)}...")
+            stored, failed = uploader.finish()
+            if uploader.retries:
+                logger.info(f"Retried {uploader.retries} failed upsert batches")
+            if failed:
+                logger.error(f"Failed to upload {len(failed)} points after "
+                             f"{self.config['upsert_max_retries']} retries")
+            if journal is not None and failed:
+                journal.log("failed", sync=True, points=failed)
+            with lock:
+                uploaded[0] += stored
+                incomplete.update(point["payload"]["filename"] for point in failed)
+        
+        num_workers = max(1, self.config["embed_concurrency"])
+        embedders = [threading.Thread(target=embed_worker, daemon=True) for _ in range(num_workers)]
+        uploader = threading.Thread(target=upload_worker, daemon=True)
+        for thread in embedders + [uploader]:
+            thread.start()
+        
+        batch = []
+        total_chunks = 0
+        try:
+            prepared = iter_documents(documents, self.chunker, self.config["sparse_vectors"],
+                                      workers=self.config["chunk_workers"],
+                                      minhash_permutations=near_duplicates.num_perm if near_duplicates is not None else 0)
+            for filename, chunks in prepared:
+                logger.info(f"Processing {filename}...")
+                started = time.perf_counter()
+                blocked = 0.0
+                settled = state.settled(filename) if state is not None else set()
                 
-                # Get embedding
-                embedding = self.get_embedding(chunk["text"])
+                # Chunks are queued as they arrive from the worker or the file stream
+                try:
+                    for chunk in chunks:
+                        chunk_counts[filename] = chunk_counts.get(filename, 0) + 1
+                        signature = chunk.pop("minhash", None)
+                        key = (filename, chunk["chunk_index"])
+                        if chunk["chunk_index"] in settled:
+                            # Already stored, but later chunks may still duplicate it
+                            if near_duplicates is not None and signature is not None:
+                                near_duplicates.add(key, signature)
+                            continue
+                        total_chunks += 1
+                        if near_duplicates is not None and signature is not None:
+                            match = near_duplicates.find_or_add(key, signature)
+                            if match is not None:
+                                metrics.inc("near_duplicates_total")
+                                # Skipped duplicates only need their position until they are resolved
+                                if self.config["dedup"] == "skip":
+                                    chunk = {"filename": filename, "chunk_index": chunk["chunk_index"]}
+                                duplicates.append((chunk, match[0], match[1]))
+                                continue
+                        batch.append(chunk)
+                        if len(batch) >= self.config["embed_batch_size"]:
+                            # Blocks while the embedding stage is behind
+                            waited = time.perf_counter()
+                            chunk_batches.put(batch)
+                            blocked += time.perf_counter() - waited
+                            batch = []
+                except Exception as e:
+                    logger.error(f"Error reading file {filename}: {e}")
+                    metrics.inc("documents_failed_total")
+                    with lock:
+                        incomplete.add(filename)
+                    continue
+                finally:
+                    # Time waiting for the embedding stage is backpressure, not chunking
+                    metrics.observe("stage_seconds", time.perf_counter() - started - blocked, stage="chunk")
+                    metrics.observe("stage_seconds", blocked, stage="embed_queue_wait")
                 
-                if embedding:
-                    # Create point
-                    point = {
-                        "id": point_id,
-                        "vector": embedding,
-                        "payload": {
-                            "text": chunk["text"],
-                            "title": chunk["title"],
-                            "filename": chunk["filename"],
-                            "chunk_index": chunk["chunk_index"],
-                            "document": filename
-                        }
-                    }
-                    
-                    points.append(point)
-                    point_id += 1
+                metrics.inc("documents_total")
+                metrics.inc("chunks_total", chunk_counts.get(filename, 0))
+                if journal is not None:
+                    journal.log("chunked", filename=filename, chunks=chunk_counts.get(filename, 0))
+                if settled:
+                    logger.info(f"Split '{filename}' into {chunk_counts.get(filename, 0)} chunks, "
+                                f"{len(settled)} already handled by the interrupted run")
                 else:
-                    logger.error(f"  Failed to embed chunk {i+1}")
-                
-                # Sleep briefly to avoid API rate limits
-                time.sleep(0.5)
+                    logger.info(f"Split '{filename}' into {chunk_counts.get(filename, 0)} chunks")
+            
+            if batch:
+                chunk_batches.put(batch)
+        finally:
+            for _ in embedders:
+                chunk_batches.put(None)
+            for thread in embedders:
+                thread.join()
+            point_queue.put(None)
+            uploader.join()
         
-        logger.info(f"Processed {total_chunks} chunks from {len(text_files)} documents")
+        return {
+            "chunks": total_chunks,
+            "uploaded": uploaded[0],
+            "chunk_counts": chunk_counts,
+            "incomplete": incomplete,
+            "duplicates": duplicates,
+        }
+
+    def _resolve_duplicates(self, duplicates: List[Tuple[Dict[str, Any], Tuple[str, int], float]],
+                            journal: Optional[IngestJournal] = None) -> Dict[str, Any]:
+        """Store the near-duplicate chunks found by _run_pipeline()
         
-        # Upload points in batches
-        batch_size = 50
-        num_batches = (len(points) + batch_size - 1) // batch_size
+        Runs after the pipeline, once the chunks they duplicate (canonical
+        chunks) are stored; those points are read back in pages. With
+        DEDUP=reuse every duplicate is stored with its own payload, the
+        canonical chunk's vector and a "duplicate_of" reference to it. With
+        DEDUP=skip duplicates get no point; each canonical point is rewritten
+        with a "duplicates" list referencing them instead.
         
-        for i in range(0, len(points), batch_size):
-            batch = points[i:i+batch_size]
-            batch_num = i // batch_size + 1
-            
-            logger.info(f"Uploading batch {batch_num}/{num_batches} ({len(batch)} points)...")
-            
-            headers = {
-                "Content-Type": "application/json",
-                "api-key": self.config["qdrant_api_key"]
-            }
+        Args:
+            duplicates: (chunk, canonical (filename, chunk index), similarity) triples
+            journal: Journal the written points are recorded in
             
+        Returns:
+            Dict: "uploaded" (new points stored, i.e. the duplicates themselves
+            with DEDUP=reuse), "rewritten" (canonical points updated with
+            "duplicates" references with DEDUP=skip) and "incomplete" (filenames
+            with a duplicate that could not be stored or referenced)
+        """
+        groups: Dict[Tuple[str, int], List[Tuple[Dict[str, Any], float]]] = {}
+        for chunk, canonical, similarity in duplicates:
+            groups.setdefault(canonical, []).append((chunk, similarity))
+        
+        canonicals = list(groups)
+        page_size = max(1, self.config["snapshot_page_size"])
+        incomplete = set()
+        uploader = self._uploader(journal)
+        for start in range(0, len(canonicals), page_size):
+            page = {point_id_for(*canonical): canonical for canonical in canonicals[start:start + page_size]}
             try:
-                response = requests.put(
-                    f"{self.config['qdrant_url']}/collections/{self.config['collection_name']}/points?wait=true",
-                    headers=headers,
-                    json={"points": batch}
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"  Successfully uploaded batch {batch_num}/{num_batches}")
-                else:
-                    logger.error(f"  Failed to upload batch: {response.text}")
-                    
+                stored = {point["id"]: point for point in self.store.retrieve(list(page))}
             except Exception as e:
-                logger.error(f"  Error uploading batch: {e}")
+                logger.error(f"  Error reading points with near-duplicates: {e}")
+                stored = {}
             
-            # Sleep to avoid rate limits
-            time.sleep(1)
+            for point_id, canonical in page.items():
+                members = groups[canonical]
+                point = stored.get(point_id)
+                if point is None:
+                    # The canonical chunk failed to embed or upload; --resume handles its duplicates
+                    incomplete.update(chunk["filename"] for chunk, _ in members)
+                    continue
+                
+                if self.config["dedup"] == "reuse":
+                    for chunk, similarity in members:
+                        duplicate = self._chunk_point(chunk, point["vector"])
+                        duplicate["payload"]["duplicate_of"] = {"filename": canonical[0], "chunk_index": canonical[1],
+                                                                "similarity": round(similarity, 3)}
+                        uploader.add(duplicate)
+                else:
+                    # Merged with references written before an interrupted run was resumed
+                    references = {(reference["filename"], reference["chunk_index"]): reference
+                                  for reference in point["payload"].get("duplicates", [])}
+                    for chunk, similarity in members:
+                        references[(chunk["filename"], chunk["chunk_index"])] = {
+                            "filename": chunk["filename"], "chunk_index": chunk["chunk_index"],
+                            "similarity": round(similarity, 3)
+                        }
+                    point["payload"]["duplicates"] = [references[key] for key in sorted(references)]
+                    uploader.add(point)
         
-        logger.info(f"Successfully processed and uploaded {len(points)} chunks to Qdrant")
-        return len(points)
+        uploaded, failed = uploader.finish()
+        if failed:
+            logger.error(f"Failed to upload {len(failed)} points for near-duplicate chunks")
+            if journal is not None:
+                journal.log("failed", sync=True, points=failed)
+            for point in failed:
+                if self.config["dedup"] == "reuse":
+                    incomplete.add(point["payload"]["filename"])
+                else:
+                    incomplete.update(reference["filename"] for reference in point["payload"]["duplicates"])
+        if self.config["dedup"] == "reuse":
+            return {"uploaded": uploaded, "rewritten": 0, "incomplete": incomplete}
+        return {"uploaded": 0, "rewritten": uploaded, "incomplete": incomplete}
+
+    def _report_duplicates(self, duplicates: List[Tuple[Dict[str, Any], Tuple[str, int], float]],
+                           chunks: int) -> None:
+        """Log what near-duplicate detection saved and write DEDUP_REPORT_PATH
+        
+        Args:
+            duplicates: Near-duplicates found by _run_pipeline()
+            chunks: Chunks the run looked up, duplicates included
+        """
+        batch_size = self.config["embed_batch_size"]
+        # Embedding requests are full batches of the chunk stream, so dropping texts drops whole requests
+        requests_saved = math.ceil(chunks / batch_size) - math.ceil((chunks - len(duplicates)) / batch_size)
+        points_saved = len(duplicates) if self.config["dedup"] == "skip" else 0
+        metrics.set("near_duplicate_embeddings_saved", len(duplicates))
+        metrics.set("near_duplicate_requests_saved", requests_saved)
+        metrics.set("near_duplicate_points_saved", points_saved)
+        
+        canonicals = {canonical for _, canonical, _ in duplicates}
+        logger.info(f"Near-duplicates: {len(duplicates)} of {chunks} chunks duplicate {len(canonicals)} other chunks; "
+                    f"saved {len(duplicates)} embeddings in {requests_saved} requests and {points_saved} points")
+        
+        if not self.config["dedup_report_path"]:
+            return
+        groups: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+        for chunk, canonical, similarity in duplicates:
+            groups.setdefault(canonical, []).append({"filename": chunk["filename"], "chunk_index": chunk["chunk_index"],
+                                                     "similarity": round(similarity, 3)})
+        report = {
+            "collection": self.config["collection_name"],
+            "mode": self.config["dedup"],
+            "threshold": self.config["dedup_threshold"],
+            "chunks": chunks,
+            "duplicates": len(duplicates),
+            "embeddings_saved": len(duplicates),
+            "requests_saved": requests_saved,
+            "points_saved": points_saved,
+            "groups": [{"filename": canonical[0], "chunk_index": canonical[1], "duplicates": members}
+                       for canonical, members in sorted(groups.items())],
+        }
+        with open(self.config["dedup_report_path"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Near-duplicate report written to {self.config['dedup_report_path']}")
 
 def main():
     """Main function to process command line arguments and run embedder"""
     parser = argparse.ArgumentParser(description="Embed documents into Qdrant vector database")
     parser.add_argument("--reset", action="store_true", help="Reset the collection before uploading")
+    parser.add_argument("--sync", action="store_true", help="Only re-embed new or changed files and delete points of removed files")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the run recorded in INGEST_JOURNAL_PATH, skipping stored chunks and retrying failed upserts")
+    parser.add_argument("--backend", choices=VECTOR_BACKENDS, help="Vector store to write to (overrides VECTOR_BACKEND)")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES,
+                        help="Quantize vectors of a newly created collection (overrides QUANTIZATION)")
+    parser.add_argument("--sparse", action="store_true", default=None,
+                        help="Also store BM25 sparse vectors for hybrid search (overrides SPARSE_VECTORS)")
+    parser.add_argument("--dedup", choices=DEDUP_MODES,
+                        help="Give near-duplicate chunks the vector of their first copy (reuse) or store only "
+                             "the first copy with references to them (skip); overrides DEDUP")
+    parser.add_argument("--dedup-report", metavar="PATH",
+                        help="Write the near-duplicate groups and what they saved as JSON (overrides DEDUP_REPORT_PATH)")
+    parser.add_argument("--chunk-workers", type=int,
+                        help="Processes reading and chunking documents (overrides CHUNK_WORKERS, 1 disables the pool)")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="Write a metrics snapshot after the run: Prometheus text for .prom/.txt, "
+                             "JSON otherwise (overrides METRICS_PATH)")
+    parser.add_argument("--concurrency", type=int, help="Number of embedding requests in flight (overrides EMBED_CONCURRENCY)")
+    snapshot = parser.add_mutually_exclusive_group()
+    snapshot.add_argument("--export", metavar="DIR",
+                          help="Write the collection's vectors and payloads to a snapshot directory instead of embedding")
+    snapshot.add_argument("--import", metavar="DIR", dest="import_path",
+                          help="Load a snapshot into the collection instead of embedding (combine with --reset to rebuild it)")
     args = parser.parse_args()
+    if args.resume and (args.reset or args.sync or args.export or args.import_path):
+        parser.error("--resume continues the interrupted run as it was started; "
+                     "it cannot be combined with --reset, --sync, --export or --import")
     
     try:
-        embedder = DocumentEmbedder()
-        num_chunks = embedder.process_and_upload_documents(args.reset)
+        embedder = DocumentEmbedder(backend=args.backend, quantization=args.quantization,
+                                    sparse=args.sparse, dedup=args.dedup)
+        if args.concurrency:
+            embedder.config["embed_concurrency"] = args.concurrency
+        if args.chunk_workers:
+            embedder.config["chunk_workers"] = args.chunk_workers
+        if args.metrics:
+            embedder.config["metrics_path"] = args.metrics
+        if args.dedup_report:
+            embedder.config["dedup_report_path"] = args.dedup_report
+        if args.export:
+            embedder.export_snapshot(args.export)
+            return 0
+        if args.import_path:
+            num_points = embedder.import_snapshot(args.import_path, reset_collection=args.reset)
+            logger.info(f"Import complete. {num_points} points uploaded.")
+            return 0
+        num_chunks = embedder.process_and_upload_documents(args.reset, sync=args.sync, resume=args.resume)
         logger.info(f"Embedding process complete. {num_chunks} chunks uploaded.")
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -0,0 +1,159 @@
+"""
+Persistent content-addressed embedding cache
+
+Embeddings are stored in a SQLite database keyed by a SHA-256 hash of the
+model name, vector size and chunk text, so re-running the embedder over an
+unchanged corpus costs no Gemini calls. Vectors are kept as packed float32
+blobs and the least recently used entries are evicted once the cache grows
+past its size cap.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from telemetry import metrics
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding cache with LRU eviction and hit/miss counters"""
+
+    def __init__(self, path: str, model: str, vector_size: int, max_entries: int = 100000):
+        """Open (or create) the cache database
+
+        Args:
+            path: Location of the SQLite file
+            model: Embedding model name, part of every cache key
+            vector_size: Expected vector size, part of every cache key
+            max_entries: Number of vectors kept before the oldest are evicted
+        """
+        self.path = path
+        self.model = model
+        self.vector_size = vector_size
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def key(self, text: str) -> str:
+        """Return the cache key for a chunk of text"""
+        digest = hashlib.sha256()
+        digest.update(f"{self.model}\0{self.vector_size}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up several texts at once
+
+        Args:
+            texts: The texts to look up
+
+        Returns:
+            List: Cached float32 vector for each text, or None where there is no entry
+        """
+        keys = [self.key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        metrics.inc("cache_requests_total", hits, cache="embedding", result="hit")
+        metrics.inc("cache_requests_total", len(keys) - hits, cache="embedding", result="miss")
+        return [found.get(key) for key in keys]
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Look up a single text"""
+        return self.get_many([text])[0]
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """Store vectors for several texts and evict old entries if over the cap
+
+        Args:
+            texts: The embedded texts
+            vectors: Their embedding vectors, in the same order
+        """
+        now = time.time()
+        rows = [
+            (self.key(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def put(self, text: str, vector: List[float]) -> None:
+        """Store the vector for a single text"""
+        self.put_many([text], [vector])
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current number of entries"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,286 @@
+"""
+Pooled HTTP client with retries
+
+A thin wrapper around a single requests.Session shared by every Gemini and
+Qdrant call, so TCP and TLS connections are kept alive and reused instead of
+being opened per request. Transient failures (connection errors and 5xx
+responses) on idempotent requests are retried with exponential backoff and
+full jitter. HTTP 429 is only retried by clients that ask for it, after the
+response's Retry-After delay; the embedder leaves it to its adaptive rate
+limiter, which must see every 429 to slow down. Per-endpoint request, retry
+and connection counts are kept so connection reuse can be checked. Requests,
+retries, errors and bytes sent and received are also reported to the
+telemetry registry.
+
+JSON bodies are encoded compactly: with orjson when it is installed, and
+with float32 values written as their shortest float32 representation rather
+than as 17-digit doubles. Large bodies can be gzip-compressed per request; a host that
+rejects compressed bodies (HTTP 415) is sent plain ones from then on.
+
+This module is kept identical in gemini_embedding_tool and
+gemini_qdrant_vector_search_tool so that each tool stays standalone.
+"""
+
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from telemetry import metrics
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+
+
+def _default(value: Any) -> Any:
+    # float32 values go through their shortest string form, which reads back
+    # as the same float32 at any magnitude but prints as a short double
+    if isinstance(value, np.ndarray):
+        if value.dtype == np.float32:
+            return value.astype(str).astype(np.float64).tolist()
+        return value.tolist()
+    if isinstance(value, np.float32):
+        return float(str(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(value: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON, accepting numpy arrays and scalars"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def decode_json(data: bytes) -> Any:
+    """Parse a JSON document, e.g. ``response.content``"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class HttpClient:
+    """Keep-alive connection pools with retry, backoff and reuse statistics"""
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, max_retries: int = 3,
+                 backoff_factor: float = 0.5, backoff_max: float = 30.0,
+                 retry_statuses: Iterable[int] = (500, 502, 503, 504),
+                 gzip_min_bytes: int = 1024, retry_throttled: bool = False):
+        """Create the session and mount pooled adapters
+
+        Args:
+            pool_size: Connections kept open per host
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait for a response
+            max_retries: Retries after the first attempt for idempotent requests
+            backoff_factor: Base delay in seconds, doubled on every retry
+            backoff_max: Upper bound on a single backoff delay
+            retry_statuses: HTTP status codes treated as transient
+            gzip_min_bytes: Smallest JSON body compressed when a request asks for it
+            retry_throttled: Also retry HTTP 429 on idempotent requests, waiting
+                for Retry-After (up to backoff_max) or the usual backoff
+        """
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses) | ({429} if retry_throttled else frozenset())
+        self.gzip_min_bytes = gzip_min_bytes
+
+        self.session = requests.Session()
+        # Retries are handled here so they can be counted and jittered
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=0, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._adapter = adapter
+
+        self._lock = threading.Lock()
+        self._requests: Dict[str, int] = {}
+        self._retries: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        # Endpoints that answered 415 to a gzip-encoded body
+        self._no_gzip: Set[str] = set()
+
+    @classmethod
+    def from_env(cls, min_pool_size: int = 1, retry_throttled: bool = False) -> "HttpClient":
+        """Create a client configured from HTTP_* environment variables
+
+        Args:
+            min_pool_size: Lower bound on the pool size, e.g. the number of worker threads
+            retry_throttled: Also retry HTTP 429 responses (see __init__)
+        """
+        return cls(
+            pool_size=max(min_pool_size, int(os.environ.get("HTTP_POOL_SIZE", "10"))),
+            connect_timeout=float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.environ.get("HTTP_READ_TIMEOUT", "60")),
+            max_retries=int(os.environ.get("HTTP_MAX_RETRIES", "3")),
+            backoff_factor=float(os.environ.get("HTTP_BACKOFF", "0.5")),
+            gzip_min_bytes=int(os.environ.get("HTTP_GZIP_MIN_BYTES", "1024")),
+            retry_throttled=retry_throttled,
+        )
+
+    @staticmethod
+    def _endpoint(url: str) -> str:
+        # Host only, so API keys in query strings never reach the stats
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _count(self, counter: Dict[str, int], endpoint: str) -> None:
+        with self._lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    @staticmethod
+    def _record(endpoint: str, response: requests.Response) -> None:
+        metrics.inc("http_requests_total", endpoint=endpoint, status=str(response.status_code))
+        body = response.request.body
+        if body:
+            metrics.inc("http_sent_bytes_total", len(body), endpoint=endpoint)
+        # Streamed bodies are not read here, so rely on the declared length
+        received = response.headers.get("Content-Length")
+        if received and received.isdigit():
+            metrics.inc("http_received_bytes_total", int(received), endpoint=endpoint)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        # A throttled response says how long to wait; only seconds are understood
+        retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+        try:
+            return min(self.backoff_max, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    def _encode_body(self, endpoint: str, kwargs: Dict[str, Any], compress: bool) -> bool:
+        # Replaces the json argument with an encoded body; True if it was gzipped
+        body = encode_json(kwargs.pop("json"))
+        headers = dict(kwargs.get("headers") or {})
+        headers["Content-Type"] = "application/json"
+        compressed = compress and len(body) >= self.gzip_min_bytes and endpoint not in self._no_gzip
+        if compressed:
+            body = gzip.compress(body, compresslevel=1, mtime=0)
+            headers["Content-Encoding"] = "gzip"
+        kwargs["data"] = body
+        kwargs["headers"] = headers
+        return compressed
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None,
+                compress: bool = False, **kwargs: Any) -> requests.Response:
+        """Send a request, retrying transient failures if it is idempotent
+
+        Args:
+            method: HTTP method
+            url: Full request URL
+            idempotent: Override whether the request may be retried (defaults
+                to True for GET, HEAD, PUT, DELETE and OPTIONS)
+            compress: Gzip a ``json`` body of at least ``gzip_min_bytes``
+            **kwargs: Passed through to requests.Session.request
+
+        Returns:
+            Response: The last response received
+
+        Raises:
+            requests.RequestException: If the final attempt failed to connect
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retries = self.max_retries if idempotent else 0
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = self._endpoint(url)
+        original = dict(kwargs)
+        compressed = kwargs.get("json") is not None and self._encode_body(endpoint, kwargs, compress)
+
+        for attempt in range(retries + 1):
+            throttled = None
+            self._count(self._requests, endpoint)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count(self._errors, endpoint)
+                metrics.inc("http_requests_total", endpoint=endpoint, status="error")
+                if attempt >= retries:
+                    raise
+            else:
+                self._record(endpoint, response)
+                if response.status_code == 415 and compressed:
+                    # The server can't read gzip bodies; send this and later ones plain
+                    response.close()
+                    with self._lock:
+                        self._no_gzip.add(endpoint)
+                    return self.request(method, url, idempotent=idempotent, **original)
+                if response.status_code not in self.retry_statuses or attempt >= retries:
+                    return response
+                # Release the connection of a streamed response before retrying
+                response.close()
+                self._count(self._errors, endpoint)
+                if response.status_code == 429:
+                    throttled = response
+
+            self._count(self._retries, endpoint)
+            metrics.inc("http_retries_total", endpoint=endpoint)
+            time.sleep(self._backoff(attempt, throttled))
+
+        raise RuntimeError("unreachable")
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-endpoint request, retry, error and connection counts
+
+        ``connections`` is the number of TCP connections opened for the
+        endpoint; ``reuse_rate`` is the share of requests served over an
+        already-open connection.
+        """
+        connections: Dict[str, int] = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            default_port = 443 if pool.scheme == "https" else 80
+            netloc = pool.host if pool.port in (None, default_port) else f"{pool.host}:{pool.port}"
+            endpoint = f"{pool.scheme}://{netloc}"
+            connections[endpoint] = connections.get(endpoint, 0) + pool.num_connections
+
+        with self._lock:
+            endpoints = set(self._requests) | set(connections)
+            report = {}
+            for endpoint in sorted(endpoints):
+                sent = self._requests.get(endpoint, 0)
+                opened = connections.get(endpoint, 0)
+                report[endpoint] = {
+                    "requests": sent,
+                    "retries": self._retries.get(endpoint, 0),
+                    "errors": self._errors.get(endpoint, 0),
+                    "connections": opened,
+                    "reuse_rate": max(0.0, 1 - opened / sent) if sent else 0.0,
+                }
+        return report
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,142 @@
+"""
+Append-only journal of an ingest run, for resuming after a crash
+
+Every run of DocumentEmbedder.process_and_upload_documents writes one JSON
+line per event to INGEST_JOURNAL_PATH as the event happens:
+- start: collection, the settings that decide chunk boundaries and vectors,
+  the documents to process with their content hashes, documents already
+  deleted by --sync, and whether the collection was reset
+- chunked: a document was read completely and split into ``chunks`` chunks
+- embedded: chunks ({filename: [chunk indexes]}) received their vectors
+- upserted: chunks the vector store confirmed
+- failed: points whose upsert failed every retry, with their vectors, so
+  they can be sent again without calling Gemini
+- resume: a later run picked up the journal
+
+A run that stores every point deletes its journal, so a journal left on
+disk belongs to a run that was interrupted or had failed upserts. Lines are
+flushed as they are written and confirmations are also fsynced, so a crash
+loses at most the line being written, which the reader skips.
+
+Vectors of chunks that were embedded but not confirmed are not journaled;
+the embedding cache (EMBED_CACHE_PATH) already keeps them, so resuming
+re-embeds those chunks without new Gemini calls.
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from http_client import decode_json, encode_json
+
+
+def chunk_map(points: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """Group points as {filename: [chunk indexes]}, the compact form used in the journal"""
+    chunks: Dict[str, List[int]] = {}
+    for point in points:
+        payload = point["payload"]
+        chunks.setdefault(payload["filename"], []).append(payload["chunk_index"])
+    return chunks
+
+
+class JournalState:
+    """What an interrupted run recorded, as read back by read_journal()"""
+
+    def __init__(self, header: Dict[str, Any]):
+        self.header = header
+        self.chunk_counts: Dict[str, int] = {}
+        self.embedded: Dict[str, Set[int]] = {}
+        self.upserted: Dict[str, Set[int]] = {}
+        # (filename, chunk index) -> point, for points still waiting to be stored
+        self.failed: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        event = record.get("event")
+        if event == "chunked":
+            self.chunk_counts[record["filename"]] = record["chunks"]
+        elif event in ("embedded", "upserted"):
+            done = self.embedded if event == "embedded" else self.upserted
+            for filename, indexes in record["chunks"].items():
+                done.setdefault(filename, set()).update(indexes)
+                if event == "upserted":
+                    for index in indexes:
+                        self.failed.pop((filename, index), None)
+        elif event == "failed":
+            for point in record["points"]:
+                point["vector"] = np.asarray(point["vector"], dtype=np.float32)
+                payload = point["payload"]
+                self.failed[(payload["filename"], payload["chunk_index"])] = point
+
+    def settled(self, filename: str) -> Set[int]:
+        """Chunk indexes of a document that need no embedding: stored, or failed with their vector kept"""
+        indexes = set(self.upserted.get(filename, ()))
+        indexes.update(index for name, index in self.failed if name == filename)
+        return indexes
+
+    def is_complete(self, filename: str) -> bool:
+        """Whether every chunk of a document was stored"""
+        count = self.chunk_counts.get(filename)
+        return count is not None and len(self.upserted.get(filename, ())) >= count
+
+
+def read_journal(path: str) -> Optional[JournalState]:
+    """Replay a journal
+
+    Returns:
+        JournalState, or None if there is no journal or it has no start record
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    state = None
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = decode_json(line)
+            except ValueError:
+                # A line torn by the crash; nothing after it was written either
+                break
+            if record.get("event") == "start":
+                state = JournalState(record)
+            elif state is not None:
+                state._apply(record)
+    return state
+
+
+class IngestJournal:
+    """Thread-safe writer for one run's journal"""
+
+    def __init__(self, path: str, resume: bool = False):
+        """Open the journal
+
+        Args:
+            path: Journal file
+            resume: Append to the existing journal instead of starting a new one
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "ab" if resume else "wb")
+
+    def log(self, event: str, sync: bool = False, **fields: Any) -> None:
+        """Append one event
+
+        Args:
+            event: Event name
+            sync: fsync the file, so the event survives a crash of the machine
+            **fields: Event fields
+        """
+        line = encode_json(dict(fields, event=event)) + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def close(self, remove: bool = False) -> None:
+        """Close the journal, deleting it when the run left nothing to resume"""
+        with self._lock:
+            self._file.close()
+        if remove:
+            os.remove(self.path)
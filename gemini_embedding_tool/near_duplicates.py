@@ -0,0 +1,162 @@
+"""
+Near-duplicate chunk detection with MinHash and locality-sensitive hashing
+
+Every chunk is reduced to the set of its word 5-grams (shingles), and the
+set to a MinHash signature: for each of ``num_perm`` hash functions, the
+smallest hash of any shingle. Two signatures agree at a position with
+probability equal to the Jaccard similarity of the two shingle sets, so the
+share of agreeing positions estimates it. Signatures are computed next to
+the BM25 sparse vectors, in the chunking workers.
+
+NearDuplicateIndex finds earlier chunks with an estimated similarity of at
+least ``threshold`` without comparing against all of them: signatures are
+cut into bands and only chunks sharing a whole band with the query are
+compared. The band size is chosen so pairs above the threshold almost
+always share a band and pairs well below it rarely do.
+
+Hash functions are derived from a fixed seed, so signatures computed in
+different processes and runs are comparable.
+"""
+
+import re
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+DEDUP_MODES = ("off", "reuse", "skip")
+
+# Words per shingle
+SHINGLE_SIZE = 5
+
+_WORD_PATTERN = re.compile(r"\w+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_SEED = 1
+
+
+def shingle_hashes(text: str) -> Set[int]:
+    """32-bit hashes of the lowercase word 5-grams of a text (the whole text if it is shorter)"""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8"))
+            for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+@lru_cache(maxsize=4)
+def _permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Coefficients below 2**31 keep a * hash + b within 64 bits
+    rng = np.random.default_rng(_SEED)
+    a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash(text: str, num_perm: int = 128) -> Optional[np.ndarray]:
+    """MinHash signature of a text
+
+    Returns:
+        uint32 array of length ``num_perm``, or None for a text without words
+    """
+    hashes = shingle_hashes(text)
+    if not hashes:
+        return None
+    a, b = _permutations(num_perm)
+    values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    permuted = ((values[:, None] * a + b) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Bands and rows per band that best separate pairs above and below ``threshold``
+
+    A pair with similarity s shares at least one band with probability
+    1 - (1 - s**rows)**bands. The split minimizing the area of false
+    positives below the threshold plus false negatives above it is chosen,
+    with false negatives weighted nine times as much: a candidate that is
+    not similar enough costs one signature comparison, a missed duplicate
+    costs an embedding.
+    """
+    similarity = np.linspace(0.0, 1.0, 201)
+    best = (1, num_perm)
+    best_error = None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        probability = 1 - (1 - similarity ** rows) ** bands
+        error = (0.1 * np.where(similarity < threshold, probability, 0).sum()
+                 + 0.9 * np.where(similarity >= threshold, 1 - probability, 0).sum())
+        if best_error is None or error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """LSH index of MinHash signatures that finds the first-seen near-duplicate of a chunk"""
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128):
+        """
+        Args:
+            threshold: Minimum estimated Jaccard similarity of two chunks' shingles
+            num_perm: Signature length; must match the signatures passed in
+
+        Raises:
+            ValueError: If threshold is not in (0, 1] or num_perm is below 2
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Near-duplicate threshold must be in (0, 1], got {threshold}")
+        if num_perm < 2:
+            raise ValueError(f"Near-duplicate detection needs at least 2 permutations, got {num_perm}")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self._keys: List[Hashable] = []
+        self._signatures: List[np.ndarray] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature: np.ndarray) -> Optional[Tuple[Any, float]]:
+        """Find the most similar indexed chunk at or above the threshold
+
+        Returns:
+            Tuple of its key and estimated similarity, or None; ties go to the
+            chunk indexed first
+        """
+        candidates = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+
+        best = None
+        for candidate in sorted(candidates):
+            similarity = float(np.count_nonzero(self._signatures[candidate] == signature)) / self.num_perm
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        if best is None:
+            return None
+        return self._keys[best[0]], best[1]
+
+    def add(self, key: Hashable, signature: np.ndarray) -> None:
+        """Index a chunk so later near-duplicates of it are found"""
+        position = len(self._keys)
+        self._keys.append(key)
+        self._signatures.append(signature)
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(position)
+
+    def find_or_add(self, key: Hashable, signature: np.ndarray) -> Optional[Tuple[Any, float]]:
+        """Return the near-duplicate of a chunk, or index the chunk if it has none
+
+        Duplicates are not indexed themselves, so every duplicate refers to
+        a chunk that is not one.
+        """
+        match = self.query(signature)
+        if match is None:
+            self.add(key, signature)
+        return match
@@ -0,0 +1,164 @@
+"""
+Document discovery and parallel preprocessing for the embedder
+
+Documents are found recursively under the docs directory and identified by
+their path relative to it (a top-level file keeps its plain filename, so
+point IDs and sync manifests of flat corpora are unchanged).
+
+Reading, chunking, sparse encoding and MinHash signatures are CPU-bound, so they fan out over a
+process pool, one document per task. Results are consumed strictly in
+discovery order through a bounded window of in-flight tasks, which keeps
+point IDs and logs deterministic and caps how many chunked documents wait
+in memory. Files too large to return from a worker in one piece are
+streamed in the main process instead.
+"""
+
+import fnmatch
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from chunker import Chunker, iter_paragraphs
+from near_duplicates import minhash
+from sparse_encoder import encode_document
+
+# Files larger than this are chunked as a stream in the main process
+MAX_POOLED_FILE_BYTES = 64 * 1024 * 1024
+
+
+def parse_patterns(value: str) -> List[str]:
+    """Split a comma-separated pattern list, ignoring blanks"""
+    return [pattern.strip() for pattern in value.split(",") if pattern.strip()]
+
+
+def _matches(path: str, patterns: Sequence[str]) -> bool:
+    # Patterns without a slash also match the file or directory name alone
+    name = path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(path, pattern) or ("/" not in pattern and fnmatch.fnmatch(name, pattern))
+               for pattern in patterns)
+
+
+def discover_documents(root: Path, include: Sequence[str],
+                       exclude: Sequence[str] = ()) -> List[Tuple[str, Path]]:
+    """Find documents below ``root``
+
+    Args:
+        root: Directory to search recursively
+        include: Glob patterns a file must match, e.g. ["*.txt", "notes/*.md"]
+        exclude: Glob patterns of files or directories to skip, e.g. ["drafts", "*.tmp.txt"]
+
+    Returns:
+        List of (relative POSIX path, absolute path) pairs, sorted by relative path
+    """
+    documents = []
+    for directory, dirnames, filenames in os.walk(root):
+        relative_dir = Path(directory).relative_to(root).as_posix()
+        prefix = "" if relative_dir == "." else relative_dir + "/"
+
+        # Prune excluded directories instead of walking into them
+        dirnames[:] = sorted(d for d in dirnames if not _matches(prefix + d, exclude))
+
+        for filename in filenames:
+            relative = prefix + filename
+            if _matches(relative, include) and not _matches(relative, exclude):
+                documents.append((relative, Path(directory) / filename))
+
+    documents.sort()
+    return documents
+
+
+def document_chunks(paragraphs: Iterable[str], filename: str, chunker: Chunker,
+                    sparse: bool = False, minhash_permutations: int = 0) -> Iterator[Dict[str, Any]]:
+    """Turn a stream of paragraphs into chunk objects with metadata
+
+    Args:
+        paragraphs: Paragraph texts in document order
+        filename: Document identifier stored in the payload
+        chunker: Chunker to pack the paragraphs with
+        sparse: Also attach a BM25 "sparse_vector" to every chunk
+        minhash_permutations: Also attach a "minhash" signature of this length
+            to every chunk (None for a chunk without words); 0 disables it
+    """
+    # Get document title from filename
+    title = Path(filename).stem.replace('_', ' ').title()
+
+    for chunk_index, (text, tokens) in enumerate(chunker.chunks(paragraphs)):
+        chunk = {
+            "text": text,
+            "chunk_index": chunk_index,
+            "filename": filename,
+            "title": title,
+            "chunk_size": tokens
+        }
+        if sparse:
+            chunk["sparse_vector"] = encode_document(text)
+        if minhash_permutations:
+            chunk["minhash"] = minhash(text, minhash_permutations)
+        yield chunk
+
+
+def stream_document(file_path: Path, filename: str, chunker: Chunker,
+                    sparse: bool = False, minhash_permutations: int = 0) -> Iterator[Dict[str, Any]]:
+    """Chunk a file while reading it, without loading it into memory"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield from document_chunks(iter_paragraphs(f), filename, chunker, sparse, minhash_permutations)
+
+
+def prepare_document(file_path: Path, filename: str, chunk_size: int, overlap_size: int,
+                     sparse: bool = False, minhash_permutations: int = 0) -> List[Dict[str, Any]]:
+    """Read and chunk one document; the task run by pool workers"""
+    return list(stream_document(file_path, filename, Chunker(chunk_size, overlap_size), sparse,
+                                minhash_permutations))
+
+
+def _resolve(future: Future) -> Iterator[Dict[str, Any]]:
+    # Worker errors surface when the chunks are iterated, like read errors do
+    yield from future.result()
+
+
+def iter_documents(documents: Sequence[Tuple[str, Path]], chunker: Chunker, sparse: bool = False,
+                   workers: int = 1, minhash_permutations: int = 0) -> Iterator[Tuple[str, Iterator[Dict[str, Any]]]]:
+    """Yield (filename, chunks) for every document, in the given order
+
+    With ``workers`` > 1 documents are chunked ahead on a process pool,
+    at most ``2 * workers`` at a time. Errors reading or chunking a document
+    are raised while iterating its chunks.
+    """
+    if workers <= 1 or len(documents) <= 1:
+        for filename, file_path in documents:
+            yield filename, stream_document(file_path, filename, chunker, sparse, minhash_permutations)
+        return
+
+    def size_of(file_path: Path) -> int:
+        try:
+            return file_path.stat().st_size
+        except OSError:
+            return 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window: Deque[Tuple[str, Path, Optional[Future]]] = deque()
+        pending = iter(documents)
+
+        def submit_next() -> bool:
+            for filename, file_path in pending:
+                future = None
+                if size_of(file_path) <= MAX_POOLED_FILE_BYTES:
+                    future = pool.submit(prepare_document, file_path, filename, chunker.chunk_size,
+                                         chunker.overlap_size, sparse, minhash_permutations)
+                window.append((filename, file_path, future))
+                return True
+            return False
+
+        for _ in range(2 * workers):
+            if not submit_next():
+                break
+
+        while window:
+            filename, file_path, future = window.popleft()
+            submit_next()
+            if future is None:
+                yield filename, stream_document(file_path, filename, chunker, sparse, minhash_permutations)
+            else:
+                yield filename, _resolve(future)
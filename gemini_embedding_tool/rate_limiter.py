@@ -0,0 +1,92 @@
+"""
+Adaptive token-bucket rate limiter
+
+Used by the embedder to pace Gemini API requests across worker threads.
+The request rate grows slowly while calls succeed and is cut in half whenever
+the API answers with HTTP 429, honouring any Retry-After delay it sends.
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe token bucket whose refill rate adapts to throttling"""
+
+    def __init__(self, rate: float, max_rate: Optional[float] = None,
+                 min_rate: float = 0.1, burst: Optional[float] = None):
+        """Initialize the limiter
+
+        Args:
+            rate: Initial number of requests allowed per second
+            max_rate: Upper bound the rate may grow to (defaults to 4x the initial rate)
+            min_rate: Lower bound the rate may shrink to after repeated 429s
+            burst: Bucket capacity (defaults to one second's worth of requests)
+        """
+        self.rate = max(rate, min_rate)
+        self.max_rate = max_rate if max_rate is not None else self.rate * 4
+        self.min_rate = min_rate
+        self.burst = burst if burst is not None else max(1.0, self.rate)
+
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        self.throttle_count = 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last_refill
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        """Additively raise the rate after a successful request"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.05 * self.rate + 0.01)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Halve the rate and pause all callers after an HTTP 429
+
+        Args:
+            retry_after: Seconds the server asked us to wait, if it said
+        """
+        with self._lock:
+            self.throttle_count += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0
+            delay = retry_after if retry_after is not None else 1 / self.rate
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds
+
+    Args:
+        value: Raw header value, or None if the header was absent
+
+    Returns:
+        float: Delay in seconds, or None if the header was missing or not numeric
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,113 @@
+"""
+Collection snapshots for restoring without re-embedding
+
+A snapshot is a directory holding:
+- vectors.npy: float32 matrix in NumPy's .npy format, one row per point, so
+  it can be memory-mapped with np.load(..., mmap_mode="r")
+- points.jsonl: one {"id", "payload"} line per matrix row, in row order,
+  plus "sparse" (BM25 term weights) when the collection has sparse vectors
+- meta.json: collection name, embedding model, vector size, point count,
+  whether sparse vectors are included and the sync manifest of the
+  exported collection. It is written last, so a directory without it is an
+  incomplete export
+
+Exports scroll the collection page by page and imports stream the files
+back, so neither holds more than one page of points in memory.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from http_client import decode_json, encode_json
+
+# Rows copied at a time when the .npy file is assembled
+COPY_BLOCK_ROWS = 65536
+
+
+def write_snapshot(path: str, pages: Iterable[List[Dict[str, Any]]], vector_size: int,
+                   meta: Dict[str, Any]) -> int:
+    """Write pages of points to a snapshot directory
+
+    Args:
+        path: Snapshot directory, created if missing; existing files are replaced
+        pages: Lists of points with "id", "vector", "payload" and optionally
+            "sparse_vector", e.g. VectorStore.scroll()
+        vector_size: Expected vector size
+        meta: Extra fields for meta.json
+
+    Returns:
+        int: Number of points written
+    """
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    raw_path = directory / "vectors.f32.tmp"
+    points_tmp = directory / "points.jsonl.tmp"
+    vectors_tmp = directory / "vectors.npy.tmp"
+
+    count = 0
+    sparse = False
+    with open(raw_path, "wb") as vf, open(points_tmp, "wb") as pf:
+        for page in pages:
+            vectors = np.asarray([point["vector"] for point in page], dtype=np.float32)
+            if vectors.shape[1] != vector_size:
+                raise ValueError(f"Vector size {vectors.shape[1]} does not match expected size {vector_size}")
+            vf.write(vectors.tobytes())
+            for point in page:
+                record = {"id": point["id"], "payload": point["payload"]}
+                if "sparse_vector" in point:
+                    record["sparse"] = point["sparse_vector"]
+                    sparse = True
+                pf.write(encode_json(record) + b"\n")
+            count += len(page)
+
+    # The .npy header holds the row count, so the matrix is copied behind it once the count is known
+    matrix = np.lib.format.open_memmap(vectors_tmp, mode="w+", dtype=np.float32, shape=(count, vector_size))
+    if count:
+        raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(count, vector_size))
+        for start in range(0, count, COPY_BLOCK_ROWS):
+            matrix[start:start + COPY_BLOCK_ROWS] = raw[start:start + COPY_BLOCK_ROWS]
+        del raw
+    matrix.flush()
+    del matrix
+    os.remove(raw_path)
+
+    os.replace(vectors_tmp, directory / "vectors.npy")
+    os.replace(points_tmp, directory / "points.jsonl")
+    with open(directory / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(dict(meta, size=vector_size, count=count, sparse=sparse), f, indent=2)
+    return count
+
+
+def read_snapshot_meta(path: str) -> Dict[str, Any]:
+    """Load meta.json of a snapshot
+
+    Raises:
+        FileNotFoundError: If the directory holds no complete snapshot
+    """
+    meta_path = Path(path) / "meta.json"
+    if not meta_path.exists():
+        raise FileNotFoundError(f"No snapshot at {path} (missing {meta_path.name})")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_snapshot(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the points of a snapshot in row order, ready for VectorStore.upsert()"""
+    directory = Path(path)
+    meta = read_snapshot_meta(path)
+    vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+    if vectors.shape != (meta["count"], meta["size"]):
+        raise ValueError(f"Snapshot {path} has a {vectors.shape} matrix, "
+                         f"expected ({meta['count']}, {meta['size']})")
+
+    with open(directory / "points.jsonl", "rb") as f:
+        for row, line in enumerate(f):
+            record = decode_json(line)
+            point = {"id": record["id"], "vector": np.array(vectors[row]), "payload": record["payload"]}
+            if "sparse" in record:
+                point["sparse_vector"] = record["sparse"]
+            yield point
@@ -0,0 +1,74 @@
+"""Tests for the chunker's boundaries and token limits"""
+
+import io
+
+from chunker import Chunker, estimate_tokens, iter_paragraphs, split_paragraphs
+
+
+def _paragraphs(count: int, words: int = 30) -> list:
+    return [" ".join(f"word{p}x{w}" for w in range(words)) + "." for p in range(count)]
+
+
+def test_chunks_respect_the_token_and_character_limits():
+    text = "\n\n".join(_paragraphs(40)) + "\n\n" + " ".join(f"Sentence {i} ends here." for i in range(300))
+    chunker = Chunker(chunk_size=120, overlap_size=20, max_chars=600)
+    chunks = list(chunker.chunks(split_paragraphs(text)))
+    assert len(chunks) > 1
+    for chunk, tokens in chunks:
+        # The running estimate matches a fresh estimate of the joined text
+        assert tokens == estimate_tokens(chunk)
+        assert tokens <= 120
+        assert len(chunk) <= 600
+
+
+def test_small_paragraphs_are_kept_whole_and_joined_at_blank_lines():
+    paragraphs = ["First paragraph.", "Second paragraph.", "Third paragraph."]
+    chunks = list(Chunker(chunk_size=100, overlap_size=0).chunks(paragraphs))
+    assert [chunk for chunk, _ in chunks] == ["\n\n".join(paragraphs)]
+
+
+def test_consecutive_chunks_overlap_by_whole_paragraphs():
+    paragraphs = _paragraphs(10, words=10)
+    chunks = [chunk for chunk, _ in Chunker(chunk_size=100, overlap_size=35).chunks(paragraphs)]
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        # The next chunk starts with the last paragraph of the previous one
+        assert current.startswith(previous.split("\n\n")[-1])
+    # No paragraph is lost or cut
+    assert set("\n\n".join(chunks).split("\n\n")) == set(paragraphs)
+
+
+def test_no_overlap_when_overlap_size_is_zero():
+    paragraphs = _paragraphs(10, words=10)
+    chunks = [chunk for chunk, _ in Chunker(chunk_size=100, overlap_size=0).chunks(paragraphs)]
+    assert "\n\n".join(chunks).split("\n\n") == paragraphs
+
+
+def test_oversize_paragraph_is_split_at_sentence_boundaries():
+    sentences = [f"This is sentence number {i} of the paragraph." for i in range(20)]
+    chunks = [chunk for chunk, _ in Chunker(chunk_size=30, overlap_size=0).chunks([" ".join(sentences)])]
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.endswith(".")
+    assert " ".join(chunks) == " ".join(sentences)
+
+
+def test_words_longer_than_a_chunk_are_sliced():
+    word = "a" * 1000
+    chunks = list(Chunker(chunk_size=50, overlap_size=0, max_chars=150).chunks([word]))
+    assert "".join(chunk for chunk, _ in chunks) == word
+    for chunk, tokens in chunks:
+        assert len(chunk) <= 150
+        assert tokens <= 50
+
+
+def test_iter_paragraphs_matches_split_paragraphs_across_block_boundaries():
+    text = "\n\n".join(_paragraphs(25, words=7))
+    assert list(iter_paragraphs(io.StringIO(text), block_size=17)) == split_paragraphs(text)
+
+
+def test_iter_paragraphs_cuts_text_without_paragraph_breaks():
+    text = " ".join(["word"] * 500)
+    pieces = list(iter_paragraphs(io.StringIO(text), block_size=64, max_paragraph_chars=100))
+    assert all(len(piece) <= 100 for piece in pieces)
+    assert "".join(pieces) == text
@@ -0,0 +1,100 @@
+"""Tests for replaying an interrupted run's journal into a resume plan"""
+
+import numpy as np
+
+from journal import IngestJournal, chunk_map, read_journal
+
+
+def _point(filename, chunk_index, vector=(0.5, -0.25)):
+    return {"id": f"{filename}-{chunk_index}", "vector": np.array(vector, dtype=np.float32),
+            "payload": {"filename": filename, "chunk_index": chunk_index}}
+
+
+def _start(journal):
+    journal.log("start", sync=True, settings={"chunk_size": 1000}, reset=False, removed=[],
+                documents={"a.txt": "hash-a", "b.txt": "hash-b"})
+
+
+def test_replay_settles_stored_and_failed_chunks(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = IngestJournal(path)
+    _start(journal)
+    journal.log("chunked", filename="a.txt", chunks=3)
+    journal.log("chunked", filename="b.txt", chunks=2)
+    journal.log("embedded", chunks={"a.txt": [0, 1, 2], "b.txt": [0, 1]})
+    journal.log("upserted", sync=True, chunks=chunk_map([_point("a.txt", 0), _point("a.txt", 1), _point("a.txt", 2)]))
+    journal.log("upserted", sync=True, chunks={"b.txt": [0]})
+    journal.log("failed", sync=True, points=[_point("b.txt", 1)])
+    journal.close()
+
+    state = read_journal(path)
+    assert state.header["documents"] == {"a.txt": "hash-a", "b.txt": "hash-b"}
+    assert state.is_complete("a.txt")
+    assert not state.is_complete("b.txt")
+    # The failed chunk is retried from its journaled vector, not embedded again
+    assert state.settled("b.txt") == {0, 1}
+    failed = state.failed[("b.txt", 1)]
+    assert failed["vector"].dtype == np.float32
+    np.testing.assert_array_equal(failed["vector"], [0.5, -0.25])
+
+
+def test_a_later_upsert_clears_the_failed_point(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = IngestJournal(path)
+    _start(journal)
+    journal.log("failed", sync=True, points=[_point("a.txt", 4)])
+    journal.close()
+
+    # A resumed run appends to the same journal
+    journal = IngestJournal(path, resume=True)
+    journal.log("resume", sync=True)
+    journal.log("upserted", sync=True, chunks={"a.txt": [4]})
+    journal.close()
+
+    state = read_journal(path)
+    assert state.failed == {}
+    assert state.settled("a.txt") == {4}
+
+
+def test_unchunked_documents_are_never_complete(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = IngestJournal(path)
+    _start(journal)
+    journal.log("upserted", sync=True, chunks={"a.txt": [0, 1]})
+    journal.close()
+
+    state = read_journal(path)
+    # Without its chunk count a document may have more chunks still to store
+    assert not state.is_complete("a.txt")
+    assert state.settled("a.txt") == {0, 1}
+    assert state.settled("b.txt") == set()
+
+
+def test_a_torn_last_line_is_skipped(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = IngestJournal(str(path))
+    _start(journal)
+    journal.log("chunked", filename="a.txt", chunks=1)
+    journal.close()
+    with open(path, "ab") as f:
+        f.write(b'{"event": "upserted", "chunks": {"a.tx')
+
+    state = read_journal(str(path))
+    assert state.chunk_counts == {"a.txt": 1}
+    assert state.upserted == {}
+
+
+def test_no_plan_without_a_start_record(tmp_path):
+    assert read_journal(str(tmp_path / "missing.jsonl")) is None
+
+    path = tmp_path / "journal.jsonl"
+    path.write_bytes(b'{"event": "chunked", "filename": "a.txt", "chunks": 1}\n')
+    assert read_journal(str(path)) is None
+
+
+def test_closing_a_finished_run_removes_the_journal(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = IngestJournal(str(path))
+    _start(journal)
+    journal.close(remove=True)
+    assert not path.exists()
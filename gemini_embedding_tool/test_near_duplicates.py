@@ -0,0 +1,76 @@
+"""Tests for MinHash near-duplicate detection around the similarity threshold"""
+
+import numpy as np
+import pytest
+
+from near_duplicates import NearDuplicateIndex, lsh_bands, minhash
+
+
+def _text(seed: int, words: int = 200) -> str:
+    rng = np.random.default_rng(seed)
+    return " ".join(f"w{value}" for value in rng.integers(0, 5000, size=words))
+
+
+def _signature_with_matches(signature: np.ndarray, matching: int) -> np.ndarray:
+    # Changing the trailing positions keeps the leading bands shared, so the
+    # pair is always an LSH candidate and only the threshold decides
+    changed = signature.copy()
+    changed[matching:] += np.uint32(1)
+    return changed
+
+
+def test_similarity_exactly_at_the_threshold_is_a_duplicate():
+    index = NearDuplicateIndex(threshold=0.9, num_perm=100)
+    signature = minhash(_text(0), num_perm=100)
+    index.add("original", signature)
+
+    match = index.query(_signature_with_matches(signature, 90))
+    assert match == ("original", 0.9)
+
+
+def test_similarity_just_below_the_threshold_is_not_a_duplicate():
+    index = NearDuplicateIndex(threshold=0.9, num_perm=100)
+    signature = minhash(_text(0), num_perm=100)
+    index.add("original", signature)
+
+    assert index.query(_signature_with_matches(signature, 89)) is None
+
+
+def test_near_identical_texts_match_and_unrelated_texts_do_not():
+    text = _text(1)
+    words = text.split()
+    edited = " ".join(words[:100] + ["changed"] + words[101:])
+
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add("original", minhash(text))
+    match = index.query(minhash(edited))
+    assert match is not None and match[0] == "original" and match[1] >= 0.8
+    assert index.query(minhash(_text(2))) is None
+
+
+def test_duplicates_are_not_indexed_and_point_to_the_first_chunk():
+    text = _text(3)
+    index = NearDuplicateIndex(threshold=0.9)
+    assert index.find_or_add("first", minhash(text)) is None
+    assert index.find_or_add("second", minhash(text)) == ("first", 1.0)
+    assert index.find_or_add("third", minhash(text)) == ("first", 1.0)
+    assert len(index) == 1
+
+
+def test_signatures_are_stable_and_need_words():
+    assert np.array_equal(minhash(_text(4)), minhash(_text(4)))
+    assert minhash(" ... ") is None
+
+
+def test_bands_fit_the_signature():
+    for threshold in (0.5, 0.8, 0.9, 0.95):
+        bands, rows = lsh_bands(128, threshold)
+        assert bands * rows <= 128
+    # A higher threshold needs longer bands, so fewer dissimilar pairs collide
+    assert lsh_bands(128, 0.95)[1] >= lsh_bands(128, 0.5)[1]
+
+
+@pytest.mark.parametrize("threshold", [0, -0.1, 1.5])
+def test_threshold_outside_the_unit_interval_is_rejected(threshold):
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(threshold=threshold)
@@ -0,0 +1,177 @@
+"""
+Pipelined point uploads
+
+Points are grouped into batches bounded by both a point count and an
+estimated request size, so batches of short chunks are large and batches of
+long chunks stay under the server's request limit. Batches are upserted by
+a pool of threads without waiting for indexing (Qdrant's ``wait=false``),
+so several requests are in flight while the server indexes earlier ones.
+A batch that fails is put on a retry queue and sent again after a backoff
+delay instead of being dropped; only batches that fail every attempt are
+reported back as failed.
+
+Because unacknowledged writes are indexed asynchronously, callers finish
+with one consistency barrier (VectorStore.wait_until_ready) rather than
+waiting after every batch.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from http_client import encode_json
+from telemetry import metrics, span
+from vector_store import VectorStore
+
+# JSON characters per float32 component at 9 decimals, e.g. "-0.012345679,"
+VECTOR_COMPONENT_BYTES = 13
+# JSON characters per sparse vector entry (index and value)
+SPARSE_ENTRY_BYTES = 20
+# Braces, keys and ID of a point
+POINT_OVERHEAD_BYTES = 80
+
+
+def estimate_point_bytes(point: Dict[str, Any]) -> int:
+    """Approximate size of a point in an uncompressed upsert request body"""
+    size = POINT_OVERHEAD_BYTES + VECTOR_COMPONENT_BYTES * len(point["vector"])
+    size += len(encode_json(point["payload"]))
+    if "sparse_vector" in point:
+        size += SPARSE_ENTRY_BYTES * len(point["sparse_vector"]["indices"])
+    return size
+
+
+class PointUploader:
+    """Concurrent, size-bounded upserts with a retry queue for failed batches
+
+    Not thread-safe for callers: one thread adds points and calls finish(),
+    the upserts themselves run on the uploader's own threads.
+    """
+
+    def __init__(self, store: VectorStore, max_points: int = 256, max_bytes: int = 4 << 20,
+                 concurrency: int = 4, max_retries: int = 5, backoff: float = 1.0,
+                 wait_for_index: bool = False,
+                 on_stored: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        """Configure the upload engine
+
+        Args:
+            store: Vector store the batches are written to
+            max_points: Most points per batch
+            max_bytes: Largest estimated request body per batch; a single
+                point larger than this is still sent on its own
+            concurrency: Number of upserts in flight
+            max_retries: Times a failed batch is sent again before its points
+                are reported as failed
+            backoff: Delay before the first retry in seconds, doubled on
+                every further attempt
+            wait_for_index: Ask the store to apply each batch before answering
+            on_stored: Called with every batch the store accepted, on the
+                upsert thread, before finish() returns
+        """
+        self.store = store
+        self.max_points = max(1, max_points)
+        self.max_bytes = max(1, max_bytes)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.wait_for_index = wait_for_index
+        self.on_stored = on_stored
+
+        self.uploaded = 0
+        self.failed: List[Dict[str, Any]] = []
+        self.batches = 0
+        self.retries = 0
+
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        # (ready_at, attempt, batch) entries waiting to be sent again
+        self._retry_queue: List[Tuple[float, int, List[Dict[str, Any]]]] = []
+        self._futures: List[Future] = []
+        # Bounds the batches held in memory while the upserts are behind
+        self._slots = threading.BoundedSemaphore(max(1, concurrency) * 2)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="upsert")
+
+    def add(self, point: Dict[str, Any]) -> None:
+        """Queue a point, sending the current batch first if the point would overflow it"""
+        size = estimate_point_bytes(point)
+        if self._pending and (len(self._pending) >= self.max_points
+                              or self._pending_bytes + size > self.max_bytes):
+            self._flush()
+        self._pending.append(point)
+        self._pending_bytes += size
+
+    def _flush(self) -> None:
+        batch = self._pending
+        self._pending = []
+        self._pending_bytes = 0
+        self._submit(batch, 0)
+        self._resubmit_due()
+
+    def _submit(self, batch: List[Dict[str, Any]], attempt: int) -> None:
+        # Blocks while the maximum number of batches is queued or in flight
+        self._slots.acquire()
+        self._futures = [future for future in self._futures if not future.done()]
+        self._futures.append(self._executor.submit(self._send, batch, attempt))
+
+    def _send(self, batch: List[Dict[str, Any]], attempt: int) -> None:
+        try:
+            with span("upsert", points=len(batch), attempt=attempt):
+                stored = self.store.upsert(batch, wait=self.wait_for_index)
+        except Exception:
+            stored = False
+        finally:
+            self._slots.release()
+
+        if stored and self.on_stored is not None:
+            self.on_stored(batch)
+
+        with self._lock:
+            if stored:
+                self.uploaded += len(batch)
+                self.batches += 1
+                metrics.inc("points_upserted_total", len(batch))
+            elif attempt < self.max_retries:
+                self.retries += 1
+                metrics.inc("upsert_retries_total")
+                ready_at = time.monotonic() + self.backoff * 2 ** attempt
+                self._retry_queue.append((ready_at, attempt + 1, batch))
+            else:
+                self.failed.extend(batch)
+                metrics.inc("points_failed_total", len(batch))
+
+    def _resubmit_due(self) -> float:
+        """Send every retry whose backoff has elapsed
+
+        Returns:
+            float: Seconds until the next queued retry is due, or 0 if none is queued
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [entry for entry in self._retry_queue if entry[0] <= now]
+            self._retry_queue = [entry for entry in self._retry_queue if entry[0] > now]
+            next_due = min((entry[0] for entry in self._retry_queue), default=now) - now
+        for _, attempt, batch in due:
+            self._submit(batch, attempt)
+        return next_due
+
+    def finish(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """Send the last batch and wait until every batch succeeded or ran out of retries
+
+        Returns:
+            Tuple: Number of points stored, and the points that could not be stored
+        """
+        if self._pending:
+            self._flush()
+
+        while True:
+            wait(self._futures)
+            self._futures = []
+            with self._lock:
+                if not self._retry_queue:
+                    break
+            delay = self._resubmit_due()
+            if not self._futures and delay > 0:
+                time.sleep(delay)
+
+        self._executor.shutdown()
+        return self.uploaded, self.failed
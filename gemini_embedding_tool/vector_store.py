@@ -0,0 +1,624 @@
+"""
+Vector store backends for the embedder
+
+DocumentEmbedder writes points through the VectorStore interface, so the
+same ingest pipeline can target a Qdrant server or a local on-disk index.
+
+The local index is a directory per collection holding:
+- vectors.f32: row-major float32 matrix, every row L2-normalized, so cosine
+  similarity is a plain dot product and the file can be memory-mapped
+- payloads.jsonl: one {"id", "payload"} line per matrix row, in row order,
+  plus "sparse" (BM25 term weights) when sparse vectors are enabled
+- meta.json: vector size and distance
+gemini_vector_search reads the same layout.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set
+
+import numpy as np
+
+from http_client import HttpClient, decode_json
+from sparse_encoder import SPARSE_VECTOR_NAME
+
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKENDS = ("qdrant", "local")
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+COMPRESSION_MODES = ("none", "gzip")
+
+
+class VectorStore:
+    """Interface for the collection operations used during ingest"""
+
+    def create_collection(self) -> bool:
+        """Create the collection if it doesn't exist
+
+        Returns:
+            bool: True if the collection was created or already exists
+        """
+        raise NotImplementedError
+
+    def delete_collection(self) -> bool:
+        """Delete the collection and all of its points"""
+        raise NotImplementedError
+
+    def delete_by_filename(self, filename: str) -> bool:
+        """Delete every point whose ``filename`` payload field matches"""
+        raise NotImplementedError
+
+    def upsert(self, points: List[Dict[str, Any]], wait: bool = True) -> bool:
+        """Insert or replace one batch of points
+
+        Args:
+            points: Points with "id", "vector", "payload" and optionally
+                "sparse_vector" ({"indices", "values"})
+            wait: Return only once the points are applied; with False the
+                store may acknowledge the batch before it is searchable
+
+        Returns:
+            bool: True if the whole batch was stored (or accepted)
+        """
+        raise NotImplementedError
+
+    def wait_until_ready(self, timeout: float = 300.0) -> Optional[int]:
+        """Block until every accepted write is applied and indexed
+
+        Args:
+            timeout: Seconds to wait before giving up
+
+        Returns:
+            int: Number of points in the collection, or None on timeout or error
+        """
+        raise NotImplementedError
+
+    def scroll(self, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """Read every point of the collection, one page at a time
+
+        Args:
+            page_size: Points per page
+
+        Yields:
+            List: Points in the format accepted by upsert(), with "vector"
+            as a float32 array
+        """
+        raise NotImplementedError
+
+    def retrieve(self, ids: Sequence[Any]) -> List[Dict[str, Any]]:
+        """Read points by ID
+
+        Args:
+            ids: Point IDs; IDs not in the collection are left out
+
+        Returns:
+            List: Points in the format accepted by upsert(), with "vector"
+            as a float32 array
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Flush pending writes and release resources"""
+
+
+class QdrantVectorStore(VectorStore):
+    """Collection on a Qdrant server, accessed through its REST API"""
+
+    def __init__(self, http: HttpClient, qdrant_url: str, api_key: str,
+                 collection_name: str, vector_size: int,
+                 quantization: str = "none", quantile: float = 0.99, sparse: bool = False,
+                 compress: bool = False, payload_indexes: Sequence[str] = ()):
+        """Configure access to one Qdrant collection
+
+        Args:
+            http: Pooled HTTP client
+            qdrant_url: Base URL of the Qdrant server
+            api_key: Qdrant API key
+            collection_name: Collection to write to
+            vector_size: Dimensionality of the vectors
+            quantization: "scalar" (int8) or "binary" to create the collection
+                with quantized vectors kept in RAM and originals on disk
+            quantile: Quantile used to clip outliers for scalar quantization
+            sparse: Create the collection with a BM25 sparse vector whose IDF
+                is computed by Qdrant
+            compress: Gzip upsert bodies (Qdrant accepts Content-Encoding: gzip)
+            payload_indexes: Payload fields to index, as "field" (keyword) or
+                "field:schema" (e.g. "chunk_index:integer")
+        """
+        self.http = http
+        self.collection_name = collection_name
+        self.vector_size = vector_size
+        self.quantization = quantization
+        self.quantile = quantile
+        self.sparse = sparse
+        self.compress = compress
+        self.payload_indexes = list(payload_indexes)
+        self.collection_url = f"{qdrant_url}/collections/{collection_name}"
+        self.headers = {
+            "Content-Type": "application/json",
+            "api-key": api_key
+        }
+
+    def create_collection(self) -> bool:
+        # Check if collection exists
+        try:
+            response = self.http.get(self.collection_url, headers=self.headers)
+
+            if response.status_code == 200:
+                logger.info(f"Collection {self.collection_name} already exists.")
+                # Collections created before an index was configured get it now
+                return self._create_payload_indexes()
+
+            # Only proceed to create if it doesn't exist
+            if response.status_code != 404:
+                logger.error(f"Error checking collection: {response.text}")
+                return False
+
+        except Exception as e:
+            logger.error(f"Error connecting to Qdrant: {e}")
+            return False
+
+        # Create collection with cosine distance
+        payload = {
+            "vectors": {
+                "size": self.vector_size,
+                "distance": "Cosine"
+            },
+            "optimizers_config": {
+                "indexing_threshold": 0  # Index immediately
+            }
+        }
+
+        # Qdrant keeps document frequencies and applies IDF at query time
+        if self.sparse:
+            payload["sparse_vectors"] = {
+                SPARSE_VECTOR_NAME: {"modifier": "idf"}
+            }
+
+        # Quantized vectors stay in RAM for scoring; full-precision originals
+        # move to disk and are only read when rescoring
+        if self.quantization == "scalar":
+            payload["vectors"]["on_disk"] = True
+            payload["quantization_config"] = {
+                "scalar": {"type": "int8", "quantile": self.quantile, "always_ram": True}
+            }
+        elif self.quantization == "binary":
+            payload["vectors"]["on_disk"] = True
+            payload["quantization_config"] = {
+                "binary": {"always_ram": True}
+            }
+
+        try:
+            response = self.http.put(self.collection_url, headers=self.headers, json=payload)
+
+            if response.status_code == 200:
+                quantization = "" if self.quantization == "none" else f" with {self.quantization} quantization"
+                logger.info(f"Collection {self.collection_name} created successfully{quantization}.")
+                return self._create_payload_indexes()
+            else:
+                logger.error(f"Failed to create collection: {response.text}")
+                return False
+
+        except Exception as e:
+            logger.error(f"Error creating collection: {e}")
+            return False
+
+    def _create_payload_indexes(self) -> bool:
+        """Create the configured payload indexes; existing ones are left as they are
+
+        Filtered searches and deletes by ``filename`` use these indexes
+        instead of checking the payload of every point.
+        """
+        for index in self.payload_indexes:
+            field_name, _, schema = index.partition(":")
+            try:
+                response = self.http.put(
+                    f"{self.collection_url}/index?wait=true",
+                    headers=self.headers,
+                    json={"field_name": field_name, "field_schema": schema or "keyword"}
+                )
+
+                if response.status_code != 200:
+                    logger.error(f"Failed to create payload index on {field_name}: {response.text}")
+                    return False
+
+            except Exception as e:
+                logger.error(f"Error creating payload index on {field_name}: {e}")
+                return False
+
+        if self.payload_indexes:
+            logger.info(f"Payload indexes: {', '.join(self.payload_indexes)}")
+        return True
+
+    def delete_collection(self) -> bool:
+        try:
+            response = self.http.delete(self.collection_url, headers=self.headers)
+
+            if response.status_code == 200:
+                logger.info(f"Collection {self.collection_name} deleted successfully.")
+                return True
+            else:
+                logger.warning(f"Failed to delete collection: {response.text}")
+                return False
+        except Exception as e:
+            logger.error(f"Error deleting collection: {e}")
+            return False
+
+    def delete_by_filename(self, filename: str) -> bool:
+        payload = {
+            "filter": {
+                "must": [
+                    {"key": "filename", "match": {"value": filename}}
+                ]
+            }
+        }
+
+        try:
+            response = self.http.post(
+                f"{self.collection_url}/points/delete?wait=true",
+                idempotent=True,
+                headers=self.headers,
+                json=payload
+            )
+
+            if response.status_code == 200:
+                return True
+            else:
+                logger.error(f"  Failed to delete points for {filename}: {response.text}")
+                return False
+
+        except Exception as e:
+            logger.error(f"  Error deleting points for {filename}: {e}")
+            return False
+
+    def upsert(self, points: List[Dict[str, Any]], wait: bool = True) -> bool:
+        # The dense vector is the collection's unnamed default vector ("")
+        points = [
+            {"id": point["id"], "payload": point["payload"],
+             "vector": {"": point["vector"], SPARSE_VECTOR_NAME: point["sparse_vector"]}}
+            if "sparse_vector" in point else point
+            for point in points
+        ]
+
+        try:
+            response = self.http.put(
+                f"{self.collection_url}/points?wait={'true' if wait else 'false'}",
+                headers=self.headers,
+                json={"points": points},
+                compress=self.compress
+            )
+
+            if response.status_code == 200:
+                return True
+            else:
+                logger.error(f"  Failed to upload batch: {response.text}")
+                return False
+
+        except Exception as e:
+            logger.error(f"  Error uploading batch: {e}")
+            return False
+
+    def wait_until_ready(self, timeout: float = 300.0) -> Optional[int]:
+        # Writes sent with wait=false are applied and indexed asynchronously;
+        # the collection reports "green" once the optimizers have caught up
+        deadline = time.monotonic() + timeout
+        delay = 0.1
+        status = "unreachable"
+        while True:
+            try:
+                response = self.http.get(self.collection_url, headers=self.headers)
+                if response.status_code == 200:
+                    info = decode_json(response.content)["result"]
+                    status = info.get("status")
+                    if status == "green":
+                        return info.get("points_count")
+                elif response.status_code < 500:
+                    logger.error(f"Error checking collection status: {response.text}")
+                    return None
+            except Exception as e:
+                logger.warning(f"Error checking collection status: {e}")
+
+            if time.monotonic() >= deadline:
+                logger.error(f"Collection {self.collection_name} still {status} after {timeout:.0f}s")
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+    def scroll(self, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        request = {"limit": page_size, "with_payload": True, "with_vector": True}
+        while True:
+            response = self.http.post(
+                f"{self.collection_url}/points/scroll",
+                idempotent=True,
+                headers=self.headers,
+                json=request
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Failed to scroll collection: {response.text}")
+            result = decode_json(response.content)["result"]
+
+            page = [self._point_from_record(record) for record in result["points"]]
+            if page:
+                yield page
+
+            if result.get("next_page_offset") is None:
+                return
+            request["offset"] = result["next_page_offset"]
+
+    def retrieve(self, ids: Sequence[Any]) -> List[Dict[str, Any]]:
+        if not ids:
+            return []
+        response = self.http.post(
+            f"{self.collection_url}/points",
+            idempotent=True,
+            headers=self.headers,
+            json={"ids": list(ids), "with_payload": True, "with_vector": True}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to retrieve points: {response.text}")
+        return [self._point_from_record(record) for record in decode_json(response.content)["result"]]
+
+    @staticmethod
+    def _point_from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a point read from Qdrant to the format accepted by upsert()"""
+        vector = record["vector"]
+        point = {"id": record["id"], "payload": record.get("payload") or {}}
+        # Collections with sparse vectors return every vector by name
+        if isinstance(vector, dict):
+            if SPARSE_VECTOR_NAME in vector:
+                point["sparse_vector"] = vector[SPARSE_VECTOR_NAME]
+            vector = vector[""]
+        point["vector"] = np.asarray(vector, dtype=np.float32)
+        return point
+
+
+class LocalVectorStore(VectorStore):
+    """Collection stored as a memory-mappable float32 matrix plus payload side file
+
+    Rows are only ever appended while ingesting. Replaced or deleted rows
+    are tracked in memory and dropped by a compaction pass in close().
+    """
+
+    def __init__(self, index_path: str, collection_name: str, vector_size: int):
+        self.collection_name = collection_name
+        self.vector_size = vector_size
+        self.path = Path(index_path) / collection_name
+        self.vectors_path = self.path / "vectors.f32"
+        self.payloads_path = self.path / "payloads.jsonl"
+        self.meta_path = self.path / "meta.json"
+
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._count = 0
+        self._rows: Dict[Any, int] = {}
+        self._filenames: Dict[str, Set[int]] = {}
+        self._dead: Set[int] = set()
+        self._vectors_file = None
+        self._payloads_file = None
+
+    def create_collection(self) -> bool:
+        if self.meta_path.exists():
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("size") != self.vector_size:
+                logger.error(f"Local collection {self.collection_name} has vector size "
+                             f"{meta.get('size')}, expected {self.vector_size}")
+                return False
+            logger.info(f"Local collection {self.collection_name} already exists.")
+            return True
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vectors_path.touch()
+        self.payloads_path.touch()
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"size": self.vector_size, "distance": "Cosine"}, f)
+        logger.info(f"Local collection {self.collection_name} created at {self.path}")
+        return True
+
+    def delete_collection(self) -> bool:
+        self.close()
+        self._loaded = False
+        if self.path.exists():
+            shutil.rmtree(self.path)
+            logger.info(f"Local collection {self.collection_name} deleted successfully.")
+        return True
+
+    def _load(self) -> None:
+        """Index existing rows by ID and filename and open the files for appending"""
+        if self._loaded:
+            return
+
+        self._count = 0
+        self._rows.clear()
+        self._filenames.clear()
+        self._dead.clear()
+        row_bytes = self.vector_size * 4
+        vector_rows = os.path.getsize(self.vectors_path) // row_bytes
+        payload_bytes = 0
+        with open(self.payloads_path, "rb") as f:
+            for row, line in enumerate(f):
+                if row >= vector_rows or not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._track(record["id"], record["payload"].get("filename"), row)
+                self._count = row + 1
+                payload_bytes += len(line)
+
+        # Drop rows left incomplete by an interrupted write, so both files hold the same rows
+        with open(self.payloads_path, "r+b") as f:
+            f.truncate(payload_bytes)
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(self._count * row_bytes)
+
+        self._vectors_file = open(self.vectors_path, "ab")
+        self._payloads_file = open(self.payloads_path, "a", encoding="utf-8")
+        self._loaded = True
+
+    def _track(self, point_id: Any, filename: Optional[str], row: int) -> None:
+        previous = self._rows.get(point_id)
+        if previous is not None:
+            self._dead.add(previous)
+        self._rows[point_id] = row
+        if filename is not None:
+            self._filenames.setdefault(filename, set()).add(row)
+
+    def delete_by_filename(self, filename: str) -> bool:
+        with self._lock:
+            self._load()
+            rows = self._filenames.pop(filename, set())
+            self._dead.update(rows)
+            for point_id in [pid for pid, row in self._rows.items() if row in rows]:
+                del self._rows[point_id]
+        return True
+
+    def upsert(self, points: List[Dict[str, Any]], wait: bool = True) -> bool:
+        # Rows are written synchronously, so ``wait`` changes nothing
+        if not points:
+            return True
+
+        vectors = np.asarray([point["vector"] for point in points], dtype=np.float32)
+        if vectors.shape[1] != self.vector_size:
+            logger.error(f"  Vector size {vectors.shape[1]} does not match collection size {self.vector_size}")
+            return False
+
+        # Pre-normalize so search is a single matrix-vector product
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._load()
+            self._vectors_file.write(vectors.tobytes())
+            for point in points:
+                record = {"id": point["id"], "payload": point["payload"]}
+                if "sparse_vector" in point:
+                    record["sparse"] = point["sparse_vector"]
+                self._payloads_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._track(point["id"], point["payload"].get("filename"), self._count)
+                self._count += 1
+            self._vectors_file.flush()
+            self._payloads_file.flush()
+        return True
+
+    def wait_until_ready(self, timeout: float = 300.0) -> Optional[int]:
+        with self._lock:
+            self._load()
+            return len(self._rows)
+
+    def scroll(self, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        # Compact first so the files hold exactly one row per live point
+        self.close()
+        count = os.path.getsize(self.vectors_path) // (self.vector_size * 4)
+        if not count:
+            return
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.vector_size))
+
+        page = []
+        with open(self.payloads_path, "r", encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                if row >= count:
+                    break
+                record = json.loads(line)
+                point = {"id": record["id"], "vector": np.array(matrix[row]), "payload": record["payload"]}
+                if "sparse" in record:
+                    point["sparse_vector"] = record["sparse"]
+                page.append(point)
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+
+    def retrieve(self, ids: Sequence[Any]) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            wanted = {self._rows[point_id] for point_id in ids if point_id in self._rows}
+            if not wanted:
+                return []
+            matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                               shape=(self._count, self.vector_size))
+
+            # Rows are only found by position, so the payload file is read once for all of them
+            points = []
+            with open(self.payloads_path, "r", encoding="utf-8") as f:
+                for row, line in enumerate(f):
+                    if row >= self._count:
+                        break
+                    if row not in wanted:
+                        continue
+                    record = json.loads(line)
+                    point = {"id": record["id"], "vector": np.array(matrix[row]), "payload": record["payload"]}
+                    if "sparse" in record:
+                        point["sparse_vector"] = record["sparse"]
+                    points.append(point)
+            del matrix
+        return points
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._loaded:
+                return
+            self._vectors_file.close()
+            self._payloads_file.close()
+            self._loaded = False
+            if self._dead:
+                self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite both files without replaced or deleted rows"""
+        live = [row for row in range(self._count) if row not in self._dead]
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                           shape=(self._count, self.vector_size)) if self._count else None
+
+        tmp_vectors = self.vectors_path.with_suffix(".f32.tmp")
+        tmp_payloads = self.payloads_path.with_suffix(".jsonl.tmp")
+        live_set = set(live)
+        with open(tmp_vectors, "wb") as vf, open(tmp_payloads, "w", encoding="utf-8") as pf, \
+                open(self.payloads_path, "r", encoding="utf-8") as source:
+            for row, line in enumerate(source):
+                if row in live_set:
+                    vf.write(np.asarray(matrix[row]).tobytes())
+                    pf.write(line)
+        del matrix
+
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_payloads, self.payloads_path)
+        logger.info(f"Compacted local collection {self.collection_name}: "
+                    f"{len(live)} points, {len(self._dead)} stale rows removed")
+        self._dead.clear()
+
+
+def create_vector_store(backend: str, config: Dict[str, Any], http: HttpClient) -> VectorStore:
+    """Build the vector store selected by ``backend``
+
+    Args:
+        backend: "qdrant" or "local"
+        config: DocumentEmbedder configuration
+        http: Pooled HTTP client for remote backends
+    """
+    if config.get("quantization", "none") not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown QUANTIZATION '{config['quantization']}', "
+                         f"expected one of: {', '.join(QUANTIZATION_MODES)}")
+    if config.get("qdrant_compression", "none") not in COMPRESSION_MODES:
+        raise ValueError(f"Unknown QDRANT_COMPRESSION '{config['qdrant_compression']}', "
+                         f"expected one of: {', '.join(COMPRESSION_MODES)}")
+
+    if backend == "qdrant":
+        return QdrantVectorStore(http, config["qdrant_url"], config["qdrant_api_key"],
+                                 config["collection_name"], config["vector_size"],
+                                 config.get("quantization", "none"), config.get("quantization_quantile", 0.99),
+                                 config.get("sparse_vectors", False),
+                                 config.get("qdrant_compression", "none") == "gzip",
+                                 config.get("payload_indexes", ()))
+    if backend == "local":
+        if config.get("quantization", "none") != "none":
+            logger.warning("Quantization only applies to Qdrant collections; the local index stores float32")
+        return LocalVectorStore(config["local_index_path"], config["collection_name"], config["vector_size"])
+    raise ValueError(f"Unknown vector backend '{backend}', expected one of: {', '.join(VECTOR_BACKENDS)}")
@@ -0,0 +1,215 @@
+"""
+Batch query mode
+
+Answers a JSONL file of questions in one process. Queries are read in
+groups: each group is embedded with batchEmbedContents, searched with a
+single Qdrant search/batch request (or one matrix product on the local
+index), and its answers are synthesized on a bounded thread pool while the
+next group is embedded and searched. Each result is written as one JSONL
+line as soon as its answer is ready, so output order follows completion
+order; use the "id" field to match results to queries.
+
+Input lines are {"query": "...", "id": ...}; "id" defaults to the line number.
+"""
+
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, IO, Iterator, List, Optional, Set
+
+import numpy as np
+
+from gemini_vector_search import (
+    SynthesisError,
+    answer_scope,
+    embedding_options,
+    format_search_results,
+    get_embeddings,
+    get_http_client,
+    pack_results,
+    search_vectors_batch,
+    synthesize_answer,
+)
+
+
+def read_queries(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield {"id", "query"} records from a JSONL file ("-" reads stdin)
+
+    Lines that are not valid records are yielded with an "error" instead.
+    """
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": line_number, "error": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(record, dict) or not str(record.get("query", "")).strip():
+                yield {"id": line_number, "error": "Missing 'query'"}
+                continue
+            yield {"id": record.get("id", line_number), "query": str(record["query"]).strip()}
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _groups(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    group = []
+    for record in records:
+        group.append(record)
+        if len(group) >= size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+class BatchRunner:
+    """Embeds, searches and answers groups of queries, writing JSONL results"""
+
+    def __init__(self, config: Dict[str, Any], output: IO[str], limit: int = 5,
+                 batch_size: int = 100, workers: int = 4, cache=None,
+                 search_params: Optional[Dict[str, Any]] = None, synthesize: bool = True):
+        """Configure a batch run
+
+        Args:
+            config: Search configuration from load_config
+            output: Text stream the JSONL results are written to
+            limit: Maximum number of results per query
+            batch_size: Queries per embedding and search request
+            workers: Concurrent answer synthesis calls
+            cache: Optional QueryCache
+            search_params: Optional Qdrant search params
+            synthesize: Generate answers; when False only search results are written
+        """
+        self.config = config
+        self.output = output
+        self.limit = limit
+        self.batch_size = max(1, min(batch_size, 100))
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.search_params = search_params
+        self.synthesize = synthesize
+
+        self.written = 0
+        self.failed = 0
+
+        # Synthesis workers and the batch requests share one connection pool
+        get_http_client(min_pool_size=self.workers + 1)
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        timings = record.get("timings")
+        if timings:
+            timings["total_ms"] = sum(value for key, value in timings.items() if key != "total_ms")
+        if "error" in record:
+            self.failed += 1
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+        self.written += 1
+
+    def _embed(self, queries: List[str]) -> List[Optional[np.ndarray]]:
+        """Embed queries, reading and filling the query cache when available"""
+        embeddings = [self.cache.get_embedding(query) if self.cache else None for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = get_embeddings([queries[i] for i in missing], self.config["gemini_api_key"],
+                                   self.batch_size, **embedding_options(self.config))
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+                if embedding is not None and self.cache:
+                    self.cache.put_embedding(queries[i], embedding)
+        return embeddings
+
+    def _answer(self, record: Dict[str, Any], embedding: np.ndarray,
+                hits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Synthesize one answer; runs on a worker thread"""
+        start = time.perf_counter()
+        results = record["results"]
+        try:
+            answer = synthesize_answer(record["query"], pack_results(results, self.config),
+                                       self.config["gemini_api_key"])
+        except SynthesisError as e:
+            record["error"] = str(e)
+            return record
+        finally:
+            record["timings"]["synthesis_ms"] = (time.perf_counter() - start) * 1000
+
+        if self.cache and results:
+            self.cache.put_answer(record["query"], embedding, answer_scope(self.config),
+                                  self.limit, answer, hits)
+        record["answer"] = answer
+        return record
+
+    def _process_group(self, group: List[Dict[str, Any]], pool: ThreadPoolExecutor,
+                       pending: Set[Future]) -> None:
+        for record in group:
+            if "error" in record:
+                self._write(record)
+        group = [record for record in group if "error" not in record]
+        if not group:
+            return
+
+        # Batch calls are timed once and shared evenly between their queries
+        start = time.perf_counter()
+        embeddings = self._embed([record["query"] for record in group])
+        embedding_ms = (time.perf_counter() - start) * 1000 / len(group)
+
+        scope = answer_scope(self.config)
+        to_search = []
+        for record, embedding in zip(group, embeddings):
+            record["timings"] = {"embedding_ms": embedding_ms}
+            if embedding is None:
+                record["error"] = "Failed to get embedding for query"
+                self._write(record)
+                continue
+
+            cached = self.cache.lookup_answer(embedding, scope, self.limit) \
+                if self.cache and self.synthesize else None
+            if cached:
+                record.update(answer=cached["answer"], answer_cached=True,
+                              results=format_search_results(cached["hits"], verbose=False))
+                self._write(record)
+                continue
+            to_search.append((record, embedding))
+
+        if not to_search:
+            return
+
+        start = time.perf_counter()
+        all_hits = search_vectors_batch([embedding for _, embedding in to_search], self.config,
+                                        self.limit, self.search_params,
+                                        queries=[record["query"] for record, _ in to_search])
+        search_ms = (time.perf_counter() - start) * 1000 / len(to_search)
+
+        for (record, embedding), hits in zip(to_search, all_hits):
+            record["timings"]["search_ms"] = search_ms
+            record["results"] = format_search_results(hits, verbose=False)
+            if not self.synthesize:
+                self._write(record)
+                continue
+            record["answer_cached"] = False
+            pending.add(pool.submit(self._answer, record, embedding, hits))
+
+    def _drain(self, pending: Set[Future], max_pending: int) -> Set[Future]:
+        """Write finished answers until at most ``max_pending`` are outstanding"""
+        while len(pending) > max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._write(future.result())
+        return pending
+
+    def run(self, records: Iterator[Dict[str, Any]]) -> int:
+        """Process every record and return the number of results written"""
+        pending: Set[Future] = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for group in _groups(records, self.batch_size):
+                self._process_group(group, pool, pending)
+                # Keep roughly one group of answers in flight while the next is prepared
+                pending = self._drain(pending, self.batch_size)
+            self._drain(pending, 0)
+        return self.written
@@ -0,0 +1,137 @@
+"""
+Context packing for answer synthesis
+
+Neighbouring chunks of a document overlap (the embedder repeats up to
+CHUNK_OVERLAP of one chunk at the start of the next), so sending every
+search hit verbatim repeats paragraphs inside the synthesis prompt. Before
+synthesis the hits are packed into passages:
+
+1. hits from the same file with consecutive chunk indices are merged into
+   one passage, joining them where their overlapping text lines up
+2. paragraphs already included in a higher scoring passage are dropped
+3. passages are added in score order until the token budget is spent
+
+Only repeated text is removed; the budget is the one place content can be
+cut, and it cuts the lowest scoring passages first.
+"""
+
+import re
+import string
+from typing import Any, Dict, List, Optional
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+
+# Characters compared to find where a chunk's overlap starts in its predecessor
+OVERLAP_PROBE_CHARS = 64
+
+# Same estimate as the embedder's chunker (gemini_embedding_tool/chunker.py)
+_SYMBOL_BYTES = (string.digits + string.punctuation).encode("ascii")
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of model tokens in ``text``, erring high"""
+    encoded = text.encode("utf-8")
+    symbols = len(encoded) - len(encoded.translate(None, _SYMBOL_BYTES))
+    return max(len(text.split()) + symbols, len(text) // CHARS_PER_TOKEN)
+
+
+def merge_overlapping(first: str, second: str) -> str:
+    """Join two consecutive chunks, keeping their shared text once
+
+    The chunker starts a chunk with a tail of the previous one, so the
+    longest suffix of ``first`` that is a prefix of ``second`` is the
+    overlap. Without one the chunks are joined as separate paragraphs.
+    """
+    probe = second[:OVERLAP_PROBE_CHARS]
+    if probe:
+        position = first.find(probe)
+        while position != -1:
+            if second.startswith(first[position:]):
+                return first + second[len(first) - position:]
+            position = first.find(probe, position + 1)
+    return f"{first}\n\n{second}"
+
+
+def _normalize(paragraph: str) -> str:
+    return " ".join(paragraph.lower().split())
+
+
+def merge_adjacent(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge results from the same file with consecutive chunk indices
+
+    Returns:
+        Passages sorted by score, highest first. Each is a copy of its best
+        scoring result with the merged "text", the best "score" and the
+        merged "chunk_indices"
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    passages = []
+    for result in results:
+        if "filename" in result and isinstance(result.get("chunk_index"), int):
+            groups.setdefault(result["filename"], []).append(result)
+        else:
+            passages.append(dict(result, chunk_indices=[]))
+
+    for hits in groups.values():
+        hits.sort(key=lambda hit: hit["chunk_index"])
+        run = [hits[0]]
+        for hit in hits[1:] + [None]:
+            if hit is not None and hit["chunk_index"] - run[-1]["chunk_index"] <= 1:
+                # A repeated chunk index (e.g. the same chunk found twice) merges to itself
+                if hit["chunk_index"] != run[-1]["chunk_index"]:
+                    run.append(hit)
+                continue
+
+            best = max(run, key=lambda item: item.get("score", 0))
+            text = run[0].get("text", "")
+            for item in run[1:]:
+                text = merge_overlapping(text, item.get("text", ""))
+            passages.append(dict(best, text=text, chunk_indices=[item["chunk_index"] for item in run]))
+            run = [hit]
+
+    passages.sort(key=lambda passage: passage.get("score", 0), reverse=True)
+    return passages
+
+
+def pack_context(results: List[Dict[str, Any]], token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Turn search results into deduplicated passages within a token budget
+
+    Args:
+        results: Formatted search results with "text", "score" and, for
+            merging, "filename" and "chunk_index"
+        token_budget: Maximum estimated tokens of passage text; None or 0
+            for no limit
+
+    Returns:
+        Passages in score order, each with "text", "tokens" and
+        "chunk_indices" besides the fields of its best scoring result. A
+        passage that doesn't fit whole is cut at a paragraph boundary.
+    """
+    seen = set()
+    remaining = token_budget or None
+    packed = []
+
+    for passage in merge_adjacent(results):
+        paragraphs = []
+        tokens = 0
+        for paragraph in PARAGRAPH_BREAK.split(passage.get("text", "").strip()):
+            key = _normalize(paragraph)
+            if not key or key in seen:
+                continue
+            cost = estimate_tokens(paragraph)
+            if remaining is not None and tokens + cost > remaining:
+                # Keep the passage's leading paragraphs; the rest won't fit
+                break
+            seen.add(key)
+            paragraphs.append(paragraph.strip())
+            tokens += cost
+
+        if paragraphs:
+            packed.append(dict(passage, text="\n\n".join(paragraphs), tokens=tokens))
+            if remaining is not None:
+                remaining -= tokens
+                if remaining <= 0:
+                    break
+
+    return packed
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Dimensionality Recall/Size Report
+
+Shows what smaller vectors cost in search quality before a collection is
+rebuilt with them. Vectors are sampled from an existing full-width
+collection (Qdrant or a local index), so no Gemini calls are needed. Ground
+truth is exact full-width search over the sample; for every size two
+reductions are compared:
+- pca: a projection fitted on the sample (what PROJECTION_PATH applies)
+- truncate: the leading components, renormalized. This is what
+  OUTPUT_DIMENSIONALITY returns for models trained to support it (Matryoshka
+  embeddings such as text-embedding-004); for other models it is only a
+  lower bound
+
+Each row reports recall@k, bytes per vector, the size of the whole
+collection's vectors and the latency of a brute-force search over the
+sample. Query vectors are held out of the PCA fit.
+
+Usage:
+    python dimension_report.py --collection nutrition_knowledge --dims 512 256 128
+    python dimension_report.py --collection nutrition_knowledge --save-projection 256 projection_256.npz
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from gemini_vector_search import EMBEDDING_MODEL, get_http_client
+from http_client import decode_json
+from projection import Projection
+from quantization_report import percentile
+
+def sample_qdrant_vectors(collection_name: str, count: int, qdrant_url: str,
+                          qdrant_api_key: str) -> Tuple[np.ndarray, Optional[int]]:
+    """Scroll up to ``count`` dense vectors of a Qdrant collection
+
+    Returns:
+        Tuple of the vectors as a float32 matrix and the collection's point count
+    """
+    headers = {"Content-Type": "application/json", "api-key": qdrant_api_key}
+    collection_url = f"{qdrant_url}/collections/{collection_name}"
+    info = get_http_client().get(collection_url, headers=headers)
+    total = decode_json(info.content)["result"].get("points_count") if info.status_code == 200 else None
+
+    vectors = []
+    request: Dict[str, Any] = {"limit": min(count, 1000), "with_payload": False, "with_vector": True}
+    while len(vectors) < count:
+        response = get_http_client().post(f"{collection_url}/points/scroll", idempotent=True,
+                                          headers=headers, json=request)
+        if response.status_code != 200:
+            print(f"Error sampling vectors from {collection_name}: {response.text}")
+            break
+        result = decode_json(response.content)["result"]
+        for point in result["points"]:
+            vector = point.get("vector")
+            # Collections with sparse vectors return every vector by name
+            if isinstance(vector, dict):
+                vector = vector.get("")
+            if vector:
+                vectors.append(vector)
+        if result.get("next_page_offset") is None:
+            break
+        request["offset"] = result["next_page_offset"]
+
+    return np.asarray(vectors[:count], dtype=np.float32), total
+
+def sample_local_vectors(collection_name: str, count: int, index_path: str) -> Tuple[np.ndarray, int]:
+    """Read up to ``count`` vectors of a local collection"""
+    from local_index import open_local_index
+
+    index = open_local_index(index_path, collection_name)
+    return np.array(index.vectors[:count], dtype=np.float32), len(index)
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, query_rows: np.ndarray, k: int) -> List[np.ndarray]:
+    """Exact cosine top-k per query, skipping each query's own row"""
+    scores = normalize(queries) @ normalize(corpus).T
+    scores[np.arange(len(query_rows)), query_rows] = -np.inf
+    best = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [set(row) for row in best]
+
+def measure(corpus: np.ndarray, query_rows: np.ndarray, truth: List[set], k: int) -> Dict[str, float]:
+    """Recall@k of reduced vectors against the full-width ground truth, and search latency"""
+    found = top_k(corpus, corpus[query_rows], query_rows, k)
+    recalls = [len(expected & result) / k for expected, result in zip(truth, found)]
+
+    # One brute-force search per query, as the local backend does it
+    matrix = normalize(corpus)
+    latencies = []
+    for row in query_rows:
+        start = time.perf_counter()
+        scores = matrix @ matrix[row]
+        np.argpartition(-scores, k)[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "recall": statistics.mean(recalls),
+        "latency_p50_ms": percentile(latencies, 50),
+        "latency_p95_ms": percentile(latencies, 95),
+    }
+
+def main():
+    """Build the recall-versus-size table"""
+    parser = argparse.ArgumentParser(description="Compare search recall of reduced-dimensionality vectors")
+    parser.add_argument("--collection", help="Full-width collection to sample (overrides COLLECTION_NAME)")
+    parser.add_argument("--backend", choices=["qdrant", "local"],
+                        help="Vector store holding the collection (overrides VECTOR_BACKEND, default: qdrant)")
+    parser.add_argument("--dims", type=int, nargs="+", default=[512, 256, 128, 64],
+                        help="Vector sizes to evaluate (default: 512 256 128 64)")
+    parser.add_argument("--sample", type=int, default=10000, help="Vectors to sample (default: 10000)")
+    parser.add_argument("--queries", type=int, default=200, help="Sampled vectors used as queries (default: 200)")
+    parser.add_argument("--limit", type=int, default=10, help="k for recall@k (default: 10)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for choosing the query vectors")
+    parser.add_argument("--save-projection", nargs=2, metavar=("DIMS", "PATH"),
+                        help="Fit a PCA projection to DIMS on the whole sample and save it for PROJECTION_PATH")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    load_dotenv()
+    collection_name = args.collection or os.environ.get("COLLECTION_NAME", "")
+    backend = args.backend or os.environ.get("VECTOR_BACKEND", "qdrant")
+    model = os.environ.get("EMBEDDING_MODEL", EMBEDDING_MODEL)
+    if not collection_name:
+        print("Missing required configuration: COLLECTION_NAME (provide with --collection or in .env)")
+        return 1
+
+    if backend == "local":
+        vectors, total = sample_local_vectors(collection_name, args.sample,
+                                              os.environ.get("LOCAL_INDEX_PATH", "./local_index"))
+    else:
+        qdrant_url = os.environ.get("QDRANT_URL", "")
+        qdrant_api_key = os.environ.get("QDRANT_API_KEY", "")
+        if not qdrant_url or not qdrant_api_key:
+            print("Missing required configuration: QDRANT_URL, QDRANT_API_KEY")
+            return 1
+        vectors, total = sample_qdrant_vectors(collection_name, args.sample, qdrant_url, qdrant_api_key)
+
+    count, width = vectors.shape if vectors.ndim == 2 else (0, 0)
+    if count <= args.limit:
+        print(f"Need more than {args.limit} vectors, found {count}")
+        return 1
+    total = total or count
+
+    if args.save_projection:
+        dims, path = int(args.save_projection[0]), args.save_projection[1]
+        projection = Projection.fit(vectors, dims, model)
+        projection.save(path)
+        print(f"Saved {width} -> {dims} projection to {path} "
+              f"({projection.explained_variance_ratio.sum():.1%} of variance kept, "
+              f"fingerprint {projection.fingerprint})")
+        return 0
+
+    rng = np.random.default_rng(args.seed)
+    query_rows = np.sort(rng.choice(count, size=min(args.queries, count), replace=False))
+    fit_rows = np.setdiff1d(np.arange(count), query_rows)
+
+    print(f"Computing exact top-{args.limit} for {len(query_rows)} queries over {count} "
+          f"{width}-dimensional vectors of {collection_name}...")
+    truth = top_k(vectors, vectors[query_rows], query_rows, args.limit)
+
+    configurations = [("full width", width, vectors)]
+    for dims in sorted({dims for dims in args.dims if 0 < dims < width}, reverse=True):
+        configurations.append(("truncate", dims, vectors[:, :dims]))
+        if len(fit_rows) >= dims:
+            projection = Projection.fit(vectors[fit_rows], dims, model)
+            configurations.append(("pca", dims, projection.apply(vectors)))
+        else:
+            print(f"Skipping PCA to {dims}: only {len(fit_rows)} vectors to fit it on")
+
+    report = {"collection": collection_name, "points": total, "sample": count, "limit": args.limit,
+              "queries": len(query_rows), "results": []}
+    print(f"\n{'Method':<12} {'Dims':>6} {'Bytes/vec':>10} {'Vectors MB':>11} "
+          f"{'Recall@' + str(args.limit):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    print("-" * 71)
+    for method, dims, reduced in configurations:
+        result = measure(reduced, query_rows, truth, args.limit)
+        result.update({"method": method, "dims": dims, "bytes_per_vector": dims * 4,
+                       "vectors_mb": total * dims * 4 / 1e6})
+        report["results"].append(result)
+        print(f"{method:<12} {dims:>6} {result['bytes_per_vector']:>10} {result['vectors_mb']:>11.1f} "
+              f"{result['recall']:>10.3f} {result['latency_p50_ms']:>8.2f} {result['latency_p95_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,53 +8,121 @@ and does not include functions for creating or updating the database.
 
 Usage:
     python gemini_vector_search.py --query "Your search query here" --collection "your_collection_name"
+    python gemini_vector_search.py --queries-file questions.jsonl --output answers.jsonl
+    python gemini_vector_search.py --query "Sources of fiber?" --filter topics=fiber
 """
 
 import os
 import sys
 import argparse
+import atexit
+import contextlib
 import json
-import requests
-from typing import List, Dict, Any, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+import numpy as np
 from dotenv import load_dotenv
 
-def get_embedding(text: str, api_key: str) -> Optional[List[float]]:
+from context_packer import estimate_tokens, pack_context
+from http_client import HttpClient, decode_json
+from local_index import open_local_index
+from projection import PROJECTION_FILENAME, Projection
+from query_cache import QueryCache
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_query
+from telemetry import TRACING_MODES, configure_tracing, metrics, span
+
+EMBEDDING_MODEL = "models/embedding-001"
+DEFAULT_GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1"
+
+# Payload fields fetched with search hits: what results display and what
+# context packing and synthesis read ("*" in SEARCH_PAYLOAD_FIELDS fetches all)
+DEFAULT_PAYLOAD_FIELDS = "title,text,filename,chunk_index,topics,duplicates,duplicate_of"
+COMPRESSION_MODES = ("none", "gzip")
+
+# Shared keep-alive session for Gemini and Qdrant, created on first use
+_http_client: Optional[HttpClient] = None
+
+# Projections loaded by load_projection, by path
+_projections: Dict[str, Projection] = {}
+
+class SynthesisError(RuntimeError):
+    """Gemini failed to produce a complete answer; such answers are never cached"""
+
+def get_http_client(min_pool_size: int = 1) -> HttpClient:
+    """Return the process-wide pooled HTTP client, configured from HTTP_* variables
+    
+    Gemini throttling (HTTP 429) is retried after its Retry-After delay: a
+    query has no rate limiter of its own to slow down with.
+    
+    Args:
+        min_pool_size: Lower bound on the pool size, applied when the client is created
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = HttpClient.from_env(min_pool_size=min_pool_size, retry_throttled=True)
+    return _http_client
+
+def gemini_url(method: str, api_key: str) -> str:
+    """URL of a Gemini API method such as "models/embedding-001:embedContent"
+    
+    GEMINI_API_BASE overrides the API root, e.g. to use a proxy or a local
+    stand-in server.
+    """
+    base = os.environ.get("GEMINI_API_BASE", DEFAULT_GEMINI_API_BASE).rstrip("/")
+    return f"{base}/{method}?key={api_key}"
+
+def embed_request(text: str, model: str = EMBEDDING_MODEL, output_dimensionality: int = 0) -> Dict[str, Any]:
+    """Request body for embedding one text, asking for a reduced width if set"""
+    request = {
+        "model": model,
+        "content": {
+            "parts": [
+                {"text": text}
+            ]
+        }
+    }
+    if output_dimensionality:
+        request["outputDimensionality"] = output_dimensionality
+    return request
+
+def get_embedding(text: str, api_key: str, model: str = EMBEDDING_MODEL, output_dimensionality: int = 0,
+                  projection: Optional[Projection] = None) -> Optional[np.ndarray]:
     """Get embedding vector from Gemini API
     
     Args:
         text: The text to embed
         api_key: The Gemini API key
+        model: Embedding model, the one the collection was built with
+        output_dimensionality: Ask the model for a vector of this size (0 for its full width)
+        projection: PCA projection the collection's vectors went through,
+            applied to the query vector as well
             
     Returns:
-        List[float]: Embedding vector, or None on error
+        np.ndarray: float32 embedding vector, or None on error
     """
-    url = f"https://generativelanguage.googleapis.com/v1/models/embedding-001:embedContent?key={api_key}"
+    url = gemini_url(f"{model}:embedContent", api_key)
     
     # Trim text if too long (API has limits)
     if len(text) > 25000:
         text = text[:25000]
         print("Warning: Text truncated to 25000 characters")
     
-    payload = {
-        "model": "models/embedding-001",
-        "content": {
-            "parts": [
-                {"text": text}
-            ]
-        }
-    }
+    payload = embed_request(text, model, output_dimensionality)
     
     try:
-        response = requests.post(url, json=payload)
+        with span("embed_query"):
+            response = get_http_client().post(url, json=payload, idempotent=True)
         
         if response.status_code != 200:
             print(f"Error getting embedding: {response.text}")
             return None
         
-        result = response.json()
+        result = decode_json(response.content)
         
         if "embedding" in result and "values" in result["embedding"]:
-            return result["embedding"]["values"]
+            embedding = np.asarray(result["embedding"]["values"], dtype=np.float32)
+            return projection.apply(embedding) if projection is not None else embedding
         else:
             print(f"Unexpected response format: {result}")
             return None
@@ -63,27 +131,114 @@ def get_embedding(text: str, api_key: str) -> Optional[List[float]]:
         print(f"Error getting embedding: {e}")
         return None
 
-def search_qdrant(embedding: List[float], collection_name: str, limit: int, 
-                 qdrant_url: str, qdrant_api_key: str) -> List[Dict[str, Any]]:
+def get_embeddings(texts: List[str], api_key: str, batch_size: int = 100, model: str = EMBEDDING_MODEL,
+                   output_dimensionality: int = 0,
+                   projection: Optional[Projection] = None) -> List[Optional[np.ndarray]]:
+    """Get embedding vectors for several texts using batchEmbedContents
+    
+    Items missing from a batch response, or belonging to a rejected batch,
+    are retried one at a time with get_embedding.
+    
+    Args:
+        texts: The texts to embed
+        api_key: The Gemini API key
+        batch_size: Texts per request (the API accepts at most 100)
+        model, output_dimensionality, projection: As for get_embedding
+            
+    Returns:
+        List: One embedding per input text, in order (None where embedding failed)
+    """
+    url = gemini_url(f"{model}:batchEmbedContents", api_key)
+    batch_size = max(1, min(batch_size, 100))
+    embeddings: List[Optional[np.ndarray]] = []
+    
+    for start in range(0, len(texts), batch_size):
+        batch = [text[:25000] for text in texts[start:start + batch_size]]
+        payload = {"requests": [embed_request(text, model, output_dimensionality) for text in batch]}
+        
+        items = []
+        try:
+            with span("embed_query_batch", texts=len(batch)):
+                response = get_http_client().post(url, json=payload, idempotent=True)
+            
+            if response.status_code == 200:
+                items = decode_json(response.content).get("embeddings", [])
+            else:
+                print(f"Error getting batch embeddings: {response.text}")
+                
+        except Exception as e:
+            print(f"Error getting batch embeddings: {e}")
+        
+        for i, text in enumerate(batch):
+            values = items[i].get("values") if i < len(items) and items[i] else None
+            if values:
+                embedding = np.asarray(values, dtype=np.float32)
+                embeddings.append(projection.apply(embedding) if projection is not None else embedding)
+            else:
+                embeddings.append(get_embedding(text, api_key, model, output_dimensionality, projection))
+    
+    return embeddings
+
+def quantization_search_params(oversampling: Optional[float] = None, rescore: bool = True,
+                               exact: bool = False) -> Dict[str, Any]:
+    """Build Qdrant search params for a quantized collection
+    
+    Args:
+        oversampling: Fetch ``limit * oversampling`` candidates using the
+            quantized vectors before rescoring (None keeps the server default)
+        rescore: Re-rank the candidates with the full-precision vectors
+        exact: Skip the HNSW index and quantization entirely (ground truth)
+        
+    Returns:
+        Dict suitable for the "params" field of a search request
+    """
+    if exact:
+        return {"exact": True, "quantization": {"ignore": True}}
+    
+    quantization: Dict[str, Any] = {"ignore": False, "rescore": rescore}
+    if oversampling is not None:
+        quantization["oversampling"] = oversampling
+    return {"quantization": quantization}
+
+def search_qdrant(embedding: Any, collection_name: str, limit: int, 
+                 qdrant_url: str, qdrant_api_key: str,
+                 search_params: Optional[Dict[str, Any]] = None,
+                 vector_name: Optional[str] = None,
+                 payload_fields: Optional[List[str]] = None,
+                 compress: bool = False,
+                 query_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """Search the Qdrant vector database
     
     Args:
-        embedding: Vector embedding to search with
+        embedding: Vector embedding to search with (or a sparse
+            {"indices", "values"} vector together with ``vector_name``)
         collection_name: Name of the Qdrant collection
         limit: Maximum number of results to return
         qdrant_url: URL of the Qdrant server
         qdrant_api_key: API key for Qdrant
+        search_params: Optional "params" for the request, e.g. from
+            quantization_search_params
+        vector_name: Search this named vector instead of the default one
+        payload_fields: Payload fields to return with each hit (None for all)
+        compress: Gzip the request body
+        query_filter: Qdrant filter the hits must match, e.g. from parse_filter
         
     Returns:
         List of search results with payload and score
     """
     # Build search payload
     search_payload = {
-        "vector": embedding,
+        "vector": {"name": vector_name, "vector": embedding} if vector_name else embedding,
         "limit": limit,
-        "with_payload": True
+        "with_payload": payload_fields or True
     }
     
+    if search_params:
+        search_payload["params"] = search_params
+    
+    if query_filter:
+        search_payload["filter"] = query_filter
+    
     headers = {
         "Content-Type": "application/json"
     }
@@ -95,18 +250,21 @@ def search_qdrant(embedding: List[float], collection_name: str, limit: int,
     try:
         search_url = f"{qdrant_url}/collections/{collection_name}/points/search"
         
-        response = requests.post(
-            search_url,
-            headers=headers,
-            json=search_payload
-        )
+        with span("qdrant_search", vector=vector_name or "dense"):
+            response = get_http_client().post(
+                search_url,
+                idempotent=True,
+                headers=headers,
+                json=search_payload,
+                compress=compress
+            )
         
         if response.status_code != 200:
             print(f"Error searching Qdrant: {response.status_code}")
             print(f"Response: {response.text}")
             return []
         
-        results = response.json()
+        results = decode_json(response.content)
         
         # Try to find hits in the response
         hits = []
@@ -121,11 +279,105 @@ def search_qdrant(embedding: List[float], collection_name: str, limit: int,
         print(f"Error during search: {str(e)}")
         return []
 
-def format_search_results(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def search_qdrant_batch(embeddings: List[np.ndarray], collection_name: str, limit: int,
+                        qdrant_url: str, qdrant_api_key: str,
+                        search_params: Optional[Dict[str, Any]] = None,
+                        vector_name: Optional[str] = None,
+                        payload_fields: Optional[List[str]] = None,
+                        compress: bool = False,
+                        query_filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+    """Run several searches in one request through Qdrant's search/batch endpoint
+    
+    Args:
+        embeddings: Vector embeddings to search with
+        collection_name: Name of the Qdrant collection
+        limit: Maximum number of results per search
+        qdrant_url: URL of the Qdrant server
+        qdrant_api_key: API key for Qdrant
+        search_params: Optional "params" applied to every search
+        vector_name: Search this named vector instead of the default one
+        payload_fields: Payload fields to return with each hit (None for all)
+        compress: Gzip the request body
+        query_filter: Qdrant filter applied to every search
+        
+    Returns:
+        One list of hits per embedding, in order (empty lists on error)
+    """
+    if not embeddings:
+        return []
+    
+    searches = []
+    for embedding in embeddings:
+        vector = {"name": vector_name, "vector": embedding} if vector_name else embedding
+        search = {"vector": vector, "limit": limit, "with_payload": payload_fields or True}
+        if search_params:
+            search["params"] = search_params
+        if query_filter:
+            search["filter"] = query_filter
+        searches.append(search)
+    
+    headers = {
+        "Content-Type": "application/json"
+    }
+    
+    if qdrant_api_key:
+        headers["api-key"] = qdrant_api_key
+    
+    try:
+        with span("qdrant_search_batch", vector=vector_name or "dense", searches=len(searches)):
+            response = get_http_client().post(
+                f"{qdrant_url}/collections/{collection_name}/points/search/batch",
+                idempotent=True,
+                headers=headers,
+                json={"searches": searches},
+                compress=compress
+            )
+        
+        if response.status_code != 200:
+            print(f"Error searching Qdrant: {response.status_code}")
+            print(f"Response: {response.text}")
+            return [[] for _ in embeddings]
+        
+        results = decode_json(response.content).get("result", [])
+        return [results[i] if i < len(results) else [] for i in range(len(embeddings))]
+        
+    except Exception as e:
+        print(f"Error during batch search: {str(e)}")
+        return [[] for _ in embeddings]
+
+def search_local(embedding: np.ndarray, collection_name: str, limit: int,
+                 index_path: str, query_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Search a local index built by the embedder with VECTOR_BACKEND=local
+    
+    Args:
+        embedding: Vector embedding to search with
+        collection_name: Name of the local collection
+        limit: Maximum number of results to return
+        index_path: Directory holding local collections
+        query_filter: Qdrant filter the hits must match
+        
+    Returns:
+        List of search results with payload and score, shaped like Qdrant hits
+    """
+    try:
+        index = open_local_index(index_path, collection_name)
+    except FileNotFoundError:
+        print(f"Local collection '{collection_name}' not found in {index_path}")
+        return []
+    
+    try:
+        with span("local_search"):
+            return index.search(embedding, limit, query_filter)
+    except ValueError as e:
+        print(f"Error during search: {e}")
+        return []
+
+def format_search_results(hits: List[Dict[str, Any]], verbose: bool = True) -> List[Dict[str, Any]]:
     """Format search results for display and for use in answer synthesis
     
     Args:
         hits: Raw search results from Qdrant
+        verbose: Print each result as it is formatted
         
     Returns:
         Formatted results with relevant fields extracted
@@ -133,6 +385,12 @@ def format_search_results(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     formatted_results = []
     
     for i, hit in enumerate(hits):
+        if not verbose:
+            result_data = {"score": hit.get("score", 0)}
+            result_data.update(hit.get("payload", {}))
+            formatted_results.append(result_data)
+            continue
+        
         print(f"\nResult {i+1}")
         if "score" in hit:
             print(f"Score: {hit['score']:.6f}")
@@ -150,26 +408,27 @@ def format_search_results(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                         print(f"Text: {value[:200]}...")
                     else:
                         print(f"Text: {value}")
+                # Near-duplicate references written by the embedder's DEDUP modes
+                elif key == "duplicates" and value:
+                    print(f"Also in: {', '.join(sorted({reference['filename'] for reference in value}))}")
+                elif key == "duplicate_of" and value:
+                    print(f"Near-duplicate of: {value['filename']} (chunk {value['chunk_index'] + 1})")
         
         formatted_results.append(result_data)
         print("-" * 50)
     
     return formatted_results
 
-def synthesize_answer(query: str, results: List[Dict[str, Any]], gemini_api_key: str) -> str:
-    """Synthesize a complete answer from search results using Gemini API
+def build_synthesis_payload(query: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the Gemini request body used to synthesize an answer
     
     Args:
         query: The user's original query
         results: List of search result objects with text and metadata
-        gemini_api_key: API key for Gemini
         
     Returns:
-        Synthesized answer as a string
+        Request body for generateContent / streamGenerateContent
     """
-    if not results:
-        return "No relevant information found to answer your query."
-    
     # Extract information from results
     context = "SEARCH RESULTS:\n\n"
     
@@ -206,9 +465,6 @@ INSTRUCTIONS:
 10. DO NOT say phrases like "Based on the provided information" or "According to the information"
 """
     
-    # Make the API call to Gemini
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-1.5-pro:generateContent?key={gemini_api_key}"
-    
     # Create the prompt with system instructions, context and query
     unified_content = f"{system_prompt}\n\n{context}\n\nQuestion: {query}\n\nAnswer:"
     
@@ -228,82 +484,649 @@ INSTRUCTIONS:
         }
     }
     
+    return payload
+
+def synthesize_answer(query: str, results: List[Dict[str, Any]], gemini_api_key: str) -> str:
+    """Synthesize a complete answer from search results using Gemini API
+    
+    Args:
+        query: The user's original query
+        results: List of search result objects with text and metadata
+        gemini_api_key: API key for Gemini
+        
+    Returns:
+        Synthesized answer as a string
+        
+    Raises:
+        SynthesisError: If Gemini could not be reached or returned no answer
+    """
+    if not results:
+        return "No relevant information found to answer your query."
+    
+    # Make the API call to Gemini
+    url = gemini_url("models/gemini-1.5-pro:generateContent", gemini_api_key)
+    payload = build_synthesis_payload(query, results)
+    
     try:
-        response = requests.post(url, json=payload)
+        with span("synthesis", results=len(results)):
+            response = get_http_client().post(url, json=payload, idempotent=True)
         
         if response.status_code != 200:
-            print(f"Error getting response from Gemini: {response.text}")
-            return "Error generating answer. Please try again."
+            raise SynthesisError(f"Gemini returned HTTP {response.status_code}: {response.text[:200]}")
+        
+        result = decode_json(response.content)
+    except SynthesisError:
+        raise
+    except Exception as e:
+        raise SynthesisError(f"Error communicating with Gemini API: {e}") from e
+    
+    # Extract the generated text from the response
+    if "candidates" in result and len(result["candidates"]) > 0:
+        candidate = result["candidates"][0]
+        if "content" in candidate and "parts" in candidate["content"]:
+            parts = candidate["content"]["parts"]
+            if parts and "text" in parts[0]:
+                return parts[0]["text"]
+    
+    raise SynthesisError(f"Unexpected response format from Gemini: {str(result)[:200]}")
+
+def stream_answer(query: str, results: List[Dict[str, Any]], gemini_api_key: str,
+                  timings: Optional[Dict[str, float]] = None) -> Iterator[str]:
+    """Synthesize an answer with streamGenerateContent, yielding text as it arrives
+    
+    Failures raise SynthesisError like synthesize_answer, also after text
+    has been yielded: the caller then holds a partial answer that must not
+    be taken (or cached) as a complete one.
+    
+    Args:
+        query: The user's original query
+        results: List of search result objects with text and metadata
+        gemini_api_key: API key for Gemini
+        timings: If given, filled with "ttft_ms" (time to first text chunk)
+            and "total_ms" once the stream ends
+        
+    Yields:
+        Consecutive pieces of the answer text
+        
+    Raises:
+        SynthesisError: If the stream could not be started, broke off or held no text
+    """
+    start = time.perf_counter()
+    first_chunk = True
+    
+    def record(final: bool = False) -> None:
+        elapsed = time.perf_counter() - start
+        # A generator can't hold a span open across yields, so the stages are observed directly
+        metrics.observe("stage_seconds", elapsed, stage="synthesis_stream" if final else "synthesis_first_token")
+        if timings is None:
+            return
+        if final:
+            timings["total_ms"] = elapsed * 1000
+            timings.setdefault("ttft_ms", elapsed * 1000)
+        else:
+            timings["ttft_ms"] = elapsed * 1000
+    
+    if not results:
+        record(final=True)
+        yield "No relevant information found to answer your query."
+        return
+    
+    # alt=sse returns one "data: {...}" server-sent event per generated chunk
+    url = gemini_url("models/gemini-1.5-pro:streamGenerateContent", gemini_api_key) + "&alt=sse"
+    payload = build_synthesis_payload(query, results)
+    
+    try:
+        response = get_http_client().post(url, json=payload, idempotent=True, stream=True)
         
-        result = response.json()
+        if response.status_code != 200:
+            raise SynthesisError(f"Gemini returned HTTP {response.status_code}: {response.text[:200]}")
         
-        # Extract the generated text from the response
-        if "candidates" in result and len(result["candidates"]) > 0:
-            candidate = result["candidates"][0]
-            if "content" in candidate and "parts" in candidate["content"]:
-                parts = candidate["content"]["parts"]
-                if parts and "text" in parts[0]:
-                    return parts[0]["text"]
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                
+                event = decode_json(line[len("data:"):].strip())
+                for candidate in event.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        text = part.get("text")
+                        if text:
+                            if first_chunk:
+                                record()
+                                first_chunk = False
+                            yield text
         
-        print(f"Unexpected response format from Gemini: {result}")
-        return "Error parsing Gemini response. Please try again."
+        if first_chunk:
+            raise SynthesisError("Gemini stream ended without any answer text")
             
+    except SynthesisError:
+        record(final=True)
+        raise
     except Exception as e:
-        print(f"Error getting answer from Gemini: {e}")
-        return "Error communicating with Gemini API. Please try again."
+        record(final=True)
+        if first_chunk:
+            raise SynthesisError(f"Error communicating with Gemini API: {e}") from e
+        raise SynthesisError(f"Answer stream interrupted: {e}") from e
+    
+    record(final=True)
+
+def parse_payload_fields(value: str) -> Optional[List[str]]:
+    """Parse a comma-separated field list; "*" or an empty value selects every field"""
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    return None if not fields or "*" in fields else fields
+
+def _filter_value(value: str) -> Any:
+    """Read integers and booleans as such, so they match numeric and boolean payload fields"""
+    value = value.strip()
+    if value.lstrip("-").isdigit():
+        return int(value)
+    if value in ("true", "false"):
+        return value == "true"
+    return value
+
+def parse_filter(expressions: Union[str, List[str], Dict[str, Any], None]) -> Optional[Dict[str, Any]]:
+    """Build a Qdrant filter from simple field expressions
+    
+    Expressions are combined with AND:
+    - ``field=value``: the payload field equals value, or for a list field
+      such as ``topics``, contains it
+    - ``field=a,b``: matches any of the values
+    - ``field!=value`` / ``field!=a,b``: matches none of the values
+    An expression starting with "{" is read as a Qdrant filter in JSON and
+    its conditions are merged in; a dict is taken as such a filter already.
+    
+    Args:
+        expressions: One expression, a list of them, a filter dict, or None
+        
+    Returns:
+        Qdrant filter with "must"/"should"/"must_not" lists, or None if there
+        are no expressions
+        
+    Raises:
+        ValueError: If an expression cannot be parsed
+    """
+    if not expressions:
+        return None
+    if isinstance(expressions, (str, dict)):
+        expressions = [expressions]
+    
+    query_filter: Dict[str, List[Dict[str, Any]]] = {}
+    for expression in expressions:
+        if isinstance(expression, str) and expression.strip().startswith("{"):
+            try:
+                expression = json.loads(expression)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON filter: {e}")
+        if isinstance(expression, dict):
+            for clause in ("must", "should", "must_not"):
+                conditions = expression.get(clause, [])
+                query_filter.setdefault(clause, []).extend(
+                    conditions if isinstance(conditions, list) else [conditions])
+            continue
+        
+        field, operator, values = str(expression).partition("!=")
+        clause = "must_not"
+        if not operator:
+            field, operator, values = str(expression).partition("=")
+            clause = "must"
+        field = field.strip()
+        parsed = [_filter_value(value) for value in values.split(",") if value.strip()]
+        if not operator or not field or not parsed:
+            raise ValueError(f"Invalid filter '{expression}', expected field=value, field=a,b or field!=value")
+        
+        match = {"value": parsed[0]} if len(parsed) == 1 else {"any": parsed}
+        query_filter.setdefault(clause, []).append({"key": field, "match": match})
+    
+    return {clause: conditions for clause, conditions in query_filter.items() if conditions} or None
+
+def answer_scope(config: Dict[str, Any]) -> str:
+    """Key for cached answers: the collection plus every setting that changes the context
+    
+    Answers are only reused by queries searched and packed the same way:
+    under the same filter, hybrid settings, payload fields and context budget.
+    """
+    settings = {
+        "filter": config.get("query_filter"),
+        "hybrid": [config["hybrid_candidates"], config["rrf_k"]] if config.get("hybrid") else None,
+        "payload_fields": config.get("payload_fields"),
+        "context_token_budget": config.get("context_token_budget"),
+    }
+    return f"{config['collection_name']}?{json.dumps(settings, sort_keys=True, separators=(',', ':'))}"
+
+def load_config(collection: Optional[str] = None, backend: Optional[str] = None) -> Dict[str, Any]:
+    """Read search configuration from the environment (and .env)
+    
+    Args:
+        collection: Collection name overriding COLLECTION_NAME
+        backend: Vector store overriding VECTOR_BACKEND
+        
+    Returns:
+        Dict of configuration values
+    """
+    load_dotenv()
+    
+    return {
+        "qdrant_url": os.environ.get("QDRANT_URL", ""),
+        "qdrant_api_key": os.environ.get("QDRANT_API_KEY", ""),
+        "gemini_api_key": os.environ.get("GEMINI_API_KEY", ""),
+        "collection_name": collection or os.environ.get("COLLECTION_NAME", ""),
+        "backend": backend or os.environ.get("VECTOR_BACKEND", "qdrant"),
+        "local_index_path": os.environ.get("LOCAL_INDEX_PATH", "./local_index"),
+        "embedding_model": os.environ.get("EMBEDDING_MODEL", EMBEDDING_MODEL),
+        "output_dimensionality": int(os.environ.get("OUTPUT_DIMENSIONALITY", "0")),
+        "projection_path": os.environ.get("PROJECTION_PATH", ""),
+        "hybrid": os.environ.get("HYBRID_SEARCH", "false").lower() in ("1", "true", "yes"),
+        "hybrid_candidates": int(os.environ.get("HYBRID_CANDIDATES", "20")),
+        "rrf_k": int(os.environ.get("RRF_K", "60")),
+        "context_token_budget": int(os.environ.get("CONTEXT_TOKEN_BUDGET", "8000")),
+        "payload_fields": parse_payload_fields(os.environ.get("SEARCH_PAYLOAD_FIELDS", DEFAULT_PAYLOAD_FIELDS)),
+        "query_filter": None,
+        "qdrant_compression": os.environ.get("QDRANT_COMPRESSION", "none").lower(),
+        "query_cache_path": os.environ.get("QUERY_CACHE_PATH", ".query_cache.sqlite"),
+        "answer_cache_threshold": float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95")),
+        "answer_cache_ttl": float(os.environ.get("ANSWER_CACHE_TTL", "86400")),
+        "answer_cache_max_entries": int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+        "metrics_path": os.environ.get("METRICS_PATH", ""),
+        "tracing": os.environ.get("TRACING", "off").lower(),
+        "trace_path": os.environ.get("TRACE_PATH", "search_trace.jsonl"),
+    }
+
+def missing_config(config: Dict[str, Any]) -> List[str]:
+    """Return the names of required settings that are not configured"""
+    missing_keys = []
+    if config["backend"] == "qdrant" and not config["qdrant_url"]:
+        missing_keys.append("QDRANT_URL")
+    if config["backend"] == "qdrant" and not config["qdrant_api_key"]:
+        missing_keys.append("QDRANT_API_KEY")
+    if not config["gemini_api_key"]:
+        missing_keys.append("GEMINI_API_KEY")
+    if not config["collection_name"]:
+        missing_keys.append("COLLECTION_NAME (provide with --collection or in .env)")
+    if config["qdrant_compression"] not in COMPRESSION_MODES:
+        missing_keys.append(f"QDRANT_COMPRESSION (one of {', '.join(COMPRESSION_MODES)})")
+    if config["tracing"] not in TRACING_MODES:
+        missing_keys.append(f"TRACING (one of {', '.join(TRACING_MODES)})")
+    if config["projection_path"] and not os.path.exists(config["projection_path"]):
+        missing_keys.append(f"PROJECTION_PATH (no file at {config['projection_path']})")
+    return missing_keys
+
+def open_query_cache(config: Dict[str, Any]):
+    """Open the query/answer cache, or return None if QUERY_CACHE_PATH is empty"""
+    if not config["query_cache_path"]:
+        return None
+    
+    return QueryCache(
+        config["query_cache_path"],
+        embedding_signature(config),
+        similarity_threshold=config["answer_cache_threshold"],
+        ttl_seconds=config["answer_cache_ttl"],
+        max_answers=config["answer_cache_max_entries"]
+    )
+
+def load_projection(config: Dict[str, Any]) -> Optional[Projection]:
+    """Return the PCA projection queries must go through, if the collection uses one
+    
+    PROJECTION_PATH names it explicitly; a local collection built with a
+    projection keeps a copy in its own directory, which is used otherwise.
+    """
+    path = config["projection_path"]
+    if not path and config["backend"] == "local":
+        path = os.path.join(config["local_index_path"], config["collection_name"], PROJECTION_FILENAME)
+        if not os.path.exists(path):
+            return None
+    if not path:
+        return None
+    if path not in _projections:
+        _projections[path] = Projection.load(path)
+    return _projections[path]
+
+def embedding_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Model, output size and projection arguments for get_embedding(s)"""
+    return {"model": config["embedding_model"], "output_dimensionality": config["output_dimensionality"],
+            "projection": load_projection(config)}
+
+def embedding_signature(config: Dict[str, Any]) -> str:
+    """Identify how query vectors are produced, so cached ones are never reused across settings"""
+    signature = config["embedding_model"]
+    if config["output_dimensionality"]:
+        signature += f"@{config['output_dimensionality']}"
+    projection = load_projection(config)
+    if projection is not None:
+        signature += f"+pca{projection.output_size}:{projection.fingerprint}"
+    return signature
+
+def embed_query(query: str, config: Dict[str, Any], cache=None) -> Tuple[Optional[np.ndarray], bool]:
+    """Embed a query, using the query cache when available
+    
+    Returns:
+        Tuple of the embedding (None on error) and whether it came from the cache
+    """
+    embedding = cache.get_embedding(query) if cache else None
+    if embedding is not None:
+        return embedding, True
+    
+    embedding = get_embedding(query, config["gemini_api_key"], **embedding_options(config))
+    if embedding is not None and cache:
+        cache.put_embedding(query, embedding)
+    return embedding, False
+
+def qdrant_transport(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload projection, compression and filter arguments for search_qdrant(_batch)"""
+    return {"payload_fields": config["payload_fields"], "compress": config["qdrant_compression"] == "gzip",
+            "query_filter": config.get("query_filter")}
+
+def search_sparse(query: str, config: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+    """BM25 search over the sparse vectors stored with SPARSE_VECTORS enabled"""
+    return search_sparse_batch([query], config, limit)[0]
+
+def search_sparse_batch(queries: List[str], config: Dict[str, Any], limit: int) -> List[List[Dict[str, Any]]]:
+    """BM25 search for several queries (one Qdrant search/batch request)"""
+    vectors = [encode_query(query) for query in queries]
+    
+    if config["backend"] == "local":
+        try:
+            index = open_local_index(config["local_index_path"], config["collection_name"])
+        except FileNotFoundError:
+            print(f"Local collection '{config['collection_name']}' not found in {config['local_index_path']}")
+            return [[] for _ in queries]
+        if not index.has_sparse:
+            print("Local collection has no sparse vectors; re-embed with SPARSE_VECTORS=true for hybrid search")
+        try:
+            with span("local_sparse_search", searches=len(vectors)):
+                return [index.search_sparse(vector, limit, config.get("query_filter")) for vector in vectors]
+        except ValueError as e:
+            print(f"Error during sparse search: {e}")
+            return [[] for _ in queries]
+    
+    # Queries made only of stopwords have no terms to search for
+    searchable = [i for i, vector in enumerate(vectors) if vector["indices"]]
+    results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+    found = search_qdrant_batch([vectors[i] for i in searchable], config["collection_name"], limit,
+                                config["qdrant_url"], config["qdrant_api_key"],
+                                vector_name=SPARSE_VECTOR_NAME, **qdrant_transport(config))
+    for i, hits in zip(searchable, found):
+        results[i] = hits
+    return results
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], limit: int,
+                           k: int = 60) -> List[Dict[str, Any]]:
+    """Merge ranked hit lists with reciprocal rank fusion
+    
+    Each hit scores ``sum(1 / (k + rank))`` over the lists it appears in, so
+    points ranked well by several retrievers rise to the top without having
+    to compare cosine and BM25 scores directly.
+    
+    Args:
+        rankings: Hit lists, each ordered best first
+        limit: Maximum number of fused results
+        k: Damping constant; larger values flatten the rank weights
+        
+    Returns:
+        Hits ordered by fused score, with "score" replaced by that score
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for hits in rankings:
+        for rank, hit in enumerate(hits, 1):
+            entry = fused.get(hit["id"])
+            if entry is None:
+                entry = fused[hit["id"]] = dict(hit, score=0.0)
+            entry["score"] += 1.0 / (k + rank)
+    
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:limit]
+
+def hybrid_search(query: str, embedding: np.ndarray, config: Dict[str, Any], limit: int,
+                  search_params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Run dense and BM25 retrieval in parallel and fuse them with RRF"""
+    return hybrid_search_batch([query], [embedding], config, limit, search_params)[0]
+
+def hybrid_search_batch(queries: List[str], embeddings: List[np.ndarray], config: Dict[str, Any],
+                        limit: int, search_params: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+    """Hybrid search for several queries; see hybrid_search"""
+    candidates = max(limit, config["hybrid_candidates"])
+    
+    # Lexical retrieval runs on a worker thread while the dense search runs here
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        sparse = pool.submit(search_sparse_batch, queries, config, candidates)
+        dense = _search_dense_batch(embeddings, config, candidates, search_params)
+        lexical = sparse.result()
+    
+    return [
+        reciprocal_rank_fusion([dense_hits, sparse_hits], limit, config["rrf_k"])
+        for dense_hits, sparse_hits in zip(dense, lexical)
+    ]
+
+def search_vectors(embedding: np.ndarray, config: Dict[str, Any], limit: int,
+                   search_params: Optional[Dict[str, Any]] = None,
+                   query: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Search the configured vector store (Qdrant or local index)
+    
+    With hybrid search enabled and the query text given, dense and BM25
+    results are fused; otherwise this is a dense search.
+    """
+    with span("search", hybrid=bool(config.get("hybrid") and query)):
+        if config.get("hybrid") and query:
+            return hybrid_search(query, embedding, config, limit, search_params)
+        if config["backend"] == "local":
+            return search_local(embedding, config["collection_name"], limit, config["local_index_path"],
+                                config.get("query_filter"))
+        return search_qdrant(embedding, config["collection_name"], limit, config["qdrant_url"],
+                             config["qdrant_api_key"], search_params=search_params, **qdrant_transport(config))
+
+def search_vectors_batch(embeddings: List[np.ndarray], config: Dict[str, Any], limit: int,
+                         search_params: Optional[Dict[str, Any]] = None,
+                         queries: Optional[List[str]] = None) -> List[List[Dict[str, Any]]]:
+    """Search the configured vector store with several embeddings at once
+    
+    With hybrid search enabled and the query texts given, dense and BM25
+    results are fused per query.
+    """
+    with span("search_batch", hybrid=bool(config.get("hybrid") and queries), searches=len(embeddings)):
+        if config.get("hybrid") and queries:
+            return hybrid_search_batch(queries, embeddings, config, limit, search_params)
+        return _search_dense_batch(embeddings, config, limit, search_params)
+
+def _search_dense_batch(embeddings: List[np.ndarray], config: Dict[str, Any], limit: int,
+                        search_params: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+    if config["backend"] == "local":
+        try:
+            index = open_local_index(config["local_index_path"], config["collection_name"])
+        except FileNotFoundError:
+            print(f"Local collection '{config['collection_name']}' not found in {config['local_index_path']}")
+            return [[] for _ in embeddings]
+        try:
+            with span("local_search_batch", searches=len(embeddings)):
+                return index.search_batch(embeddings, limit, config.get("query_filter"))
+        except ValueError as e:
+            print(f"Error during batch search: {e}")
+            return [[] for _ in embeddings]
+    return search_qdrant_batch(embeddings, config["collection_name"], limit, config["qdrant_url"],
+                               config["qdrant_api_key"], search_params=search_params, **qdrant_transport(config))
+
+def pack_results(results: List[Dict[str, Any]], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Merge overlapping hits, drop repeated paragraphs and apply CONTEXT_TOKEN_BUDGET
+    
+    Args:
+        results: Formatted search results
+        config: Search configuration
+        
+    Returns:
+        Passages to synthesize the answer from, best first
+    """
+    with span("context_packing", results=len(results)) as current:
+        passages = pack_context(results, config["context_token_budget"])
+        retrieved = sum(estimate_tokens(result.get("text", "")) for result in results)
+        packed = sum(passage["tokens"] for passage in passages)
+        current.set_attribute("passages", len(passages))
+        current.set_attribute("tokens_saved", retrieved - packed)
+    metrics.inc("context_tokens_total", retrieved, stage="retrieved")
+    metrics.inc("context_tokens_total", packed, stage="packed")
+    return passages
+
+def setup_telemetry(config: Dict[str, Any]) -> None:
+    """Enable tracing as configured by TRACING and TRACE_PATH"""
+    configure_tracing(config["tracing"], config["trace_path"])
+
+def write_metrics(path: str) -> None:
+    """Save a metrics snapshot: Prometheus text for .prom or .txt, JSON otherwise"""
+    metrics.write(path)
+    print(f"Metrics written to {path}", file=sys.stderr)
+
+def print_http_stats() -> None:
+    """Print request, retry and connection reuse counts for each endpoint"""
+    print("\nHTTP connection statistics:")
+    for endpoint, stats in get_http_client().stats().items():
+        print(f"  {endpoint}: {stats['requests']} requests, {stats['connections']} connections "
+              f"({stats['reuse_rate']:.0%} reused), {stats['retries']} retries, {stats['errors']} errors")
+
+def run_queries_file(args: argparse.Namespace, config: Dict[str, Any], cache,
+                     search_params: Optional[Dict[str, Any]]) -> int:
+    """Answer every query in --queries-file, writing JSONL results to --output"""
+    from batch_queries import BatchRunner, read_queries
+    
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    
+    # Progress and error messages go to stderr so stdout can carry the results
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        try:
+            runner = BatchRunner(config, output, limit=args.limit, batch_size=args.batch_size,
+                                 workers=args.workers, cache=cache, search_params=search_params,
+                                 synthesize=not args.search_only)
+            written = runner.run(read_queries(args.queries_file))
+        finally:
+            if args.output != "-":
+                output.close()
+        
+        elapsed = time.perf_counter() - start
+        print(f"Processed {written} queries in {elapsed:.1f}s "
+              f"({written / elapsed if elapsed else 0:.1f} queries/s), {runner.failed} failed")
+        if args.http_stats:
+            print_http_stats()
+    
+    return 0 if not runner.failed else 1
 
 def main():
     """Main entry point for the search tool"""
     parser = argparse.ArgumentParser(description="Gemini Qdrant Vector Search Tool")
-    parser.add_argument("--query", required=True, help="The search query")
+    queries = parser.add_mutually_exclusive_group(required=True)
+    queries.add_argument("--query", help="The search query")
+    queries.add_argument("--queries-file",
+                         help='JSONL file of {"query": ..., "id": ...} lines to answer in batch ("-" for stdin)')
     parser.add_argument("--collection", help="Qdrant collection name to search")
     parser.add_argument("--limit", type=int, default=5, help="Maximum number of results (default: 5)")
+    parser.add_argument("--backend", choices=["qdrant", "local"],
+                        help="Vector store to search (overrides VECTOR_BACKEND, default: qdrant)")
+    parser.add_argument("--oversampling", type=float,
+                        help="Candidates fetched per result from quantized vectors before rescoring (e.g. 2.0)")
+    parser.add_argument("--no-rescore", action="store_true",
+                        help="Rank by quantized vectors only, skipping full-precision rescoring")
+    parser.add_argument("--filter", action="append", metavar="EXPR",
+                        help='Only search points matching a payload filter: field=value, field=a,b (any of) or '
+                             'field!=value, e.g. topics=fiber; repeat to combine with AND, or pass a Qdrant filter as JSON')
+    parser.add_argument("--hybrid", action="store_true",
+                        help="Fuse dense and BM25 keyword results with reciprocal rank fusion (overrides HYBRID_SEARCH)")
+    parser.add_argument("--context-budget", type=int,
+                        help="Estimated tokens of search result text sent for synthesis; 0 for no limit "
+                             "(overrides CONTEXT_TOKEN_BUDGET, default: 8000)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print the answer as it is generated and report time to first token")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the query embedding and answer caches")
+    parser.add_argument("--http-stats", action="store_true", help="Print per-endpoint connection reuse statistics")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="Write a metrics snapshot on exit: Prometheus text for .prom/.txt, "
+                             "JSON otherwise (overrides METRICS_PATH)")
+    parser.add_argument("--output", default="-",
+                        help="Batch mode: JSONL file to write results to (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="Batch mode: queries per embedding and search request (default: 100)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Batch mode: concurrent answer synthesis calls (default: 4)")
+    parser.add_argument("--search-only", action="store_true",
+                        help="Batch mode: write search results without synthesizing answers")
     args = parser.parse_args()
     
-    # Load environment variables
-    load_dotenv()
-    
     # Get configuration from environment variables or arguments
-    qdrant_url = os.environ.get("QDRANT_URL", "")
-    qdrant_api_key = os.environ.get("QDRANT_API_KEY", "")
-    gemini_api_key = os.environ.get("GEMINI_API_KEY", "")
-    collection_name = args.collection or os.environ.get("COLLECTION_NAME", "")
+    config = load_config(args.collection, args.backend)
+    if args.hybrid:
+        config["hybrid"] = True
+    if args.context_budget is not None:
+        config["context_token_budget"] = args.context_budget
+    try:
+        config["query_filter"] = parse_filter(args.filter)
+    except ValueError as e:
+        print(str(e))
+        return 1
+    collection_name = config["collection_name"]
     
     # Validate configuration
-    missing_keys = []
-    if not qdrant_url:
-        missing_keys.append("QDRANT_URL")
-    if not qdrant_api_key:
-        missing_keys.append("QDRANT_API_KEY")
-    if not gemini_api_key:
-        missing_keys.append("GEMINI_API_KEY")
-    if not collection_name:
-        missing_keys.append("COLLECTION_NAME (provide with --collection or in .env)")
+    missing_keys = missing_config(config)
     
     if missing_keys:
         print(f"Missing required configuration: {', '.join(missing_keys)}")
         print("Please set these in your .env file or provide as arguments")
         return 1
     
+    setup_telemetry(config)
+    metrics_path = args.metrics or config["metrics_path"]
+    if metrics_path:
+        # Written however the run ends
+        atexit.register(write_metrics, metrics_path)
+    
+    search_params = None
+    if args.oversampling is not None or args.no_rescore:
+        search_params = quantization_search_params(args.oversampling, rescore=not args.no_rescore)
+    
+    cache = None if args.no_cache else open_query_cache(config)
+    
+    if args.queries_file:
+        return run_queries_file(args, config, cache, search_params)
+    
     print(f"Searching for: {args.query}")
     print(f"Collection: {collection_name}")
+    if config["query_filter"]:
+        print(f"Filter: {json.dumps(config['query_filter'])}")
     
-    # Step 1: Get embedding for query using Gemini API
+    # Step 1: Get embedding for query, from the cache or the Gemini API
     print("Getting query embedding...")
-    embedding = get_embedding(args.query, gemini_api_key)
+    embedding, from_cache = embed_query(args.query, config, cache)
     
-    if not embedding:
+    if embedding is None:
         print("Failed to get embedding for query")
         return 1
     
+    if from_cache:
+        print("Using cached query embedding")
     print(f"Got embedding of size {len(embedding)}")
     
-    # Step 2: Search Qdrant
-    print("Searching Qdrant...")
-    hits = search_qdrant(embedding, collection_name, args.limit, qdrant_url, qdrant_api_key)
+    # A previous answer to a similar enough question is returned as is
+    cached_answer = cache.lookup_answer(embedding, answer_scope(config), args.limit) if cache else None
+    if cached_answer:
+        print(f"\nServing cached answer (similarity {cached_answer['similarity']:.3f} "
+              f"to \"{cached_answer['query']}\")")
+        print(f"\nFound {len(cached_answer['hits'])} results:")
+        format_search_results(cached_answer["hits"])
+        
+        print("\n" + "=" * 80)
+        print("SYNTHESIZED ANSWER")
+        print("=" * 80)
+        print(cached_answer["answer"])
+        
+        if args.http_stats:
+            print_http_stats()
+        return 0
+    
+    # Step 2: Search the vector store
+    if config["backend"] == "local":
+        print(f"Searching local index at {config['local_index_path']}...")
+    else:
+        print("Searching Qdrant...")
+    hits = search_vectors(embedding, config, args.limit, search_params, query=args.query)
     
     if not hits:
         print("No results found")
+        if args.http_stats:
+            print_http_stats()
         return 0
     
     print(f"\nFound {len(hits)} results:")
@@ -317,8 +1140,34 @@ def main():
         print("SYNTHESIZED ANSWER")
         print("=" * 80)
         
-        answer = synthesize_answer(args.query, formatted_results, gemini_api_key)
-        print(answer)
+        if args.stream:
+            timings: Dict[str, float] = {}
+            pieces = []
+            try:
+                for piece in stream_answer(args.query, pack_results(formatted_results, config),
+                                           config["gemini_api_key"], timings):
+                    pieces.append(piece)
+                    print(piece, end="", flush=True)
+            except SynthesisError as e:
+                # A failed or truncated answer is reported as such and never cached
+                print(f"\n\nError generating answer: {e}")
+                return 1
+            answer = "".join(pieces)
+            print(f"\n\nTime to first token: {timings['ttft_ms']:.0f} ms, total: {timings['total_ms']:.0f} ms")
+        else:
+            try:
+                answer = synthesize_answer(args.query, pack_results(formatted_results, config),
+                                           config["gemini_api_key"])
+            except SynthesisError as e:
+                print(f"Error generating answer: {e}")
+                return 1
+            print(answer)
+        
+        if cache:
+            cache.put_answer(args.query, embedding, answer_scope(config), args.limit, answer, hits)
+    
+    if args.http_stats:
+        print_http_stats()
     
     return 0
 
@@ -0,0 +1,276 @@
+"""
+Local in-process vector index
+
+Reads the on-disk collection layout written by the embedding tool's local
+backend (VECTOR_BACKEND=local) and answers cosine top-k queries with NumPy,
+without a Qdrant server:
+- vectors.f32: row-major float32 matrix with L2-normalized rows
+- payloads.jsonl: one {"id", "payload"} line per matrix row, with "sparse"
+  BM25 term weights when the collection was built with sparse vectors
+- meta.json: vector size and distance
+
+Sparse weights are turned into an in-memory inverted index the first time a
+lexical search is made.
+
+Searches can be restricted with the match conditions of Qdrant filters
+(must / should / must_not with match value, any or except). The rows
+matching a filter are found by one pass over the payloads and remembered,
+so repeated searches with the same filter only score those rows.
+"""
+
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+FILTER_CLAUSES = ("must", "should", "must_not")
+# Distinct filters whose matching rows are kept per index
+FILTER_CACHE_SIZE = 64
+
+
+def _matches_condition(payload: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+    if any(clause in condition for clause in FILTER_CLAUSES):
+        return matches_filter(payload, condition)
+    match = condition.get("match")
+    if "key" not in condition or not isinstance(match, dict):
+        raise ValueError(f"Unsupported filter condition for the local index: {json.dumps(condition)}")
+
+    # A list field such as topics matches if any of its elements does
+    value = payload.get(condition["key"])
+    values = value if isinstance(value, list) else [value]
+    if "value" in match:
+        return match["value"] in values
+    if "any" in match:
+        return any(v in match["any"] for v in values)
+    if "except" in match:
+        return not any(v in match["except"] for v in values)
+    raise ValueError(f"Unsupported match for the local index: {json.dumps(match)}")
+
+
+def matches_filter(payload: Dict[str, Any], query_filter: Dict[str, Any]) -> bool:
+    """Evaluate a Qdrant filter's must / should / must_not conditions against a payload
+
+    Raises:
+        ValueError: If the filter uses conditions other than match value/any/except
+    """
+    if not all(_matches_condition(payload, c) for c in query_filter.get("must", [])):
+        return False
+    if any(_matches_condition(payload, c) for c in query_filter.get("must_not", [])):
+        return False
+    should = query_filter.get("should", [])
+    return not should or any(_matches_condition(payload, c) for c in should)
+
+
+class LocalIndex:
+    """Memory-mapped cosine index over one local collection"""
+
+    def __init__(self, index_path: str, collection_name: str):
+        """Open a collection directory
+
+        Args:
+            index_path: Directory containing one sub-directory per collection
+            collection_name: Name of the collection to open
+
+        Raises:
+            FileNotFoundError: If the collection has not been built
+        """
+        self.path = Path(index_path) / collection_name
+        with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.vector_size = meta["size"]
+
+        with open(self.path / "payloads.jsonl", "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.ids = [record["id"] for record in records]
+        self.payloads = [record["payload"] for record in records]
+        self._sparse = [record.get("sparse") for record in records]
+        self.sparse_count = sum(1 for sparse in self._sparse if sparse)
+        self._postings = None
+        self._postings_lock = threading.Lock()
+        self._filter_rows: Dict[str, np.ndarray] = {}
+        self._filter_lock = threading.Lock()
+
+        count = len(records)
+        if count:
+            self.vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r",
+                                     shape=(count, self.vector_size))
+        else:
+            self.vectors = np.empty((0, self.vector_size), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def filter_rows(self, query_filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Return the rows whose payload matches a Qdrant filter, or None without a filter
+
+        Raises:
+            ValueError: If the filter uses conditions the local index cannot evaluate
+        """
+        if not query_filter:
+            return None
+
+        key = json.dumps(query_filter, sort_keys=True)
+        with self._filter_lock:
+            rows = self._filter_rows.get(key)
+            if rows is None:
+                rows = np.asarray([row for row, payload in enumerate(self.payloads)
+                                   if matches_filter(payload, query_filter)], dtype=np.int64)
+                if len(self._filter_rows) >= FILTER_CACHE_SIZE:
+                    del self._filter_rows[next(iter(self._filter_rows))]
+                self._filter_rows[key] = rows
+        return rows
+
+    def search(self, embedding: List[float], limit: int,
+               query_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return the ``limit`` most similar points by cosine similarity
+
+        Args:
+            embedding: Query vector
+            limit: Maximum number of results
+            query_filter: Qdrant filter the hits must match
+
+        Returns:
+            List of hits shaped like Qdrant search results ("id", "score", "payload")
+        """
+        rows = self.filter_rows(query_filter)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        if not len(vectors) or limit <= 0:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        # Rows are pre-normalized, so the dot product is the cosine similarity
+        scores = vectors @ query
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {"id": self.ids[row], "score": float(score), "payload": self.payloads[row]}
+            for row, score in zip(top if rows is None else rows[top], scores[top])
+        ]
+
+    @property
+    def has_sparse(self) -> bool:
+        """Whether the collection was built with sparse vectors"""
+        return self.sparse_count > 0
+
+    def _build_postings(self) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """Turn the per-row sparse vectors into term -> (rows, weights) postings"""
+        with self._postings_lock:
+            if self._postings is None:
+                postings: Dict[int, Tuple[List[int], List[float]]] = {}
+                for row, sparse in enumerate(self._sparse):
+                    if not sparse:
+                        continue
+                    for index, value in zip(sparse["indices"], sparse["values"]):
+                        rows, values = postings.setdefault(index, ([], []))
+                        rows.append(row)
+                        values.append(value)
+
+                self._postings = {
+                    index: (np.asarray(rows, dtype=np.int64), np.asarray(values, dtype=np.float32))
+                    for index, (rows, values) in postings.items()
+                }
+                self._sparse = []
+        return self._postings
+
+    def search_sparse(self, query_vector: Dict[str, List], limit: int,
+                      query_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return the ``limit`` best BM25 matches for a sparse query vector
+
+        Args:
+            query_vector: Sparse query from sparse_encoder.encode_query
+            limit: Maximum number of results
+            query_filter: Qdrant filter the hits must match
+
+        Returns:
+            List of hits shaped like Qdrant search results; only points sharing
+            at least one term with the query are returned
+        """
+        if not len(self) or limit <= 0 or not query_vector["indices"]:
+            return []
+
+        postings = self._build_postings()
+        scores = np.zeros(len(self), dtype=np.float32)
+        for index, weight in zip(query_vector["indices"], query_vector["values"]):
+            if index not in postings:
+                continue
+            rows, values = postings[index]
+            # Same IDF as Qdrant's "idf" sparse vector modifier
+            idf = math.log(1 + (self.sparse_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * weight * values
+
+        allowed = self.filter_rows(query_filter)
+        if allowed is not None:
+            filtered = np.zeros_like(scores)
+            filtered[allowed] = scores[allowed]
+            scores = filtered
+
+        matches = np.flatnonzero(scores)
+        if not len(matches):
+            return []
+        limit = min(limit, len(matches))
+        top = matches[np.argpartition(-scores[matches], limit - 1)[:limit]]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {"id": self.ids[row], "score": float(scores[row]), "payload": self.payloads[row]}
+            for row in top
+        ]
+
+    def search_batch(self, embeddings: List[List[float]], limit: int,
+                     query_filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Search with several query vectors using one matrix product
+
+        Args:
+            embeddings: Query vectors
+            limit: Maximum number of results per query
+            query_filter: Qdrant filter the hits must match
+
+        Returns:
+            One list of hits per query vector, in order
+        """
+        rows = self.filter_rows(query_filter)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        if not len(vectors) or limit <= 0 or not embeddings:
+            return [[] for _ in embeddings]
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        scores = queries @ vectors.T
+        limit = min(limit, scores.shape[1])
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+
+        batches = []
+        for query_scores, best in zip(scores, top):
+            best = best[np.argsort(-query_scores[best])]
+            batches.append([
+                {"id": self.ids[row], "score": float(score), "payload": self.payloads[row]}
+                for row, score in zip(best if rows is None else rows[best], query_scores[best])
+            ])
+        return batches
+
+
+# Opened indexes, reused for repeated searches within one process
+_indexes: Dict[Tuple[str, str, float], LocalIndex] = {}
+
+def open_local_index(index_path: str, collection_name: str) -> LocalIndex:
+    """Return a cached LocalIndex, reopening it if the collection changed on disk"""
+    payloads = Path(index_path) / collection_name / "payloads.jsonl"
+    key = (os.path.abspath(index_path), collection_name, payloads.stat().st_mtime)
+    index = _indexes.get(key)
+    if index is None:
+        for stale in [k for k in _indexes if k[:2] == key[:2]]:
+            del _indexes[stale]
+        index = _indexes[key] = LocalIndex(index_path, collection_name)
+    return index
@@ -0,0 +1,115 @@
+"""
+PCA projection of embeddings to fewer dimensions
+
+A projection is fitted once on a sample of full-width embeddings and saved
+as a .npz file holding the top principal axes and the share of the
+vectors' energy each one keeps. The axes are those of the uncentered
+vectors, so the projection preserves dot products, and with them cosine
+rankings, as well as a linear map to that size can; centering first would
+shift every similarity by the vectors' mean and reorder results.
+
+The embedder projects every vector before upserting it and the search tool
+projects every query, so a collection built with a projection must always
+be searched with the same file; its fingerprint identifies it in caches.
+Vectors are L2-normalized before they are fitted or projected, so vectors
+read back from a cosine collection and fresh API embeddings are treated
+alike.
+
+This module is identical in gemini_embedding_tool and
+gemini_qdrant_vector_search_tool.
+"""
+
+import hashlib
+from typing import Optional
+
+import numpy as np
+
+# File name of the projection saved inside a local collection's directory
+PROJECTION_FILENAME = "projection.npz"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class Projection:
+    """Linear map from ``input_size`` to ``output_size`` dimensions"""
+
+    def __init__(self, components: np.ndarray, explained_variance_ratio: Optional[np.ndarray] = None,
+                 model: str = ""):
+        """
+        Args:
+            components: Orthonormal principal axes as rows, shape (output_size, input_size)
+            explained_variance_ratio: Share of the vectors' squared length along each axis
+            model: Embedding model the projection was fitted for
+        """
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.explained_variance_ratio = (np.asarray(explained_variance_ratio, dtype=np.float32)
+                                         if explained_variance_ratio is not None
+                                         else np.zeros(len(self.components), dtype=np.float32))
+        self.model = model
+
+    @property
+    def input_size(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def output_size(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def fingerprint(self) -> str:
+        """Short hash of the projection matrix, for cache keys and logs"""
+        return hashlib.sha256(self.components.tobytes()).hexdigest()[:16]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, output_size: int, model: str = "") -> "Projection":
+        """Fit a PCA projection
+
+        Args:
+            vectors: Sample of full-width embeddings, shape (n, input_size)
+            output_size: Dimensions to keep
+            model: Embedding model the vectors came from
+
+        Raises:
+            ValueError: If output_size is not below the input size or the
+                sample has fewer vectors than output_size
+        """
+        vectors = _normalize(vectors)
+        count, input_size = vectors.shape
+        if not 0 < output_size < input_size:
+            raise ValueError(f"Projection size must be between 1 and {input_size - 1}, got {output_size}")
+        if count < output_size:
+            raise ValueError(f"Fitting {output_size} components needs at least {output_size} vectors, got {count}")
+
+        # Eigenvectors of the second moment matrix, largest eigenvalue first
+        samples = vectors.astype(np.float64)
+        moment = samples.T @ samples / count
+        eigenvalues, eigenvectors = np.linalg.eigh(moment)
+        order = np.argsort(eigenvalues)[::-1][:output_size]
+        total = eigenvalues.clip(min=0).sum() or 1.0
+        return cls(eigenvectors[:, order].T, eigenvalues[order].clip(min=0) / total, model)
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        """Project one vector or a matrix of row vectors to ``output_size`` dimensions"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[-1] != self.input_size:
+            raise ValueError(f"Projection expects vectors of size {self.input_size}, got {vectors.shape[-1]}")
+        return _normalize(vectors) @ self.components.T
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            np.savez(f, components=self.components,
+                     explained_variance_ratio=self.explained_variance_ratio, model=np.array(self.model))
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        """Read a projection written by save()
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        with np.load(path) as data:
+            return cls(data["components"], data["explained_variance_ratio"], str(data["model"]))
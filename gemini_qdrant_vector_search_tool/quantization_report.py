@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Quantization Recall/Latency Report
+
+Compares search quality and latency of a quantized Qdrant collection against
+full-precision search. Query vectors are sampled from the collection itself,
+so no Gemini calls are needed; each query's own point is left out of its
+results, since it would otherwise always rank first. Ground truth is an
+exact (brute-force, unquantized) search; each configuration reports mean
+recall@k and latency percentiles.
+
+Usage:
+    python quantization_report.py --collection nutrition_int8 --baseline-collection nutrition_knowledge
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from gemini_vector_search import get_http_client, quantization_search_params, search_qdrant
+from http_client import decode_json
+
+def sample_query_vectors(collection_name: str, count: int, qdrant_url: str,
+                         qdrant_api_key: str) -> List[Tuple[Any, List[float]]]:
+    """Scroll the first ``count`` stored vectors of a collection to use as queries
+
+    Returns:
+        List of (point ID, dense vector) pairs
+    """
+    response = get_http_client().post(
+        f"{qdrant_url}/collections/{collection_name}/points/scroll",
+        idempotent=True,
+        headers={"Content-Type": "application/json", "api-key": qdrant_api_key},
+        json={"limit": count, "with_payload": False, "with_vector": True}
+    )
+    if response.status_code != 200:
+        print(f"Error sampling vectors from {collection_name}: {response.text}")
+        return []
+
+    queries = []
+    for point in decode_json(response.content)["result"]["points"]:
+        vector = point.get("vector")
+        # Collections with sparse vectors return every vector by name
+        if isinstance(vector, dict):
+            vector = vector.get("")
+        if vector:
+            queries.append((point["id"], vector))
+    return queries
+
+def search_others(query: Tuple[Any, List[float]], collection_name: str, limit: int, qdrant_url: str,
+                  qdrant_api_key: str, search_params: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Top ``limit`` hits for a sampled vector, leaving out the point it was sampled from"""
+    point_id, vector = query
+    hits = search_qdrant(vector, collection_name, limit + 1, qdrant_url, qdrant_api_key,
+                         search_params=search_params)
+    return [hit for hit in hits if hit["id"] != point_id][:limit]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def measure(queries: List[Tuple[Any, List[float]]], truth: List[List[Any]], collection_name: str, limit: int,
+            qdrant_url: str, qdrant_api_key: str,
+            search_params: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """Run every query against one configuration and summarize recall and latency"""
+    latencies = []
+    recalls = []
+
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = search_others(query, collection_name, limit, qdrant_url, qdrant_api_key, search_params)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        found = {hit["id"] for hit in hits}
+        recalls.append(len(found.intersection(expected)) / max(1, len(expected)))
+
+    return {
+        "recall": statistics.mean(recalls),
+        "latency_p50_ms": percentile(latencies, 50),
+        "latency_p95_ms": percentile(latencies, 95),
+        "latency_mean_ms": statistics.mean(latencies),
+    }
+
+def main():
+    """Build the comparison table"""
+    parser = argparse.ArgumentParser(description="Compare quantized and full-precision Qdrant search")
+    parser.add_argument("--collection", required=True, help="Quantized collection to evaluate")
+    parser.add_argument("--baseline-collection",
+                        help="Unquantized collection with the same points (optional)")
+    parser.add_argument("--queries", type=int, default=100, help="Number of query vectors to sample (default: 100)")
+    parser.add_argument("--limit", type=int, default=10, help="k for recall@k (default: 10)")
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0, 4.0],
+                        help="Oversampling factors to test with rescoring (default: 1 2 4)")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    load_dotenv()
+    qdrant_url = os.environ.get("QDRANT_URL", "")
+    qdrant_api_key = os.environ.get("QDRANT_API_KEY", "")
+    if not qdrant_url or not qdrant_api_key:
+        print("Missing required configuration: QDRANT_URL, QDRANT_API_KEY")
+        return 1
+
+    reference = args.baseline_collection or args.collection
+    queries = sample_query_vectors(reference, args.queries, qdrant_url, qdrant_api_key)
+    if not queries:
+        print("No vectors available to use as queries")
+        return 1
+
+    print(f"Computing exact top-{args.limit} for {len(queries)} queries on {reference}...")
+    exact = quantization_search_params(exact=True)
+    truth = [
+        [hit["id"] for hit in search_others(query, reference, args.limit, qdrant_url, qdrant_api_key, exact)]
+        for query in queries
+    ]
+
+    configurations = []
+    if args.baseline_collection:
+        configurations.append(("float32 (baseline)", args.baseline_collection, None))
+    configurations.append(("quantized, no rescore", args.collection,
+                           quantization_search_params(1.0, rescore=False)))
+    for factor in args.oversampling:
+        configurations.append((f"quantized, rescore, oversampling {factor:g}", args.collection,
+                               quantization_search_params(factor, rescore=True)))
+
+    report = {"limit": args.limit, "queries": len(queries), "results": []}
+    print(f"\n{'Configuration':<44} {'Recall@' + str(args.limit):>10} {'p50 ms':>9} {'p95 ms':>9}")
+    print("-" * 75)
+    for name, collection_name, params in configurations:
+        result = measure(queries, truth, collection_name, args.limit, qdrant_url, qdrant_api_key, params)
+        result.update({"configuration": name, "collection": collection_name, "params": params})
+        report["results"].append(result)
+        print(f"{name:<44} {result['recall']:>10.3f} {result['latency_p50_ms']:>9.2f} "
+              f"{result['latency_p95_ms']:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
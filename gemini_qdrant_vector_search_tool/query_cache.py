@@ -0,0 +1,228 @@
+"""
+Query embedding cache and semantic answer cache
+
+Two persistent levels stored in one SQLite file:
+- query embeddings, keyed by an exact hash of the embedding signature and
+  query text, so a repeated question costs no embedding call
+- synthesized answers with their source hits, looked up by cosine similarity
+  of the query embedding among answers of the same signature, so repeated
+  and near-repeated questions are answered without searching or calling the
+  LLM
+
+Answers expire after a TTL and the least recently used ones are evicted once
+the cache grows past its size cap.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from telemetry import metrics
+
+
+class QueryCache:
+    """Persistent exact-match embedding cache plus similarity-keyed answer cache"""
+
+    def __init__(self, path: str, signature: str, similarity_threshold: float = 0.95,
+                 ttl_seconds: float = 86400, max_answers: int = 1000,
+                 max_embeddings: int = 10000):
+        """Open (or create) the cache database
+
+        Args:
+            path: Location of the SQLite file
+            signature: Embedding signature (model, output size and projection), part of
+                every embedding key and the scope of every answer
+            similarity_threshold: Minimum cosine similarity for an answer cache hit
+            ttl_seconds: Age after which cached answers are discarded
+            max_answers: Number of answers kept before LRU eviction
+            max_embeddings: Number of query embeddings kept before LRU eviction
+        """
+        self.signature = signature
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_answers = max_answers
+        self.max_embeddings = max_embeddings
+
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.answer_hits = 0
+        self.answer_misses = 0
+
+        self._lock = threading.Lock()
+        # In-memory copy of this signature's answer vectors per (collection, limit), rebuilt after writes
+        self._matrices: Dict[Tuple[str, int], Tuple[List[int], np.ndarray]] = {}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " signature TEXT NOT NULL,"
+            " collection TEXT NOT NULL,"
+            " result_limit INTEGER NOT NULL,"
+            " query TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " hits TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_answers_scope ON answers(signature, collection, result_limit)"
+        )
+        self._conn.commit()
+
+    def _embedding_key(self, query: str) -> str:
+        digest = hashlib.sha256(f"{self.signature}\0".encode("utf-8"))
+        digest.update(" ".join(query.split()).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for an exact query, or None"""
+        key = self._embedding_key(query)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.embedding_misses += 1
+                metrics.inc("cache_requests_total", cache="query_embedding", result="miss")
+                return None
+            self._conn.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.embedding_hits += 1
+        metrics.inc("cache_requests_total", cache="query_embedding", result="hit")
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def put_embedding(self, query: str, embedding: List[float]) -> None:
+        """Store the embedding of a query"""
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                (self._embedding_key(query), blob, time.time())
+            )
+            self._evict("query_embeddings", self.max_embeddings)
+            self._conn.commit()
+
+    def _answer_matrix(self, collection: str, limit: int) -> Tuple[List[int], np.ndarray]:
+        scope = (collection, limit)
+        if scope not in self._matrices:
+            rows = self._conn.execute(
+                "SELECT id, vector FROM answers WHERE signature = ? AND collection = ? AND result_limit = ?",
+                (self.signature, collection, limit)
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            if rows:
+                matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            self._matrices[scope] = (ids, matrix)
+        return self._matrices[scope]
+
+    def lookup_answer(self, embedding: List[float], collection: str,
+                      limit: int) -> Optional[Dict[str, Any]]:
+        """Find a cached answer for a similar enough query
+
+        Only answers stored under the same embedding signature are compared,
+        so vectors of another model, output size or projection never match.
+
+        Args:
+            embedding: Embedding of the new query
+            collection: Collection the answer must have been built from
+            limit: Result limit the answer must have been built with
+
+        Returns:
+            Dict with "query", "answer", "hits" and "similarity", or None on a miss
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock:
+            self._expire()
+            ids, matrix = self._answer_matrix(collection, limit)
+            if not ids or matrix.shape[1] != query.shape[0]:
+                self.answer_misses += 1
+                metrics.inc("cache_requests_total", cache="answer", result="miss")
+                return None
+
+            # Stored vectors are normalized, so the dot product is the cosine similarity
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.similarity_threshold:
+                self.answer_misses += 1
+                metrics.inc("cache_requests_total", cache="answer", result="miss")
+                return None
+
+            row = self._conn.execute(
+                "SELECT query, answer, hits FROM answers WHERE id = ?", (ids[best],)
+            ).fetchone()
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), ids[best]))
+            self._conn.commit()
+            self.answer_hits += 1
+        metrics.inc("cache_requests_total", cache="answer", result="hit")
+
+        return {"query": row[0], "answer": row[1], "hits": json.loads(row[2]), "similarity": similarity}
+
+    def put_answer(self, query: str, embedding: List[float], collection: str, limit: int,
+                   answer: str, hits: List[Dict[str, Any]]) -> None:
+        """Store a synthesized answer together with the hits it was built from"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (signature, collection, result_limit, query, vector, answer, hits, created,"
+                " last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.signature, collection, limit, query, vector.tobytes(), answer, json.dumps(hits), now, now)
+            )
+            self._evict("answers", self.max_answers)
+            self._conn.commit()
+            self._matrices.clear()
+
+    def _expire(self) -> None:
+        cursor = self._conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl_seconds,))
+        if cursor.rowcount:
+            self._conn.commit()
+            self._matrices.clear()
+
+    def _evict(self, table: str, max_entries: int) -> None:
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        excess = count - max_entries
+        if excess > 0:
+            key = "id" if table == "answers" else "key"
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE {key} IN ("
+                f" SELECT {key} FROM {table} ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit and miss counters for both cache levels"""
+        return {
+            "embedding_hits": self.embedding_hits,
+            "embedding_misses": self.embedding_misses,
+            "answer_hits": self.answer_hits,
+            "answer_misses": self.answer_misses,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
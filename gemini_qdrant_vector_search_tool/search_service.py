@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Gemini Qdrant Search Service
+
+Runs the search tool as a long-lived HTTP service, so configuration, the
+pooled HTTP connections to Gemini and Qdrant, the query/answer cache and any
+local index stay warm across requests. Each request is handled on its own
+thread using the same functions as the command-line tool.
+
+Endpoints (JSON in, JSON out):
+    GET  /health
+    GET  /metrics                 Prometheus text format (?format=json for a JSON snapshot)
+    POST /search   {"query": "...", "limit": 5}
+    POST /search   {"query": "...", "filter": "topics=fiber"}
+                   -> "filter" takes the search tool's --filter expressions (a
+                      string or a list, combined with AND) or a Qdrant filter object
+    POST /answer   {"query": "...", "limit": 5}
+    POST /answer   {"query": "...", "limit": 5, "stream": true}
+                   -> chunked NDJSON events: "results", "text" (repeated), "done"
+
+Usage:
+    python search_service.py --port 8765 --collection "your_collection_name"
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from gemini_vector_search import (
+    answer_scope,
+    embed_query,
+    format_search_results,
+    get_http_client,
+    load_config,
+    missing_config,
+    open_query_cache,
+    pack_results,
+    parse_filter,
+    search_vectors,
+    setup_telemetry,
+    stream_answer,
+    synthesize_answer,
+)
+from telemetry import metrics, queued_handler, span
+
+# Request log, written by a background thread (see serve)
+logger = logging.getLogger("search_service")
+
+ROUTES = ("/health", "/metrics", "/search", "/answer")
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 64 * 1024
+
+
+class SearchService:
+    """Holds the warm state shared by every request"""
+
+    def __init__(self, config: Dict[str, Any], use_cache: bool = True, max_limit: int = 50):
+        self.config = config
+        self.cache = open_query_cache(config) if use_cache else None
+        self.max_limit = max_limit
+        self.started = time.time()
+        self.requests_served = 0
+        self._lock = threading.Lock()
+
+        # Open the pooled connections up front
+        get_http_client()
+
+    def _count(self) -> None:
+        with self._lock:
+            self.requests_served += 1
+
+    def _prepare(self, body: Dict[str, Any]) -> Tuple[str, int, Dict[str, Any]]:
+        """Validate a request, returning its query, limit and configuration"""
+        query = str(body.get("query", "")).strip()
+        if not query:
+            raise ValueError("'query' is required")
+        limit = int(body.get("limit", 5))
+        if not 1 <= limit <= self.max_limit:
+            raise ValueError(f"'limit' must be between 1 and {self.max_limit}")
+        if not body.get("filter"):
+            return query, limit, self.config
+        # Requests with a filter get their own copy of the shared configuration
+        return query, limit, dict(self.config, query_filter=parse_filter(body["filter"]))
+
+    def search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Embed the query and return the formatted hits"""
+        self._count()
+        query, limit, config = self._prepare(body)
+        timings = {}
+
+        start = time.perf_counter()
+        embedding, from_cache = embed_query(query, config, self.cache)
+        timings["embedding_ms"] = (time.perf_counter() - start) * 1000
+        if embedding is None:
+            raise RuntimeError("Failed to get embedding for query")
+
+        start = time.perf_counter()
+        hits = search_vectors(embedding, config, limit, query=query)
+        timings["search_ms"] = (time.perf_counter() - start) * 1000
+
+        return {
+            "query": query,
+            "results": format_search_results(hits, verbose=False),
+            "embedding_cached": from_cache,
+            "timings": timings,
+        }
+
+    def answer(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Return a synthesized answer, from the answer cache when possible"""
+        self._count()
+        query, limit, config = self._prepare(body)
+        timings = {}
+
+        start = time.perf_counter()
+        embedding, from_cache = embed_query(query, config, self.cache)
+        timings["embedding_ms"] = (time.perf_counter() - start) * 1000
+        if embedding is None:
+            raise RuntimeError("Failed to get embedding for query")
+
+        scope = answer_scope(config)
+        cached = self.cache.lookup_answer(embedding, scope, limit) if self.cache else None
+        if cached:
+            return {
+                "query": query,
+                "answer": cached["answer"],
+                "results": format_search_results(cached["hits"], verbose=False),
+                "answer_cached": True,
+                "embedding_cached": from_cache,
+                "similarity": cached["similarity"],
+                "timings": timings,
+            }
+
+        start = time.perf_counter()
+        hits = search_vectors(embedding, config, limit, query=query)
+        timings["search_ms"] = (time.perf_counter() - start) * 1000
+        results = format_search_results(hits, verbose=False)
+
+        start = time.perf_counter()
+        # A SynthesisError propagates and is answered with HTTP 502
+        answer = synthesize_answer(query, pack_results(results, config), self.config["gemini_api_key"])
+        timings["synthesis_ms"] = (time.perf_counter() - start) * 1000
+
+        if self.cache and results:
+            self.cache.put_answer(query, embedding, scope, limit, answer, hits)
+
+        return {
+            "query": query,
+            "answer": answer,
+            "results": results,
+            "answer_cached": False,
+            "embedding_cached": from_cache,
+            "timings": timings,
+        }
+
+    def answer_stream(self, body: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Yield answer events as the answer is generated
+
+        Events are {"type": "results", ...} once, then {"type": "text", "text": ...}
+        for every generated piece, then {"type": "done", "timings": ...}. If the
+        answer fails, stream_answer's SynthesisError ends the events (the
+        handler sends an "error" event) and nothing is cached.
+        """
+        self._count()
+        query, limit, config = self._prepare(body)
+        request_start = time.perf_counter()
+        timings = {}
+
+        start = time.perf_counter()
+        embedding, from_cache = embed_query(query, config, self.cache)
+        timings["embedding_ms"] = (time.perf_counter() - start) * 1000
+        if embedding is None:
+            raise RuntimeError("Failed to get embedding for query")
+
+        scope = answer_scope(config)
+        cached = self.cache.lookup_answer(embedding, scope, limit) if self.cache else None
+        if cached:
+            yield {"type": "results", "results": format_search_results(cached["hits"], verbose=False),
+                   "answer_cached": True, "embedding_cached": from_cache, "similarity": cached["similarity"]}
+            yield {"type": "text", "text": cached["answer"]}
+            timings["ttft_ms"] = timings["total_ms"] = (time.perf_counter() - request_start) * 1000
+            yield {"type": "done", "timings": timings}
+            return
+
+        start = time.perf_counter()
+        hits = search_vectors(embedding, config, limit, query=query)
+        timings["search_ms"] = (time.perf_counter() - start) * 1000
+        results = format_search_results(hits, verbose=False)
+        yield {"type": "results", "results": results, "answer_cached": False, "embedding_cached": from_cache}
+
+        synthesis: Dict[str, float] = {}
+        pieces = []
+        for piece in stream_answer(query, pack_results(results, config), self.config["gemini_api_key"],
+                                   synthesis):
+            if not pieces:
+                # Time to first token as seen by the caller, not just the LLM
+                timings["ttft_ms"] = (time.perf_counter() - request_start) * 1000
+            pieces.append(piece)
+            yield {"type": "text", "text": piece}
+
+        answer = "".join(pieces)
+        if self.cache and results:
+            self.cache.put_answer(query, embedding, scope, limit, answer, hits)
+
+        timings["synthesis_ttft_ms"] = synthesis.get("ttft_ms", 0.0)
+        timings["synthesis_ms"] = synthesis.get("total_ms", 0.0)
+        timings["total_ms"] = (time.perf_counter() - request_start) * 1000
+        yield {"type": "done", "timings": timings}
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "collection": self.config["collection_name"],
+            "backend": self.config["backend"],
+            "hybrid": self.config["hybrid"],
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests_served": self.requests_served,
+            "cache": self.cache.stats() if self.cache else None,
+            "http": get_http_client().stats(),
+        }
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the SearchService attached to the server"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY every
+    # response waits for the client's delayed ACK (about 40 ms)
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, events: Iterator[Dict[str, Any]]) -> None:
+        """Send events as newline-delimited JSON using chunked transfer encoding"""
+        try:
+            first = next(events)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.exception(f"Error handling {self.path}")
+            self._send_json(502, {"error": str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(event: Dict[str, Any]) -> None:
+            data = (json.dumps(event) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            write(first)
+            for event in events:
+                write(event)
+        except Exception as e:
+            logger.exception(f"Error streaming {self.path}")
+            write({"type": "error", "error": str(e)})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_metrics(self) -> None:
+        query = parse_qs(urlsplit(self.path).query)
+        if query.get("format") == ["json"]:
+            self._send_json(200, metrics.snapshot())
+            return
+        data = metrics.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Optional[Dict[str, Any]]:
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_json(400, {"error": "Invalid Content-Length"})
+            return None
+        if length > MAX_BODY_SIZE:
+            self._send_json(413, {"error": "Request body too large"})
+            return None
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "Invalid JSON"})
+            return None
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "Expected a JSON object"})
+            return None
+        return body
+
+    def do_GET(self):
+        self.request_started = time.perf_counter()
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send_json(200, self.server.service.health())
+        elif path == "/metrics":
+            self._send_metrics()
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        self.request_started = time.perf_counter()
+        path = urlsplit(self.path).path
+        routes = {"/search": self.server.service.search, "/answer": self.server.service.answer}
+        handler = routes.get(path)
+        if handler is None:
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        body = self._read_json()
+        if body is None:
+            return
+
+        # Root span, so a request's embedding, search and synthesis share one trace
+        if path == "/answer" and body.get("stream"):
+            with span("request", path=path, stream=True):
+                self._send_stream(self.server.service.answer_stream(body))
+            return
+
+        try:
+            with span("request", path=path):
+                result = handler(body)
+            self._send_json(200, result)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            logger.exception(f"Error handling {self.path}")
+            self._send_json(502, {"error": str(e)})
+
+    def log_request(self, code="-", size="-"):
+        # Called when the status line is sent, i.e. after the whole JSON response
+        # was built, or when a stream starts
+        path = urlsplit(self.path).path
+        route = path if path in ROUTES else "other"
+        metrics.inc("service_requests_total", path=route, status=str(code))
+        started = getattr(self, "request_started", None)
+        if started is not None:
+            metrics.observe("service_request_seconds", time.perf_counter() - started, path=route)
+        super().log_request(code, size)
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+
+def serve(host: str, port: int, service: SearchService) -> None:
+    """Serve requests until interrupted"""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(queued_handler(handler))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"Search service listening on http://{host}:{port} "
+          f"(collection: {service.config['collection_name']}, backend: {service.config['backend']})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        server.server_close()
+
+
+def main():
+    """Parse arguments and start the service"""
+    parser = argparse.ArgumentParser(description="Gemini Qdrant Search Service")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--collection", help="Qdrant collection name to search")
+    parser.add_argument("--backend", choices=["qdrant", "local"],
+                        help="Vector store to search (overrides VECTOR_BACKEND, default: qdrant)")
+    parser.add_argument("--hybrid", action="store_true",
+                        help="Fuse dense and BM25 keyword results (overrides HYBRID_SEARCH)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the query embedding and answer caches")
+    args = parser.parse_args()
+
+    config = load_config(args.collection, args.backend)
+    if args.hybrid:
+        config["hybrid"] = True
+    missing_keys = missing_config(config)
+    if missing_keys:
+        print(f"Missing required configuration: {', '.join(missing_keys)}")
+        print("Please set these in your .env file or provide as arguments")
+        return 1
+
+    setup_telemetry(config)
+    serve(args.host, args.port, SearchService(config, use_cache=not args.no_cache))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
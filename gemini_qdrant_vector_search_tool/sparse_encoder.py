@@ -0,0 +1,77 @@
+"""
+BM25 sparse vectors for lexical retrieval
+
+Documents and queries are tokenized the same way and each term is hashed to
+a fixed index, so no vocabulary has to be stored or shared. Document vectors
+hold the BM25 term-frequency component, saturated by ``k1`` and normalized
+by document length. Query vectors hold 1.0 per distinct term. The IDF part
+of BM25 is applied at search time (by Qdrant's "idf" modifier or by the
+local index), so the vectors of already indexed documents never need to
+change as the corpus grows.
+
+gemini_embedding_tool and gemini_qdrant_vector_search_tool ship identical
+copies of this module; keep them in sync.
+"""
+
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+
+# Name of the sparse vector in Qdrant collections
+SPARSE_VECTOR_NAME = "text"
+
+# BM25 parameters. AVERAGE_LENGTH approximates the mean chunk length in
+# tokens, so scores don't depend on corpus statistics at indexing time.
+K1 = 1.2
+B = 0.75
+AVERAGE_LENGTH = 256
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been
+before being below between both but by can could did do does doing down during
+each few for from further had has have having he her here hers herself him
+himself his how i if in into is it its itself just me more most my myself no
+nor not now of off on once only or other our ours ourselves out over own same
+she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours yourself
+yourselves
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def term_index(token: str) -> int:
+    """Stable 32-bit index of a token"""
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _sparse(weights: Dict[int, float]) -> Dict[str, List]:
+    indices = sorted(weights)
+    return {"indices": indices, "values": [weights[index] for index in indices]}
+
+
+def encode_document(text: str) -> Dict[str, List]:
+    """Sparse BM25 document vector ({"indices": [...], "values": [...]})"""
+    tokens = tokenize(text)
+    if not tokens:
+        return {"indices": [], "values": []}
+
+    norm = K1 * (1 - B + B * len(tokens) / AVERAGE_LENGTH)
+    weights: Dict[int, float] = {}
+    for token, count in Counter(tokens).items():
+        index = term_index(token)
+        # Hash collisions merge into one term
+        weights[index] = weights.get(index, 0.0) + count * (K1 + 1) / (count + norm)
+    return _sparse(weights)
+
+
+def encode_query(text: str) -> Dict[str, List]:
+    """Sparse query vector with weight 1.0 for each distinct term"""
+    return _sparse({term_index(token): 1.0 for token in tokenize(text)})
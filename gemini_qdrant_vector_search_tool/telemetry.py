@@ -0,0 +1,348 @@
+"""
+Metrics, tracing spans and non-blocking logging
+
+A process-wide registry of counters, gauges and latency histograms that
+every stage of the tool reports to, exported as Prometheus text or as a JSON
+snapshot. ``span()`` times a block of code into the ``stage_seconds``
+histogram and, when tracing is enabled, also records it as a trace span:
+
+- TRACING=file writes OpenTelemetry-shaped spans as JSON lines to TRACE_PATH
+- TRACING=otel hands spans to the OpenTelemetry API's global tracer, if the
+  opentelemetry-api package is installed and an SDK is configured
+
+Log records and file spans are handed to a queue and written by a
+background thread, so a slow disk or terminal never stalls the pipeline.
+
+This module is kept identical in gemini_embedding_tool and
+gemini_qdrant_vector_search_tool so that each tool stays standalone.
+"""
+
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+TRACING_MODES = ("off", "file", "otel")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def queued_handler(*handlers: logging.Handler) -> QueueHandler:
+    """Wrap handlers so records are formatted and written on a background thread
+
+    The returned handler only merges the message arguments on the calling
+    thread; the wrapped handlers keep their own formatters. The listener is
+    stopped, flushing the queue, when the interpreter exits.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+
+class Histogram:
+    """Bucketed distribution of observed values with sum, count and max"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating within its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - cumulative) / count)
+            cumulative += count
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _prometheus_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _prometheus_number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms keyed by name and labels"""
+
+    def __init__(self, prefix: str = ""):
+        """
+        Args:
+            prefix: Prepended to every metric name in the Prometheus export
+        """
+        self.prefix = prefix
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add ``value`` to a counter"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        """Set a gauge"""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record a value, in seconds for latencies, in a histogram"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Current value of a counter (0 if it was never incremented)"""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def histogram(self, name: str, **labels: Any) -> Optional[Dict[str, float]]:
+        """Summary of a histogram, or None if nothing was observed"""
+        with self._lock:
+            histogram = self._histograms.get(name, {}).get(_label_key(labels))
+            return histogram.summary() if histogram else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable view of every metric
+
+        Series are keyed by their labels written as "name=value,..." ("" for
+        none); histograms are summarized with count, sum, mean, estimated
+        p50/p95/p99 and max.
+        """
+        def series_key(key: LabelKey) -> str:
+            return ",".join(f"{name}={value}" for name, value in key)
+
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "uptime_seconds": time.time() - self.started,
+                "counters": {name: {series_key(key): value for key, value in series.items()}
+                             for name, series in sorted(self._counters.items())},
+                "gauges": {name: {series_key(key): value for key, value in series.items()}
+                           for name, series in sorted(self._gauges.items())},
+                "histograms": {name: {series_key(key): histogram.summary() for key, histogram in series.items()}
+                               for name, series in sorted(self._histograms.items())},
+            }
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    full_name = self.prefix + name
+                    lines.append(f"# TYPE {full_name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{full_name}{_prometheus_labels(key)} {_prometheus_number(value)}")
+
+            for name, series in sorted(self._histograms.items()):
+                full_name = self.prefix + name
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = ("le", _prometheus_number(bound))
+                        lines.append(f"{full_name}_bucket{_prometheus_labels(key, le)} {cumulative}")
+                    lines.append(f"{full_name}_sum{_prometheus_labels(key)} {_prometheus_number(histogram.sum)}")
+                    lines.append(f"{full_name}_count{_prometheus_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Save a snapshot: Prometheus text for .prom or .txt files, JSON otherwise"""
+        if path.endswith((".prom", ".txt")):
+            data = self.to_prometheus()
+        else:
+            data = json.dumps(self.snapshot(), indent=2) + "\n"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+
+    def stage_summary(self) -> List[str]:
+        """One line per stage: count, total, mean and p95 of ``stage_seconds``"""
+        with self._lock:
+            series = dict(self._histograms.get("stage_seconds", {}))
+        lines = []
+        for key, histogram in sorted(series.items(), key=lambda item: -item[1].sum):
+            stage = dict(key).get("stage", "")
+            summary = histogram.summary()
+            lines.append(f"{stage}: {summary['count']} calls, {summary['sum']:.2f}s total, "
+                         f"mean {summary['mean'] * 1000:.1f} ms, p95 {summary['p95'] * 1000:.1f} ms")
+        return lines
+
+
+# Registry shared by every module of the tool
+metrics = MetricsRegistry(prefix="gemini_")
+
+
+class Span:
+    """A timed operation in a trace, shaped like an OpenTelemetry span"""
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class _NullSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+_tracing = "off"
+_trace_logger: Optional[logging.Logger] = None
+_otel_tracer = None
+
+
+def configure_tracing(mode: str = "off", path: str = "trace.jsonl") -> str:
+    """Enable or disable trace spans
+
+    Args:
+        mode: "off", "file" (JSON lines written to ``path``) or "otel"
+        path: Span file for the "file" mode
+
+    Returns:
+        The mode in effect; "otel" falls back to "off" when the
+        opentelemetry-api package is not installed
+    """
+    global _tracing, _trace_logger, _otel_tracer
+    if mode not in TRACING_MODES:
+        raise ValueError(f"Unknown tracing mode '{mode}', expected one of {', '.join(TRACING_MODES)}")
+
+    if mode == "otel":
+        try:
+            # Optional dependency, configured by the application or opentelemetry-instrument
+            from opentelemetry import trace as otel_trace
+        except ImportError:
+            logging.getLogger(__name__).warning("TRACING=otel needs the opentelemetry-api package; tracing disabled")
+            mode = "off"
+        else:
+            _otel_tracer = otel_trace.get_tracer("gemini-tools")
+
+    if mode == "file" and _trace_logger is None:
+        _trace_logger = logging.getLogger(f"{__name__}.trace")
+        _trace_logger.propagate = False
+        _trace_logger.setLevel(logging.INFO)
+        _trace_logger.addHandler(queued_handler(logging.FileHandler(path, encoding="utf-8")))
+
+    _tracing = mode
+    return mode
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """Time a block as the stage ``name`` and trace it when tracing is enabled
+
+    The duration is always recorded in the ``stage_seconds`` histogram, and
+    an exception escaping the block increments ``stage_errors_total``.
+    Spans nest within a thread; work handed to other threads starts a new
+    trace.
+
+    Yields:
+        An object with set_attribute(key, value)
+    """
+    start = time.perf_counter()
+    try:
+        if _tracing == "otel":
+            with _otel_tracer.start_as_current_span(name, attributes=attributes) as current:
+                yield current
+        elif _tracing == "file":
+            current = Span(name, _current_span.get(), attributes)
+            token = _current_span.set(current)
+            try:
+                yield current
+            except BaseException:
+                current.status = "ERROR"
+                raise
+            finally:
+                _current_span.reset(token)
+                current.end_ns = time.time_ns()
+                _trace_logger.info(json.dumps(current.to_dict(), default=str))
+        else:
+            yield _NULL_SPAN
+    except BaseException:
+        metrics.inc("stage_errors_total", stage=name)
+        raise
+    finally:
+        metrics.observe("stage_seconds", time.perf_counter() - start, stage=name)
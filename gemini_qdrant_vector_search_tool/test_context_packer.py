@@ -0,0 +1,80 @@
+"""Tests for merging overlapping hits and packing them within a token budget"""
+
+from context_packer import estimate_tokens, merge_adjacent, merge_overlapping, pack_context
+
+# Paragraphs long enough for the overlap to cover OVERLAP_PROBE_CHARS, as real chunk overlaps do
+ALPHA = "Alpha paragraph, which opens the document and is only in the first chunk."
+BETA = "Beta paragraph, which the chunker repeats at the start of the following chunk."
+GAMMA = "Gamma paragraph, which is only in the second chunk."
+
+
+def _hit(filename, chunk_index, text, score):
+    return {"filename": filename, "chunk_index": chunk_index, "text": text, "score": score}
+
+
+def test_merge_overlapping_keeps_shared_text_once():
+    first = f"{ALPHA}\n\n{BETA}"
+    second = f"{BETA}\n\n{GAMMA}"
+    assert merge_overlapping(first, second) == f"{ALPHA}\n\n{BETA}\n\n{GAMMA}"
+
+
+def test_merge_overlapping_without_overlap_joins_paragraphs():
+    assert merge_overlapping("Alpha.", "Gamma.") == "Alpha.\n\nGamma."
+
+
+def test_consecutive_chunks_of_a_file_merge_into_one_passage():
+    results = [
+        _hit("a.txt", 1, f"{BETA}\n\n{GAMMA}", 0.9),
+        _hit("a.txt", 0, f"{ALPHA}\n\n{BETA}", 0.5),
+        _hit("a.txt", 3, "Epsilon.", 0.7),
+        _hit("b.txt", 2, "Other file.", 0.8),
+    ]
+    passages = merge_adjacent(results)
+    assert [passage["chunk_indices"] for passage in passages] == [[0, 1], [2], [3]]
+    merged = passages[0]
+    # The merged passage reads in chunk order and takes the best score
+    assert merged["text"] == f"{ALPHA}\n\n{BETA}\n\n{GAMMA}"
+    assert merged["score"] == 0.9
+    # A gap in the chunk indices keeps passages apart
+    assert passages[2]["text"] == "Epsilon."
+
+
+def test_repeated_paragraphs_are_dropped_from_lower_scoring_passages():
+    results = [
+        _hit("a.txt", 0, "Shared paragraph.\n\nOnly in a.", 0.9),
+        _hit("b.txt", 0, "shared   PARAGRAPH.\n\nOnly in b.", 0.8),
+    ]
+    packed = pack_context(results)
+    assert [passage["text"] for passage in packed] == ["Shared paragraph.\n\nOnly in a.", "Only in b."]
+
+
+def test_budget_cuts_the_lowest_scoring_passages_first():
+    results = [
+        _hit("a.txt", 0, "First passage text here.", 0.9),
+        _hit("b.txt", 0, "Second passage text here.", 0.8),
+        _hit("c.txt", 0, "Third passage text here.", 0.7),
+    ]
+    budget = estimate_tokens("First passage text here.") + estimate_tokens("Second passage text here.")
+    packed = pack_context(results, token_budget=budget)
+    assert [passage["filename"] for passage in packed] == ["a.txt", "b.txt"]
+    assert sum(passage["tokens"] for passage in packed) <= budget
+
+
+def test_passage_over_the_budget_is_cut_at_a_paragraph_boundary():
+    paragraphs = ["Opening paragraph.", "Middle paragraph.", "Closing paragraph."]
+    budget = estimate_tokens(paragraphs[0]) + estimate_tokens(paragraphs[1])
+    packed = pack_context([_hit("a.txt", 0, "\n\n".join(paragraphs), 0.9)], token_budget=budget)
+    assert packed[0]["text"] == "\n\n".join(paragraphs[:2])
+    assert packed[0]["tokens"] == budget
+
+
+def test_no_budget_keeps_every_passage():
+    results = [_hit(f"{name}.txt", 0, f"Text of {name}.", 0.5) for name in "abcde"]
+    assert len(pack_context(results, token_budget=0)) == 5
+    assert len(pack_context(results, token_budget=None)) == 5
+
+
+def test_results_without_chunk_metadata_are_kept_as_they_are():
+    packed = pack_context([{"text": "Loose result.", "score": 0.4}])
+    assert packed[0]["text"] == "Loose result."
+    assert packed[0]["chunk_indices"] == []
@@ -0,0 +1,57 @@
+"""Tests for the answer cache's scoping by embedding signature and search settings"""
+
+import numpy as np
+
+from gemini_vector_search import answer_scope
+from query_cache import QueryCache
+
+
+def _vector(size: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(size).astype(np.float32)
+
+
+def _config(**overrides):
+    config = {"collection_name": "col", "query_filter": None, "hybrid": False, "hybrid_candidates": 20,
+              "rrf_k": 60, "payload_fields": ["text", "filename"], "context_token_budget": 8000}
+    config.update(overrides)
+    return config
+
+
+def test_answers_are_scoped_by_embedding_signature(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    full = QueryCache(path, "models/embedding-001")
+    reduced = QueryCache(path, "models/embedding-001@256")
+    projected = QueryCache(path, "models/embedding-001+pca256:abc123")
+
+    full.put_answer("q", _vector(768), "col", 5, "full answer", [])
+    reduced.put_answer("q", _vector(256), "col", 5, "reduced answer", [])
+
+    # Mixed widths in one (collection, limit) scope must not break the lookup
+    assert full.lookup_answer(_vector(768), "col", 5)["answer"] == "full answer"
+    assert reduced.lookup_answer(_vector(256), "col", 5)["answer"] == "reduced answer"
+
+    # Same width, different projection: never served another signature's answer
+    assert projected.lookup_answer(_vector(256), "col", 5) is None
+
+    for cache in (full, reduced, projected):
+        cache.close()
+
+
+def test_answer_scope_separates_settings_that_change_the_context():
+    base = answer_scope(_config())
+    assert answer_scope(_config()) == base
+    assert answer_scope(_config(query_filter={"must": [{"key": "topics", "match": {"value": "fiber"}}]})) != base
+    assert answer_scope(_config(hybrid=True)) != base
+    assert answer_scope(_config(hybrid=True)) != answer_scope(_config(hybrid=True, rrf_k=10))
+    assert answer_scope(_config(payload_fields=None)) != base
+    assert answer_scope(_config(context_token_budget=2000)) != base
+    # Hybrid tuning is irrelevant while hybrid search is off
+    assert answer_scope(_config(rrf_k=10)) == base
+
+
+def test_scopes_do_not_share_answers(tmp_path):
+    cache = QueryCache(str(tmp_path / "cache.sqlite"), "models/embedding-001")
+    cache.put_answer("q", _vector(768), answer_scope(_config()), 5, "dense answer", [])
+    assert cache.lookup_answer(_vector(768), answer_scope(_config(hybrid=True)), 5) is None
+    assert cache.lookup_answer(_vector(768), answer_scope(_config()), 5)["answer"] == "dense answer"
+    cache.close()